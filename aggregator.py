@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from change_detector import ChangeDetector, device_digest
+from device_record import DeviceRecord
+from device_snapshot import DeviceSnapshot
+from metrics import Counter, Gauge
+from sensor_link import PROTOCOL_VERSION, expand_device
+
+SENSOR_BATCHES = Counter('botrede_sensor_batches_total', 'Lotes recebidos dos sensores', ['outcome'])
+SENSORS = Gauge('botrede_sensors', 'Sensores ativos')
+ALERTS_DEDUPLICATED = Counter(
+    'botrede_alerts_deduplicated_total', 'Alertas descartados por repetirem um alerta recente', ['type']
+)
+
+
+class AlertDeduplicator:
+    """Descarta alertas iguais a um já emitido nos últimos window segundos.
+
+    Com vários sensores vendo o mesmo segmento, um dispositivo pode "sumir" de um e
+    "aparecer" em outro, ou o mesmo pico de tráfego ser detectado duas vezes; a chave
+    de cada alerta ignora qual sensor o produziu.
+    """
+
+    def __init__(self, window: float = 300.0):
+        self.window = window
+        self._seen: Dict[tuple, float] = {}
+
+    def allow(self, key: tuple, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if len(self._seen) > 4096:
+            self._seen = {k: expires for k, expires in self._seen.items() if expires > now}
+        expires = self._seen.get(key)
+        if expires is not None and expires > now:
+            return False
+        self._seen[key] = now + self.window
+        return True
+
+    @staticmethod
+    def event_key(event: dict) -> tuple:
+        device = event['device']
+        key = (event['type'], device.ip, device.mac, device_digest(device)[1])
+        if event['type'] == 'moved':
+            return key + (event['previous_ip'],)
+        if event['type'] == 'mac_conflict':
+            return key + (event['kind'], tuple(event['ips']))
+        return key
+
+
+class Aggregator:
+    """Junta os inventários enviados pelos sensores em uma visão única da rede.
+
+    Cada sensor mantém sua própria visão (ip -> dispositivo), atualizada pelos lotes
+    recebidos em apply_batch. Quando mais de um sensor vê o mesmo IP, o dispositivo
+    vem do sensor que já o reportava (para que diferenças entre sensores não virem
+    mudanças) ou, se ele deixou de vê-lo, do que o viu mais recentemente. A visão
+    combinada fica em known_devices e snapshot, os mesmos atributos do NetworkMonitor
+    que a interface web lê, e as mudanças nela passam pelo ChangeDetector.
+
+    Sensores que ficam sensor_timeout segundos sem enviar nada são descartados, e os
+    dispositivos vistos só por eles passam a constar como desconectados.
+
+    O agregador não guarda estado entre reinícios: o primeiro inventário completo de
+    cada sensor depois que ele inicia vira a linha de base, sem alertas de dispositivo
+    novo, assim como o NetworkMonitor faz ao restaurar o inventário salvo.
+    """
+
+    def __init__(self, token: Optional[str] = None, sensor_timeout: float = 900.0,
+                 dedup_window: float = 300.0, settle: float = 1.0):
+        self.token = token
+        self.sensor_timeout = sensor_timeout
+        self.settle = settle  # Lotes que chegam dentro desse intervalo geram um único diff
+        self.logger = logging.getLogger('Aggregator')
+        self.views: Dict[str, Dict[str, DeviceRecord]] = {}
+        self.last_seq: Dict[str, int] = {}
+        self.last_seen: Dict[str, float] = {}
+        self.known_devices: Dict[str, DeviceRecord] = {}
+        self.owners: Dict[str, str] = {}  # ip -> sensor de onde vem o dispositivo em known_devices
+        self.change_detector = ChangeDetector()
+        self.deduplicator = AlertDeduplicator(dedup_window)
+        self.snapshot = DeviceSnapshot(0, ())
+        # Persistência fica a cargo dos sensores
+        self.device_store = None
+        self.scan_history = None
+        self.stats = {'batches': 0, 'resyncs': 0, 'events': 0, 'deduplicated': 0}
+        self._dirty: Set[str] = set()
+        self._baseline: Set[str] = set()  # IPs do primeiro inventário de cada sensor, ainda sem diff
+        self._synced: Set[str] = set()  # Sensores que já enviaram o primeiro inventário completo
+        self._anomalies: List[Tuple[DeviceRecord, List[dict]]] = []
+        SENSORS.set_function(lambda: len(self.views))
+
+    def apply_batch(self, batch: dict) -> bool:
+        """Aplica um lote de um sensor; devolve False se o sensor precisa reenviar o inventário completo."""
+        sensor = batch['sensor']
+        if batch.get('version') != PROTOCOL_VERSION:
+            raise ValueError(f"Versão de protocolo desconhecida: {batch.get('version')}")
+
+        if not batch['full'] and self.last_seq.get(sensor) != batch['seq'] - 1:
+            # Lote perdido ou agregador reiniciado: as mudanças não podem ser aplicadas
+            SENSOR_BATCHES.labels('resync').inc()
+            self.stats['resyncs'] += 1
+            self.logger.info(f"Sensor {sensor} fora de sequência; pedindo o inventário completo")
+            return False
+
+        # Tudo é lido e validado antes de alterar o estado: um lote malformado é recusado
+        # inteiro, sem apagar a visão anterior do sensor
+        removed = list(batch['removed'])
+        upserts = [expand_device(data, sensor) for data in batch['upserts']]
+        anomalies = [(expand_device(item['device'], sensor), item['anomalies']) for item in batch['anomalies']]
+
+        previous = self.views.get(sensor, {})
+        view = {} if batch['full'] else previous
+        if batch['full']:
+            self._dirty.update(previous)
+        for ip in removed:
+            if view.pop(ip, None) is not None:
+                self._dirty.add(ip)
+        for device in upserts:
+            view[device.ip] = device
+            self._dirty.add(device.ip)
+        self.views[sensor] = view
+        self._anomalies.extend(anomalies)
+        if batch['full'] and sensor not in self._synced:
+            self._synced.add(sensor)
+            self._baseline.update(view)
+
+        self.last_seq[sensor] = batch['seq']
+        self.last_seen[sensor] = time.monotonic()
+        self.stats['batches'] += 1
+        SENSOR_BATCHES.labels('full' if batch['full'] else 'delta').inc()
+        return True
+
+    def expire_sensors(self, now: Optional[float] = None):
+        """Descarta os sensores que pararam de enviar lotes."""
+        now = time.monotonic() if now is None else now
+        for sensor, seen in list(self.last_seen.items()):
+            if now - seen > self.sensor_timeout:
+                self.logger.warning(f"Sensor {sensor} sem notícias há {self.sensor_timeout:.0f}s; descartando")
+                self._dirty.update(self.views.pop(sensor, {}))
+                del self.last_seen[sensor]
+                self.last_seq.pop(sensor, None)
+
+    def _merge(self):
+        """Recalcula em known_devices apenas os IPs alterados desde o último merge."""
+        for ip in self._dirty:
+            owner = self.owners.get(ip)
+            device = self.views.get(owner, {}).get(ip) if owner is not None else None
+            if device is None:
+                candidates = [(view[ip].seen, sensor)
+                              for sensor, view in self.views.items() if ip in view]
+                if candidates:
+                    owner = max(candidates)[1]
+                    device = self.views[owner][ip]
+            if device is None:
+                self.known_devices.pop(ip, None)
+                self.owners.pop(ip, None)
+            else:
+                self.known_devices[ip] = device
+                self.owners[ip] = owner
+        self._dirty.clear()
+
+    def collect(self) -> Tuple[List[dict], List[dict], List[Tuple[DeviceRecord, List[dict]]]]:
+        """Aplica as mudanças pendentes e devolve (eventos, eventos repetidos, anomalias novas)."""
+        events: List[dict] = []
+        if self._dirty:
+            self._merge()
+            # Dispositivos da linha de base entram no detector antes do diff e não viram alertas
+            for ip in self._baseline:
+                device = self.known_devices.get(ip)
+                if device is not None and ip not in self.change_detector:
+                    self.change_detector.update(device)
+            self._baseline.clear()
+            events = self.change_detector.diff(list(self.known_devices.values()))
+            self.snapshot = DeviceSnapshot.build(self.snapshot.version + 1, self.known_devices)
+
+        fresh, repeated = [], []
+        for event in events:
+            if self.deduplicator.allow(AlertDeduplicator.event_key(event)):
+                fresh.append(event)
+            else:
+                repeated.append(event)
+                ALERTS_DEDUPLICATED.labels(event['type']).inc()
+
+        anomalies, self._anomalies = self._anomalies, []
+        fresh_anomalies = []
+        for device, found in anomalies:
+            key = ('anomaly', device.ip, tuple(sorted(a['type'] for a in found)))
+            if self.deduplicator.allow(key):
+                fresh_anomalies.append((device, found))
+            else:
+                ALERTS_DEDUPLICATED.labels('anomaly').inc()
+        self.stats['events'] += len(fresh)
+        self.stats['deduplicated'] += len(repeated) + len(anomalies) - len(fresh_anomalies)
+        return fresh, repeated, fresh_anomalies
+
+    async def run(self, on_events: Callable[[List[dict]], Awaitable[None]],
+                  on_repeated: Callable[[List[dict]], None],
+                  on_anomalies: Callable[[DeviceRecord, List[dict]], Awaitable[None]]):
+        """A cada settle segundos, publica as mudanças da visão combinada.
+
+        on_events recebe os eventos novos (que viram alertas), on_repeated os eventos
+        descartados pela deduplicação (que só atualizam o painel) e on_anomalies cada
+        anomalia de tráfego nova.
+        """
+        while True:
+            await asyncio.sleep(self.settle)
+            self.expire_sensors()
+            events, repeated, anomalies = self.collect()
+            if repeated:
+                on_repeated(repeated)
+            if events:
+                await on_events(events)
+            for device, found in anomalies:
+                await on_anomalies(device, found)
@@ -0,0 +1,79 @@
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+def detect_anomalies_batch(ips: Sequence[str], packet_counts, packet_sizes,
+                           thresholds: Dict[str, float]) -> Dict[str, Dict]:
+    """Aplica as regras de NetworkMonitor.detect_anomalies a todos os hosts de uma vez.
+
+    packet_counts e packet_sizes são matrizes (hosts x amostras) com a janela de cada
+    host alinhada à direita: a última coluna é a amostra mais recente. Hosts com menos
+    amostras usam NaN nas colunas iniciais. Devolve, por IP, o mesmo dicionário de
+    detect_anomalies.
+    """
+    counts = np.asarray(packet_counts, dtype=np.float64)
+    sizes = np.asarray(packet_sizes, dtype=np.float64)
+    if counts.shape != sizes.shape or counts.ndim != 2 or counts.shape[0] != len(ips):
+        raise ValueError("packet_counts e packet_sizes devem ser matrizes (hosts x amostras) do mesmo tamanho")
+
+    valid = ~np.isnan(counts)
+    n = valid.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+
+    filled_counts = np.where(valid, counts, 0.0)
+    filled_sizes = np.where(valid, sizes, 0.0)
+    avg_count = filled_counts.sum(axis=1) / safe_n
+    avg_size = filled_sizes.sum(axis=1) / safe_n
+    std_count = _sample_std(filled_counts, valid, avg_count, n)
+    std_size = _sample_std(filled_sizes, valid, avg_size, n)
+
+    # Detecta picos de tráfego
+    current_count = filled_counts[:, -1]
+    spike = current_count > avg_count + std_count * thresholds['traffic_spike']
+
+    # Detecta padrões suspeitos de varredura de porta
+    above = (filled_counts > (avg_count * 2)[:, None]) & valid
+    port_scan = above.sum(axis=1) >= thresholds['port_scan_attempts']
+
+    results: Dict[str, Dict] = {}
+    rows = zip(ips, n.tolist(), spike.tolist(), port_scan.tolist(), current_count.tolist(),
+               avg_count.tolist(), avg_size.tolist(), std_count.tolist(), std_size.tolist())
+    for ip, samples, is_spike, is_scan, current, avg_c, avg_s, std_c, std_s in rows:
+        if not samples:
+            results[ip] = {'anomalies': []}
+            continue
+        anomalies: List[Dict] = []
+        if is_spike:
+            anomalies.append({
+                'type': 'traffic_spike',
+                'severity': 'high',
+                'description': f'Pico anormal de tráfego detectado: {_as_number(current)} pacotes'
+            })
+        if is_scan:
+            anomalies.append({
+                'type': 'port_scan',
+                'severity': 'high',
+                'description': 'Possível tentativa de varredura de porta detectada'
+            })
+        results[ip] = {
+            'anomalies': anomalies,
+            'stats': {
+                'avg_packet_count': _as_number(avg_c),
+                'avg_packet_size': _as_number(avg_s),
+                'std_packet_count': std_c if samples > 1 else 0,
+                'std_packet_size': std_s if samples > 1 else 0
+            }
+        }
+    return results
+
+
+def _sample_std(values, valid, mean, n):
+    """Desvio padrão amostral (ddof=1) por linha, ignorando as posições inválidas."""
+    deviations = np.where(valid, values - mean[:, None], 0.0)
+    variance = (deviations * deviations).sum(axis=1) / np.maximum(n - 1, 1)
+    return np.sqrt(variance)
+
+
+def _as_number(value: float):
+    # Mantém inteiros como int, assim como statistics.mean faz para amostras inteiras
+    return int(value) if value.is_integer() else value
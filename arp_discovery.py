@@ -0,0 +1,202 @@
+import asyncio
+import ipaddress
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+
+class ArpDiscovery:
+    """Descoberta de dispositivos por ARP que não bloqueia o loop do asyncio.
+
+    O envio das requisições e a captura das respostas rodam em threads, enquanto o
+    loop apenas consome as respostas. Hosts que não responderam recebem novas
+    requisições (retries) e o envio respeita um limite de pacotes por segundo.
+    """
+
+    def __init__(self, timeout: float = 3.0, retries: int = 1, send_rate: int = 1000,
+                 shard_prefix: int = 24, processes: int = 4):
+        self.timeout = timeout  # Espera por respostas após cada rodada de envio
+        self.retries = max(0, retries)  # Rodadas extras para hosts que não responderam
+        self.send_rate = max(1, send_rate)  # Pacotes ARP por segundo (somando todos os processos)
+        self.shard_prefix = shard_prefix  # Redes maiores são divididas em fatias deste tamanho
+        self.processes = max(1, processes)  # Processos que varrem as fatias em paralelo
+        self.logger = logging.getLogger('ArpDiscovery')
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def sweep_many(self, targets: List[Tuple[str, Optional[str]]]) -> AsyncIterator[Tuple[str, str]]:
+        """Varre várias redes (cidr, interface) e produz (ip, mac) de todas elas.
+
+        Redes maiores que shard_prefix são divididas em fatias varridas em paralelo por
+        um pool de processos; cada fatia é entregue assim que termina. Com uma única
+        fatia, ou com processes=1, a varredura roda no próprio processo.
+        """
+        shards = [(shard, interface) for network, interface in targets
+                  for shard in split_network(network, self.shard_prefix)]
+        if len(shards) <= 1 or self.processes <= 1:
+            for network, interface in targets:
+                async for host in self.sweep(network, interface):
+                    yield host
+            return
+
+        loop = asyncio.get_event_loop()
+        pool = self._get_pool()
+        # O limite de envio é global: cada processo recebe sua parte
+        shard_rate = max(1, self.send_rate // min(self.processes, len(shards)))
+        futures = [
+            loop.run_in_executor(pool, _sweep_shard, shard, interface, self.timeout, self.retries, shard_rate)
+            for shard, interface in shards
+        ]
+        try:
+            for next_done in asyncio.as_completed(futures):
+                try:
+                    hosts = await next_done
+                except Exception as e:
+                    self.logger.error(f"Erro ao varrer fatia da rede: {e}")
+                    continue
+                for host in hosts:
+                    yield host
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        """Encerra o pool de processos das varreduras em fatias."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # O pool é mantido entre ciclos para não reimportar o scapy a cada varredura.
+        # 'spawn' evita herdar as threads do processo principal em um fork.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    async def sweep(self, network: str, interface: Optional[str] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Varre a rede e produz (ip, mac) para cada host assim que ele responde."""
+        targets = [str(ip) for ip in ipaddress.ip_network(network, strict=False).hosts()]
+        if not targets:
+            return
+
+        loop = asyncio.get_event_loop()
+        target_set = set(targets)
+        answered: Dict[str, str] = {}
+        replies: asyncio.Queue = asyncio.Queue()
+
+        # Na primeira varredura a importação do scapy roda fora do loop
+        scapy = await loop.run_in_executor(None, _load_scapy)
+        sock = await loop.run_in_executor(None, self._open_socket, interface)
+
+        def on_reply(packet):
+            # Executado na thread de captura
+            arp = packet[scapy.ARP]
+            loop.call_soon_threadsafe(replies.put_nowait, (arp.psrc, arp.hwsrc))
+
+        sniffer = scapy.AsyncSniffer(
+            opened_socket=sock,
+            lfilter=lambda p: scapy.ARP in p and p[scapy.ARP].op == 2,
+            prn=on_reply,
+            store=False
+        )
+        sniffer.start()
+        sender = asyncio.ensure_future(self._send_rounds(sock, targets, answered))
+
+        try:
+            while True:
+                next_reply = asyncio.ensure_future(replies.get())
+                done, _ = await asyncio.wait({next_reply, sender}, return_when=asyncio.FIRST_COMPLETED)
+                if next_reply not in done:
+                    next_reply.cancel()
+                    break
+                ip, mac = next_reply.result()
+                if ip in target_set and ip not in answered:
+                    answered[ip] = mac
+                    yield ip, mac
+
+            # Respostas que chegaram junto com o fim da última rodada
+            while not replies.empty():
+                ip, mac = replies.get_nowait()
+                if ip in target_set and ip not in answered:
+                    answered[ip] = mac
+                    yield ip, mac
+
+            if sender.exception():
+                self.logger.error(f"Erro ao enviar requisições ARP: {sender.exception()}")
+        finally:
+            sender.cancel()
+            await loop.run_in_executor(None, self._stop_sniffer, sniffer, sock)
+
+    async def _send_rounds(self, sock, targets: List[str], answered: Dict[str, str]):
+        """Envia as rodadas de requisições ARP, repetindo apenas para quem não respondeu."""
+        loop = asyncio.get_event_loop()
+        for attempt in range(self.retries + 1):
+            pending = [ip for ip in targets if ip not in answered]
+            if not pending:
+                return
+            if attempt:
+                self.logger.debug(f"Reenviando ARP para {len(pending)} hosts (tentativa {attempt + 1})")
+            await loop.run_in_executor(None, self._send_requests, sock, pending)
+            await asyncio.sleep(self.timeout)
+
+    def _send_requests(self, sock, ips: List[str]):
+        """Envia as requisições ARP respeitando send_rate (executado em uma thread)."""
+        scapy = _load_scapy()
+        interval = 1.0 / self.send_rate
+        next_send = time.monotonic()
+        for ip in ips:
+            now = time.monotonic()
+            if next_send > now:
+                time.sleep(next_send - now)
+            sock.send(scapy.Ether(dst="ff:ff:ff:ff:ff:ff") / scapy.ARP(pdst=ip))
+            next_send += interval
+
+    def _open_socket(self, interface: Optional[str]):
+        """Abre o socket L2, filtrando ARP no kernel quando o BPF está disponível."""
+        scapy = _load_scapy()
+        try:
+            return scapy.conf.L2socket(iface=interface, filter='arp')
+        except Exception as e:
+            self.logger.debug(f"Filtro BPF indisponível, capturando sem filtro: {e}")
+            return scapy.conf.L2socket(iface=interface)
+
+    @staticmethod
+    def _stop_sniffer(sniffer, sock):
+        try:
+            sniffer.stop()
+        except Exception:
+            pass
+        sock.close()
+
+
+def _load_scapy():
+    """Importa o scapy na primeira varredura, e não ao carregar o módulo.
+
+    A importação leva perto de um segundo e dezenas de MiB; quem não varre por ARP
+    (agregador, modo só web, benchmarks com descoberta simulada) não paga esse custo.
+    """
+    import scapy.all as scapy
+    return scapy
+
+
+def split_network(network: str, shard_prefix: int) -> List[str]:
+    """Divide uma rede em sub-redes de tamanho shard_prefix (redes menores ficam inteiras)."""
+    net = ipaddress.ip_network(network, strict=False)
+    if net.prefixlen >= shard_prefix:
+        return [str(net)]
+    return [str(subnet) for subnet in net.subnets(new_prefix=shard_prefix)]
+
+
+def _sweep_shard(network: str, interface: Optional[str], timeout: float, retries: int,
+                 send_rate: int) -> List[Tuple[str, str]]:
+    """Varre uma fatia da rede dentro de um processo do pool."""
+    discovery = ArpDiscovery(timeout=timeout, retries=retries, send_rate=send_rate, processes=1)
+
+    async def collect():
+        return [host async for host in discovery.sweep(network, interface)]
+
+    return asyncio.run(collect())
@@ -0,0 +1,224 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Callable, Optional, Tuple
+
+from aiohttp import web
+
+from device_snapshot import encode_json
+import metrics
+from event_stream import format_sse
+from sensor_link import BATCH_PATH, decode_batch
+from web_interface import HTML_TEMPLATE, WebInterface, parse_history_range
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Compara um If-None-Match com o ETag (comparação fraca, como a interface Flask)."""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.Response(body=encode_json(data), status=status, content_type='application/json')
+
+
+class AsyncWebServer:
+    """Servidor aiohttp da interface web, rodando no mesmo loop de eventos do bot.
+
+    Expõe as mesmas rotas e os mesmos formatos JSON da interface Flask, lendo o estado
+    do WebInterface e do NetworkMonitor na própria thread do loop, sem concorrência
+    com a varredura. Consultas ao SQLite rodam no executor para não travar o loop.
+
+    Com um Aggregator, também recebe os lotes dos sensores em BATCH_PATH.
+    """
+
+    def __init__(self, web_interface: WebInterface, keepalive_timeout: float = 75.0, aggregator=None,
+                 max_batch_size: int = 64 * 1024 * 1024):
+        self.web_interface = web_interface
+        self.network_monitor = web_interface.network_monitor
+        self.keepalive_timeout = keepalive_timeout
+        self.aggregator = aggregator
+        self.max_batch_size = max_batch_size  # Lotes completos de redes grandes passam de 1 MiB
+        self.logger = logging.getLogger('AsyncWebServer')
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=self.max_batch_size if self.aggregator is not None else 1024 ** 2)
+        app.router.add_get('/', self.index)
+        app.router.add_get('/api/devices', self.get_devices)
+        app.router.add_get('/api/inventory', self.get_inventory)
+        app.router.add_get('/api/history/online', self.get_online_history)
+        app.router.add_get('/api/history/devices/{ip}', self.get_device_history)
+        app.router.add_get('/api/history/devices/{ip}/ports/{port:\\d+}', self.get_port_history)
+        app.router.add_get('/api/events', self.get_events)
+        app.router.add_get('/api/stream', self.stream)
+        app.router.add_get('/metrics', self.get_metrics)
+        if self.aggregator is not None:
+            app.router.add_post(BATCH_PATH, self.receive_batch)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 5000):
+        """Começa a atender em host:port sem bloquear o loop."""
+        self._runner = web.AppRunner(self.build_app(), access_log=None, keepalive_timeout=self.keepalive_timeout)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port, backlog=1024).start()
+        self.logger.info(f"Interface web em http://{host}:{port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def index(self, request: web.Request) -> web.Response:
+        return web.Response(text=HTML_TEMPLATE, content_type='text/html')
+
+    @staticmethod
+    def _conditional_json(request: web.Request, etag: str,
+                          body: Callable[[bool], Tuple[bytes, bool]]) -> web.Response:
+        """Resposta JSON com ETag: 304 se o cliente já tem a versão, gzip se ele aceitar."""
+        headers = {'ETag': f'W/"{etag}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if _etag_matches(request.headers.get('If-None-Match'), etag):
+            return web.Response(status=304, headers=headers)
+        content, compressed = body('gzip' in request.headers.get('Accept-Encoding', ''))
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+        return web.Response(body=content, headers=headers, content_type='application/json')
+
+    @staticmethod
+    def _paging(request: web.Request) -> Tuple[int, int]:
+        try:
+            return int(request.query.get('page', 1)), int(request.query.get('limit', 10))
+        except ValueError:
+            raise web.HTTPBadRequest(text='Parâmetros de paginação inválidos')
+
+    async def get_devices(self, request: web.Request) -> web.Response:
+        page, limit = self._paging(request)
+        snapshot = self.network_monitor.snapshot
+        return self._conditional_json(
+            request, snapshot.etag, lambda compress: snapshot.page_body(page, limit, compress)
+        )
+
+    async def get_events(self, request: web.Request) -> web.Response:
+        page, limit = self._paging(request)
+        version = self.web_interface.events_version
+        return self._conditional_json(
+            request, self.web_interface.events_etag(version),
+            lambda compress: self.web_interface.events_page_body(version, page, limit, compress)
+        )
+
+    async def get_inventory(self, request: web.Request) -> web.Response:
+        store = self.network_monitor.device_store
+        if store is None:
+            return _json({'error': 'Inventário persistente desativado'}, status=404)
+
+        page, limit = self._paging(request)
+        online_only = request.query.get('online', 'false').lower() == 'true'
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, lambda: store.list_devices(online_only=online_only, limit=limit, offset=(page - 1) * limit)
+        )
+        return _json(result)
+
+    def _history_range(self, request: web.Request, days: int) -> Tuple[int, int]:
+        try:
+            return parse_history_range(request.query, days)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+
+    async def get_online_history(self, request: web.Request) -> web.Response:
+        history = self.network_monitor.scan_history
+        if history is None:
+            return _json({'error': 'Histórico de varreduras desativado'}, status=404)
+
+        start, end = self._history_range(request, days=30)
+        hours = await asyncio.get_event_loop().run_in_executor(None, history.online_counts, start, end)
+        return _json({'start': start, 'end': end, 'hours': hours})
+
+    async def get_device_history(self, request: web.Request) -> web.Response:
+        history = self.network_monitor.scan_history
+        if history is None:
+            return _json({'error': 'Histórico de varreduras desativado'}, status=404)
+
+        ip = request.match_info['ip']
+        start, end = self._history_range(request, days=1)
+        observations = await asyncio.get_event_loop().run_in_executor(None, history.device_history, ip, start, end)
+        return _json({'ip': ip, 'start': start, 'end': end, 'observations': observations})
+
+    async def get_port_history(self, request: web.Request) -> web.Response:
+        history = self.network_monitor.scan_history
+        if history is None:
+            return _json({'error': 'Histórico de varreduras desativado'}, status=404)
+
+        ip = request.match_info['ip']
+        port = int(request.match_info['port'])
+        start, end = self._history_range(request, days=30)
+        transitions = await asyncio.get_event_loop().run_in_executor(
+            None, history.port_history, ip, port, start, end
+        )
+        return _json({'ip': ip, 'port': port, 'start': start, 'end': end, 'transitions': transitions})
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=metrics.REGISTRY.render().encode(),
+                            headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def receive_batch(self, request: web.Request) -> web.Response:
+        """Recebe um lote de um sensor; 409 pede ao sensor o inventário completo."""
+        token = self.aggregator.token
+        if token:
+            header = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+                raise web.HTTPUnauthorized(text='Token do sensor inválido')
+        try:
+            # O aiohttp já descomprime o corpo enviado com Content-Encoding: gzip
+            batch = decode_batch(await request.read())
+            applied = self.aggregator.apply_batch(batch)
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            raise web.HTTPBadRequest(text=f'Lote inválido: {e}')
+        if not applied:
+            return _json({'resync': True}, status=409)
+        return _json({'seq': batch['seq']})
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        """Stream SSE: o que o cliente perdeu (ou um snapshot) e depois as novas mensagens."""
+        event_stream = self.web_interface.stream
+        last_event_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+        last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+
+        try:
+            missed = event_stream.since(last_seq) if last_seq is not None else None
+            seq = last_seq
+            while True:
+                if missed is None:
+                    # Cliente novo ou que ficou para trás além do histórico: recomeça com um snapshot
+                    seq = event_stream.last_seq
+                    snapshot = {
+                        **self.network_monitor.snapshot.page(1, 10),
+                        'events': self.web_interface.event_page(1, 10)['events']
+                    }
+                    message = (seq, 'snapshot', json.dumps(snapshot, separators=(',', ':')))
+                    await response.write(format_sse(message).encode())
+                elif missed:
+                    await response.write(''.join(format_sse(message) for message in missed).encode())
+                    seq = missed[-1][0]
+                else:
+                    await response.write(b': keep-alive\n\n')
+                missed = await event_stream.wait_async(seq, timeout=15.0)
+        except ConnectionResetError:
+            pass
+        return response
@@ -0,0 +1,140 @@
+"""Compara a memória do inventário com dispositivos em dict e em DeviceRecord.
+
+Monta o mesmo inventário (hosts e portas do simulador de benchmarks/simulator.py) nos
+dois formatos: o antigo, com timestamp ISO e uma lista de dicts por porta, e o
+DeviceRecord com portas empacotadas e internadas. Para cada um mede os bytes alocados
+(tracemalloc) e quanto o inventário vivo acrescenta ao tempo de um gc.collect(); para
+os registros, mede também o diff do ChangeDetector e a montagem do snapshot da
+interface web.
+
+Uso:
+    python benchmarks/bench_device_memory.py [--sizes 50000 100000] [--json]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulator import SERVICES, SimulatedNetwork  # noqa: E402
+
+from change_detector import ChangeDetector  # noqa: E402
+from device_record import DeviceRecord, pack_ports  # noqa: E402
+from device_snapshot import DeviceSnapshot  # noqa: E402
+from network_monitor import NetworkMonitor  # noqa: E402
+
+
+def scanned_hosts(hosts: int, seed: int):
+    """Hosts como os scanners os devolvem: (ip, mac, lista de portas em dict)."""
+    network = SimulatedNetwork(hosts, seed=seed, base='10.0.0.0')
+    assess_risk = NetworkMonitor.assess_port_risk
+    return [
+        (host.ip, host.mac, [{'port': port, 'service': SERVICES.get(port, 'unknown'),
+                              'risk_level': assess_risk(None, port, SERVICES.get(port, 'unknown'))}
+                             for port in host.ports])
+        for host in network.hosts.values()
+    ], network
+
+
+def build_dicts(hosts) -> dict:
+    now = time.time()
+    return {ip: {'ip': ip, 'mac': mac, 'timestamp': datetime.fromtimestamp(now).isoformat(),
+                 'ports': [dict(port) for port in ports]}
+            for ip, mac, ports in hosts}
+
+
+def build_records(hosts) -> dict:
+    now = time.time()
+    return {ip: DeviceRecord(ip, mac, now, pack_ports(ports)) for ip, mac, ports in hosts}
+
+
+def _gc_seconds() -> float:
+    start = time.perf_counter()
+    gc.collect()
+    return time.perf_counter() - start
+
+
+def measure(build, hosts) -> dict:
+    # Os hosts de entrada também estão vivos: desconta o tempo do gc sem o inventário
+    baseline = min(_gc_seconds() for _ in range(3))
+    tracemalloc.start()
+    inventory = build(hosts)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    gc_seconds = max(0.0, min(_gc_seconds() for _ in range(3)) - baseline)
+    return {
+        'inventory': inventory,
+        'bytes': allocated,
+        'bytes_per_device': round(allocated / len(inventory), 1),
+        'gc_collect_seconds': round(gc_seconds, 6)
+    }
+
+
+def run(hosts: int, seed: int, churn: float) -> dict:
+    scanned, network = scanned_hosts(hosts, seed)
+    dicts = measure(build_dicts, scanned)
+    del dicts['inventory']
+    records = measure(build_records, scanned)
+    inventory = records.pop('inventory')
+
+    # Um ciclo com mudanças: hosts saem, voltam e trocam de portas
+    detector = ChangeDetector()
+    detector.reset(list(inventory.values()))
+    network.churn(churn)
+    network.churn(churn)
+    now = time.time()
+    cycle = [
+        inventory[host.ip].replace(seen=now, ports=pack_ports(
+            {'port': port, 'service': SERVICES.get(port, 'unknown'),
+             'risk_level': NetworkMonitor.assess_port_risk(None, port, SERVICES.get(port, 'unknown'))}
+            for port in host.ports))
+        for host in network.hosts.values() if host.ip in inventory
+    ]
+    start = time.perf_counter()
+    events = detector.diff(cycle)
+    diff_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    DeviceSnapshot.build(1, {device.ip: device for device in cycle})
+    snapshot_seconds = time.perf_counter() - start
+
+    return {
+        'hosts': hosts,
+        'dict': dicts,
+        'record': records,
+        'memory_ratio': round(dicts['bytes'] / records['bytes'], 2),
+        'diff_seconds': round(diff_seconds, 6),
+        'diff_events': len(events),
+        'snapshot_seconds': round(snapshot_seconds, 6)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50000, 100000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--churn', type=float, default=0.02)
+    parser.add_argument('--json', action='store_true', help='imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    results = [run(hosts, args.seed, args.churn) for hosts in args.sizes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'hosts':>8} {'dict (B/disp)':>14} {'registro (B/disp)':>18} {'redução':>8} "
+          f"{'gc dict (s)':>12} {'gc registro (s)':>16} {'diff (s)':>9} {'snapshot (s)':>13}")
+    for r in results:
+        print(f"{r['hosts']:>8} {r['dict']['bytes_per_device']:>14} {r['record']['bytes_per_device']:>18} "
+              f"{r['memory_ratio']:>7}x {r['dict']['gc_collect_seconds']:>12.4f} "
+              f"{r['record']['gc_collect_seconds']:>16.4f} {r['diff_seconds']:>9.4f} {r['snapshot_seconds']:>13.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""Mede o ciclo de varredura e o envio de alertas de ponta a ponta em uma rede simulada.
+
+Cada cenário (tamanho da rede x engine) roda em um processo próprio, com a descoberta
+ARP, o nmap e o Discord substituídos pelo simulador (benchmarks/simulator.py), e mede
+a duração de cada ciclo, hosts por segundo, o tempo por fase, a entrega dos alertas,
+a latência de /api/devices e o pico de memória do processo.
+
+Uso:
+    python benchmarks/bench_scan_pipeline.py [--sizes 254 4094 65534] [--engines nmap nmap_batch native] [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulator import (SimulatedArpDiscovery, SimulatedNetwork, attach_fake_discord, configure_logging,  # noqa: E402
+                       simulate_connect_scanner, simulated_nmap)
+
+PHASES = ('discovery', 'port_scan', 'diff', 'snapshot', 'inventory', 'history', 'cycle')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3),
+        'p99_ms': round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+async def measure_api(port: int, requests: int) -> dict:
+    """Latência de /api/devices: primeira página, página grande com gzip e revalidação (304)."""
+    import aiohttp
+
+    base = f'http://127.0.0.1:{port}/api/devices'
+    results = {}
+    async with aiohttp.ClientSession(auto_decompress=False) as session:
+        async with session.get(base) as response:
+            etag = response.headers['ETag']
+        cases = {
+            'page': (f'{base}?page=1&limit=10', {}),
+            'page_1000_gzip': (f'{base}?page=1&limit=1000', {'Accept-Encoding': 'gzip'}),
+            'not_modified': (f'{base}?page=1&limit=10', {'If-None-Match': etag})
+        }
+        for name, (url, headers) in cases.items():
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    body = await response.read()
+                samples.append(time.perf_counter() - start)
+            results[name] = {**_percentiles(samples), 'status': response.status, 'bytes': len(body)}
+    return results
+
+
+async def run_cycles(bot, network, options: dict) -> list:
+    from change_detector import split_changes
+    from network_monitor import SCAN_PHASE_SECONDS
+
+    dispatcher = bot.discord_notifier.dispatcher
+    channel = bot.discord_notifier.client.channel
+    cycles = []
+    for cycle in range(options['cycles']):
+        churn = network.churn(options['churn']) if cycle else None
+        phase_before = {phase: SCAN_PHASE_SECONDS.labels(phase).sum for phase in PHASES}
+        stats_before = dict(dispatcher.stats)
+        sent_before = channel.sent
+        hosts = len(network.hosts)
+
+        start = time.perf_counter()
+        events = await bot.network_monitor.detect_changes()
+        scan_seconds = time.perf_counter() - start
+        await bot.report_events(events)
+        # stop espera a fila esvaziar; as tarefas de envio são recriadas para o próximo ciclo
+        await dispatcher.stop(timeout=600)
+        end_to_end = time.perf_counter() - start
+        dispatcher.start()
+
+        new, disconnected, changed = split_changes(events)
+        cycles.append({
+            'cycle': cycle + 1,
+            'hosts': hosts,
+            'churn': churn,
+            'scan_seconds': round(scan_seconds, 4),
+            'end_to_end_seconds': round(end_to_end, 4),
+            'hosts_per_second': round(hosts / scan_seconds, 1) if scan_seconds else None,
+            'phases_seconds': {
+                phase: round(SCAN_PHASE_SECONDS.labels(phase).sum - phase_before[phase], 4) for phase in PHASES
+            },
+            'events': {'new': len(new), 'disconnected': len(disconnected), 'changed': len(changed),
+                       'total': len(events)},
+            'notifications': {key: dispatcher.stats[key] - stats_before[key] for key in dispatcher.stats},
+            'discord_messages': channel.sent - sent_before
+        })
+    return cycles
+
+
+async def run_async(size: int, engine: str, options: dict) -> dict:
+    network = SimulatedNetwork(
+        size, seed=options['seed'], arp_rate=options['arp_rate'],
+        reply_latency=options['reply_latency'], scan_latency=options['scan_latency'],
+        port_density=options['port_density']
+    )
+    os.environ.update({
+        # O cliente do Discord é trocado pelo falso do simulador e nunca conecta
+        'DISCORD_TOKEN': os.environ.get('DISCORD_TOKEN') or 'simulado',
+        'DISCORD_USER_ID': os.environ.get('DISCORD_USER_ID') or '1',
+        'SCAN_INTERVAL': '3600',
+        'SCAN_NETWORKS': network.cidr,
+        'SCAN_INTERFACES': '',
+        'PASSIVE_DISCOVERY': 'False',
+        'TRAFFIC_CAPTURE': 'False',
+        'PORT_SCAN_ENGINE': engine,
+        'PORT_SCAN_WORKERS': str(options['workers']),
+        'DISCORD_DIGEST': str(options['digest']),
+        'NOTIFY_QUEUE_SIZE': str(options['queue_size']),
+        'WEB_SERVER': 'aiohttp'
+    })
+    if options['persist']:
+        db = os.path.join(options['tmpdir'], f'bench-{size}-{engine}.db')
+        os.environ.update({'DEVICE_DB': db, 'HISTORY_DB': db})
+    else:
+        os.environ.update({'DEVICE_DB': '', 'HISTORY_DB': ''})
+
+    with simulated_nmap(network):
+        from main import NetworkMonitorBot
+        from rate_limiter import TokenBucket
+
+        # O discord.py avisa sobre as dependências de voz ao criar o cliente
+        configure_logging()
+        logging.getLogger('discord').setLevel(logging.ERROR)
+        bot = NetworkMonitorBot()
+        # Descartes e timeouts já aparecem nos resultados
+        logging.getLogger().setLevel(logging.ERROR)
+        bot.network_monitor.arp_discovery = SimulatedArpDiscovery(network)
+        simulate_connect_scanner(bot.network_monitor.connect_scanner, network)
+        attach_fake_discord(bot.discord_notifier, latency=options['discord_latency'])
+        if not options['discord_rate_limit']:
+            # Mede o custo do próprio pipeline, e não o limite de 5 mensagens a cada 5 s do Discord
+            bot.discord_notifier.rate_limiter = TokenBucket(1e9, 1_000_000)
+        bot.discord_notifier.dispatcher.start()
+
+        port = _free_port()
+        await bot.web_server.start('127.0.0.1', port)
+        try:
+            cycles = await run_cycles(bot, network, options)
+            api = await measure_api(port, options['requests'])
+        finally:
+            await bot.web_server.stop()
+            await bot.discord_notifier.dispatcher.stop(timeout=0)
+            if bot.network_monitor.device_store:
+                bot.network_monitor.device_store.close()
+            if bot.network_monitor.scan_history:
+                bot.network_monitor.scan_history.close()
+
+    return {
+        'hosts': size,
+        'engine': engine,
+        'network': network.cidr,
+        'cycles': cycles,
+        'api_devices': api,
+        # ru_maxrss é em KiB no Linux
+        'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def run(size: int, engine: str, options: dict) -> dict:
+    return asyncio.run(run_async(size, engine, options))
+
+
+def run_isolated(size: int, engine: str, options: dict) -> dict:
+    """Roda um cenário em um processo novo, para que o pico de memória seja só dele."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run, size, engine, options).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[254, 4094, 65534])
+    parser.add_argument('--engines', nargs='+', default=['nmap', 'nmap_batch', 'native'],
+                        choices=['nmap', 'nmap_batch', 'native'])
+    parser.add_argument('--cycles', type=int, default=2, help='ciclos por cenário (o primeiro encontra tudo novo)')
+    parser.add_argument('--churn', type=float, default=0.02,
+                        help='fração de hosts que sai, volta ou muda de portas entre ciclos')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=32, help='PORT_SCAN_WORKERS')
+    parser.add_argument('--arp-rate', type=float, default=50000.0, help='respostas ARP por segundo')
+    parser.add_argument('--reply-latency', type=float, default=0.01, help='atraso máximo de cada resposta ARP (s)')
+    parser.add_argument('--scan-latency', type=float, default=0.005,
+                        help='mediana da varredura de portas de um host (s)')
+    parser.add_argument('--port-density', type=float, default=1.0, help='multiplicador da chance de portas abertas')
+    parser.add_argument('--digest', action='store_true', help='DISCORD_DIGEST=True')
+    parser.add_argument('--queue-size', type=int, default=1000, help='NOTIFY_QUEUE_SIZE')
+    parser.add_argument('--discord-latency', type=float, default=0.0, help='latência de cada chamada ao Discord (s)')
+    parser.add_argument('--discord-rate-limit', action='store_true',
+                        help='mantém o limitador de taxa do Discord (5 mensagens a cada 5 s)')
+    parser.add_argument('--persist', action='store_true', help='grava o inventário e o histórico em SQLite')
+    parser.add_argument('--requests', type=int, default=200, help='requisições por caso de /api/devices')
+    parser.add_argument('--json', action='store_true', help='imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        options = {
+            'cycles': max(1, args.cycles), 'churn': args.churn, 'seed': args.seed, 'workers': args.workers,
+            'arp_rate': args.arp_rate, 'reply_latency': args.reply_latency, 'scan_latency': args.scan_latency,
+            'port_density': args.port_density, 'digest': args.digest, 'queue_size': args.queue_size,
+            'discord_latency': args.discord_latency, 'discord_rate_limit': args.discord_rate_limit,
+            'persist': args.persist, 'requests': max(1, args.requests), 'tmpdir': tmpdir
+        }
+        results = [run_isolated(size, engine, options) for size in args.sizes for engine in args.engines]
+
+    if args.json:
+        print(json.dumps({'options': {k: v for k, v in options.items() if k != 'tmpdir'}, 'results': results},
+                         indent=2))
+        return
+
+    print(f"{'hosts':>7} {'engine':>10} {'ciclo':>5} {'varredura (s)':>13} {'hosts/s':>9} {'total (s)':>9} "
+          f"{'eventos':>8} {'msgs':>6} {'api p50/p99 (ms)':>17} {'RSS (MiB)':>9}")
+    for r in results:
+        api = r['api_devices']['page']
+        for c in r['cycles']:
+            print(f"{r['hosts']:>7} {r['engine']:>10} {c['cycle']:>5} {c['scan_seconds']:>13.3f} "
+                  f"{c['hosts_per_second']:>9} {c['end_to_end_seconds']:>9.3f} {c['events']['total']:>8} "
+                  f"{c['discord_messages']:>6} {api['p50_ms']:>8}/{api['p99_ms']:<8} {r['peak_rss_mib']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Roda um agregador e N sensores em localhost, sobre redes simuladas que se sobrepõem.
+
+Cada sensor é um NetworkMonitorBot com BOT_MODE=sensor, varrendo a rede do seu site
+(benchmarks/simulator.py) mais uma fração da rede do site vizinho, e envia as mudanças
+por HTTP ao agregador (BOT_MODE=aggregator), que junta os inventários e envia os
+alertas a um Discord falso. Mede os bytes enviados (JSON puro x gzip), a latência
+entre o sensor reportar uma mudança e o agregador publicá-la, os alertas descartados
+por repetição e o tamanho do inventário combinado.
+
+Uso:
+    python benchmarks/bench_sensor_topology.py [--sensors 3] [--hosts 1000] [--overlap 0.2] [--json]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulator import (SimulatedArpDiscovery, SimulatedNetwork, attach_fake_discord, configure_logging,  # noqa: E402
+                       simulate_connect_scanner)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered) * 1000, 1),
+        'p95_ms': round(ordered[max(0, int(len(ordered) * 0.95) - 1)] * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1)
+    }
+
+
+def sensor_view(sites, index: int, overlap: float) -> SimulatedNetwork:
+    """Rede vista pelo sensor index: o próprio site mais uma fração do site seguinte."""
+    own, neighbour = sites[index], sites[(index + 1) % len(sites)]
+    view = copy.copy(own)
+    view.hosts = dict(own.hosts)
+    if neighbour is not own:
+        shared = sorted(neighbour.hosts)[:int(len(neighbour.hosts) * overlap)]
+        view.hosts.update((ip, neighbour.hosts[ip]) for ip in shared)
+    view._sorted = None
+    return view
+
+
+def create_bot(mode: str, env: dict):
+    os.environ.update({
+        'BOT_MODE': mode, 'DISCORD_TOKEN': os.environ.get('DISCORD_TOKEN') or 'simulado',
+        'DISCORD_USER_ID': os.environ.get('DISCORD_USER_ID') or '1',
+        'DEVICE_DB': '', 'HISTORY_DB': '', 'PASSIVE_DISCOVERY': 'False', 'TRAFFIC_CAPTURE': 'False',
+        'WEB_SERVER': 'aiohttp', **env
+    })
+    from main import NetworkMonitorBot
+    configure_logging()
+    return NetworkMonitorBot()
+
+
+async def run_topology(options: dict) -> dict:
+    from rate_limiter import TokenBucket
+
+    port = _free_port()
+    token = 'topologia-local'
+    sites = [SimulatedNetwork(options['hosts'], seed=options['seed'] + i, base=f'10.{64 + i}.0.0')
+             for i in range(options['sensors'])]
+
+    # O discord.py avisa sobre as dependências de voz ao criar o cliente
+    logging.getLogger('discord').setLevel(logging.ERROR)
+    aggregator_bot = create_bot('aggregator', {
+        'WEB_HOST': '127.0.0.1', 'WEB_PORT': str(port), 'SENSOR_TOKEN': token,
+        'ALERT_DEDUP_WINDOW': str(options['dedup_window'])
+    })
+    channel = attach_fake_discord(aggregator_bot.discord_notifier)
+    aggregator_bot.discord_notifier.rate_limiter = TokenBucket(1e9, 1_000_000)
+    aggregator_bot.discord_notifier.dispatcher.start()
+    aggregator = aggregator_bot.aggregator
+    aggregator.settle = options['settle']
+
+    # Momento em que cada IP foi reportado por um sensor e em que o agregador o publicou
+    reported, latencies = {}, []
+
+    def arrived(events):
+        now = time.perf_counter()
+        for event in events:
+            ip = event['device'].ip
+            if ip in reported:
+                latencies.append(now - reported.pop(ip))
+
+    report_events = aggregator_bot.report_events
+    publish_repeated = aggregator_bot.publish_repeated
+
+    async def on_events(events):
+        arrived(events)
+        await report_events(events)
+
+    def on_repeated(events):
+        arrived(events)
+        publish_repeated(events)
+
+    aggregator_bot.report_events = on_events
+    aggregator_bot.publish_repeated = on_repeated
+
+    sensors = []
+    for index in range(options['sensors']):
+        view = sensor_view(sites, index, options['overlap'])
+        bot = create_bot('sensor', {
+            'SENSOR_NAME': f'sensor-{index + 1}', 'AGGREGATOR_URL': f'http://127.0.0.1:{port}',
+            'SENSOR_TOKEN': token, 'SENSOR_FLUSH_INTERVAL': str(options['flush_interval']),
+            'SCAN_NETWORKS': view.cidr, 'SCAN_INTERFACES': '', 'PORT_SCAN_ENGINE': 'native',
+            'SCAN_INTERVAL': '3600'
+        })
+        bot.network_monitor.arp_discovery = SimulatedArpDiscovery(view)
+        simulate_connect_scanner(bot.network_monitor.connect_scanner, view)
+        sensors.append((bot, view))
+    logging.getLogger().setLevel(logging.ERROR)
+
+    server = asyncio.ensure_future(aggregator_bot.start())
+    await asyncio.sleep(0.2)
+    uploaders = [asyncio.ensure_future(bot.sensor_client.run()) for bot, _ in sensors]
+
+    async def scan(bot, view):
+        # A primeira varredura de cada sensor vira a linha de base no agregador, sem eventos
+        baseline = not bot.network_monitor.inventory_loaded
+        events = await bot.network_monitor.detect_changes()
+        now = time.perf_counter()
+        for event in () if baseline else events:
+            if event['type'] != 'mac_conflict':
+                reported[event['device'].ip] = now
+        await bot.report_events(events)
+        return len(events)
+
+    cycles = []
+    try:
+        for cycle in range(options['cycles']):
+            churn = None
+            if cycle:
+                churn = [site.churn(options['churn']) for site in sites]
+                for i, (bot, view) in enumerate(sensors):
+                    fresh = sensor_view(sites, i, options['overlap'])
+                    view.hosts, view._sorted = fresh.hosts, None
+            stats_before = dict(aggregator.stats)
+            sent_before = channel.sent
+            start = time.perf_counter()
+            sensor_events = sum(await asyncio.gather(*(scan(bot, view) for bot, view in sensors)))
+            scan_seconds = time.perf_counter() - start
+
+            # Espera o agregador publicar tudo o que os sensores reportaram
+            deadline = time.perf_counter() + options['flush_interval'] * 4 + options['settle'] * 4 + 5
+            while reported and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(options['settle'] * 2)
+            await aggregator_bot.discord_notifier.dispatcher.stop(timeout=60)
+            aggregator_bot.discord_notifier.dispatcher.start()
+
+            unique = set()
+            for _, view in sensors:
+                unique.update(view.hosts)
+            cycles.append({
+                'cycle': cycle + 1,
+                'churn': churn,
+                'scan_seconds': round(scan_seconds, 3),
+                'sensor_events': sensor_events,
+                'aggregator_events': aggregator.stats['events'] - stats_before['events'],
+                'deduplicated': aggregator.stats['deduplicated'] - stats_before['deduplicated'],
+                'discord_messages': channel.sent - sent_before,
+                'merged_devices': len(aggregator.known_devices),
+                'unique_hosts': len(unique),
+                'absorbed': len(reported)
+            })
+            reported.clear()
+    finally:
+        for task in uploaders + [server]:
+            task.cancel()
+        await asyncio.gather(*uploaders, server, return_exceptions=True)
+        await aggregator_bot.web_server.stop()
+        await aggregator_bot.discord_notifier.dispatcher.stop(timeout=0)
+
+    sensor_stats = {bot.sensor_client.name: dict(bot.sensor_client.stats) for bot, _ in sensors}
+    raw = sum(s['raw_bytes'] for s in sensor_stats.values())
+    sent = sum(s['sent_bytes'] for s in sensor_stats.values())
+    return {
+        'cycles': cycles,
+        'sensors': sensor_stats,
+        'bytes': {'json': raw, 'gzip': sent, 'ratio': round(raw / sent, 2) if sent else None},
+        'propagation': _percentiles(latencies),
+        'aggregator': dict(aggregator.stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=3)
+    parser.add_argument('--hosts', type=int, default=1000, help='hosts no site de cada sensor')
+    parser.add_argument('--overlap', type=float, default=0.2, help='fração do site vizinho que cada sensor também vê')
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--churn', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--flush-interval', type=float, default=0.5, help='SENSOR_FLUSH_INTERVAL')
+    parser.add_argument('--settle', type=float, default=0.2, help='intervalo entre os merges do agregador (s)')
+    parser.add_argument('--dedup-window', type=float, default=300.0, help='ALERT_DEDUP_WINDOW')
+    parser.add_argument('--json', action='store_true', help='imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    options = {
+        'sensors': max(1, args.sensors), 'hosts': args.hosts, 'overlap': args.overlap,
+        'cycles': max(1, args.cycles), 'churn': args.churn, 'seed': args.seed,
+        'flush_interval': args.flush_interval, 'settle': args.settle, 'dedup_window': args.dedup_window
+    }
+    result = asyncio.run(run_topology(options))
+
+    if args.json:
+        print(json.dumps({'options': options, **result}, indent=2))
+        return
+
+    print(f"{'ciclo':>5} {'eventos (sensores)':>18} {'eventos (agregador)':>19} {'repetidos':>9} "
+          f"{'msgs':>5} {'inventário':>10} {'hosts únicos':>12}")
+    for c in result['cycles']:
+        print(f"{c['cycle']:>5} {c['sensor_events']:>18} {c['aggregator_events']:>19} {c['deduplicated']:>9} "
+              f"{c['discord_messages']:>5} {c['merged_devices']:>10} {c['unique_hosts']:>12}")
+    b = result['bytes']
+    print(f"\nbytes enviados: {b['json']} em JSON, {b['gzip']} com gzip ({b['ratio']}x)")
+    print(f"propagação sensor -> agregador: {result['propagation']}")
+
+
+if __name__ == '__main__':
+    main()
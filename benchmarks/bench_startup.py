@@ -0,0 +1,118 @@
+"""Mede o tempo de inicialização e a memória do bot em cada modo de componentes.
+
+Cada medida roda em um processo novo (importações a frio, como em um reinício), que
+cria o NetworkMonitorBot, sobe o servidor web quando ele está ligado e para no momento
+em que o bot estaria pronto para varrer. Com --eager, o processo importa antes todas
+as dependências pesadas (scapy, discord.py, Flask, aiohttp), como o bot fazia ao
+carregar os módulos, para comparação.
+
+Uso:
+    python benchmarks/bench_startup.py [--repeat 3] [--eager] [--json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODES = {
+    'standalone': {},
+    'scan-only': {'WEB_ENABLED': 'False', 'DISCORD_ENABLED': 'False'},
+    'web-only': {'SCAN_ENABLED': 'False', 'DISCORD_ENABLED': 'False'},
+    'no-discord': {'DISCORD_ENABLED': 'False'},
+    'sensor': {'BOT_MODE': 'sensor', 'AGGREGATOR_URL': 'http://127.0.0.1:9'},
+    'aggregator': {'BOT_MODE': 'aggregator'}
+}
+HEAVY_MODULES = ('scapy', 'discord', 'flask', 'aiohttp', 'numpy')
+
+CHILD = """
+import time
+started = time.perf_counter()
+import asyncio, json, logging, os, resource, sys
+# Só no terminal: sem isso o NetworkMonitor grava network_monitor.log no diretório atual
+logging.basicConfig(level=logging.INFO, format='%%(asctime)s - %%(name)s - %%(levelname)s - %%(message)s')
+if os.environ.pop('BENCH_EAGER', '') == '1':
+    import scapy.all, discord, flask, aiohttp
+import main
+
+async def ready():
+    bot = main.NetworkMonitorBot()
+    if bot.web_server is not None:
+        await bot.web_server.start('127.0.0.1', int(os.environ['WEB_PORT']))
+    bot._report_startup()
+    elapsed = time.perf_counter() - started
+    if bot.web_server is not None:
+        await bot.web_server.stop()
+    return elapsed
+
+print(json.dumps({
+    'startup_seconds': asyncio.run(ready()),
+    'max_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure(mode: str, eager: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        'BOT_MODE': 'standalone', 'DISCORD_TOKEN': 'simulado', 'DISCORD_USER_ID': '1',
+        'DEVICE_DB': '', 'HISTORY_DB': '', 'PASSIVE_DISCOVERY': 'False', 'TRAFFIC_CAPTURE': 'False',
+        'WEB_SERVER': 'aiohttp', 'WEB_PORT': str(_free_port()), 'PYTHONPATH': ROOT,
+        'BENCH_EAGER': '1' if eager else '', **MODES[mode]
+    })
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_seconds'] = wall
+    return result
+
+
+def run(mode: str, eager: bool, repeat: int) -> dict:
+    samples = [measure(mode, eager) for _ in range(repeat)]
+    return {
+        'mode': mode,
+        'eager': eager,
+        'startup_seconds': round(statistics.median(s['startup_seconds'] for s in samples), 3),
+        'process_seconds': round(statistics.median(s['process_seconds'] for s in samples), 3),
+        'max_rss_mib': round(statistics.median(s['max_rss_mib'] for s in samples), 1),
+        'modules': samples[-1]['modules']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--eager', action='store_true', help='compara com as dependências importadas de início')
+    parser.add_argument('--json', action='store_true', help='imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    results = [run(mode, False, max(1, args.repeat)) for mode in args.modes]
+    if args.eager:
+        results += [run(mode, True, max(1, args.repeat)) for mode in args.modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'modo':>12} {'eager':>6} {'pronto (s)':>11} {'processo (s)':>13} {'RSS (MiB)':>10}  módulos pesados")
+    for r in results:
+        print(f"{r['mode']:>12} {str(r['eager']):>6} {r['startup_seconds']:>11.3f} {r['process_seconds']:>13.3f} "
+              f"{r['max_rss_mib']:>10.1f}  {', '.join(r['modules']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
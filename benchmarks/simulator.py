@@ -0,0 +1,300 @@
+"""Rede simulada para os benchmarks: descoberta ARP, nmap e cliente do Discord falsos.
+
+Tudo é gerado a partir de uma semente, então duas execuções com os mesmos parâmetros
+simulam a mesma rede (mesmos hosts, MACs, portas e latências). As latências são
+esperas do asyncio, e o que é medido é o custo do próprio bot em cima delas.
+"""
+import asyncio
+import ipaddress
+import itertools
+import logging
+import math
+import os
+import random
+import sys
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from arp_discovery import ArpDiscovery  # noqa: E402
+from port_scanner import AsyncConnectScanner, parse_port_range  # noqa: E402
+
+SERVICES = {
+    20: 'ftp-data', 21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp', 53: 'domain', 80: 'http',
+    110: 'pop3', 143: 'imap', 443: 'https', 445: 'microsoft-ds', 3389: 'ms-wbt-server'
+}
+# Chance de cada porta estar aberta em um host (multiplicada por port_density)
+PORT_PROBABILITIES = {
+    22: 0.30, 80: 0.25, 443: 0.20, 445: 0.10, 53: 0.05, 3389: 0.05,
+    21: 0.03, 23: 0.02, 25: 0.02, 110: 0.01, 143: 0.01
+}
+
+
+class SimulatedHost:
+    __slots__ = ('ip', 'mac', 'arp_delay', 'scan_delay', 'ports')
+
+    def __init__(self, ip: str, mac: str, arp_delay: float, scan_delay: float, ports: List[int]):
+        self.ip = ip
+        self.mac = mac
+        self.arp_delay = arp_delay  # Segundos entre o início da varredura ARP e a resposta
+        self.scan_delay = scan_delay  # Duração da varredura de portas do host
+        self.ports = ports  # Portas abertas, em ordem
+
+
+class SimulatedNetwork:
+    """Rede com hosts, MACs, portas abertas e latências sorteados a partir de uma semente.
+
+    As respostas ARP chegam no ritmo de arp_rate pacotes por segundo, cada uma com um
+    atraso extra de até reply_latency segundos. A varredura de portas de cada host leva
+    um tempo log-normal com mediana scan_latency.
+    """
+
+    def __init__(self, hosts: int, seed: int = 42, arp_rate: float = 50000.0, reply_latency: float = 0.01,
+                 scan_latency: float = 0.005, port_density: float = 1.0, base: str = '10.64.0.0'):
+        prefix = 32 - max(2, math.ceil(math.log2(hosts + 2)))
+        self.cidr = str(ipaddress.ip_network(f'{base}/{prefix}', strict=False))
+        self.port_density = port_density
+        self.rng = random.Random(seed)
+        self.hosts: Dict[str, SimulatedHost] = {}
+        for index, address in enumerate(itertools.islice(ipaddress.ip_network(self.cidr).hosts(), hosts)):
+            ip = str(address)
+            self.hosts[ip] = SimulatedHost(
+                ip,
+                self._random_mac(),
+                index / arp_rate + self.rng.uniform(0, reply_latency),
+                self.rng.lognormvariate(math.log(scan_latency), 0.5),
+                self._random_ports()
+            )
+        self.offline: Dict[str, SimulatedHost] = {}
+        self._sorted: Optional[List[SimulatedHost]] = None
+
+    def _random_mac(self) -> str:
+        return ':'.join(f'{self.rng.randrange(256):02x}' for _ in range(6))
+
+    def _random_ports(self) -> List[int]:
+        return sorted(port for port, chance in PORT_PROBABILITIES.items()
+                      if self.rng.random() < chance * self.port_density)
+
+    def churn(self, rate: float) -> Dict[str, int]:
+        """Simula um intervalo entre ciclos: hosts saem, os que saíram voltam e portas mudam."""
+        count = int(len(self.hosts) * rate)
+        returning, self.offline = self.offline, {}
+        for ip in self.rng.sample(sorted(self.hosts), min(count, len(self.hosts))):
+            self.offline[ip] = self.hosts.pop(ip)
+        self.hosts.update(returning)
+        for ip in self.rng.sample(sorted(self.hosts), min(count, len(self.hosts))):
+            self.hosts[ip].ports = self._random_ports()
+        self._sorted = None
+        return {'left': len(self.offline), 'returned': len(returning), 'ports_rerolled': count}
+
+    def replies(self) -> List[SimulatedHost]:
+        """Hosts online na ordem em que respondem ao ARP."""
+        if self._sorted is None:
+            self._sorted = sorted(self.hosts.values(), key=lambda host: host.arp_delay)
+        return self._sorted
+
+    def open_ports(self, ip: str, ports: str) -> List[Tuple[int, str]]:
+        host = self.hosts.get(ip)
+        if host is None:
+            return []
+        wanted = set(parse_port_range(ports))
+        return [(port, SERVICES.get(port, 'unknown')) for port in host.ports if port in wanted]
+
+
+class SimulatedArpDiscovery(ArpDiscovery):
+    """Substitui a varredura ARP (scapy) pelas respostas da rede simulada."""
+
+    def __init__(self, network: SimulatedNetwork):
+        super().__init__()
+        self.network = network
+
+    async def sweep_many(self, targets: List[Tuple[str, Optional[str]]]) -> AsyncIterator[Tuple[str, str]]:
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        for host in self.network.replies():
+            delay = start + host.arp_delay - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield host.ip, host.mac
+
+    async def sweep(self, network: str, interface: Optional[str] = None) -> AsyncIterator[Tuple[str, str]]:
+        async for host in self.sweep_many([(network, interface)]):
+            yield host
+
+
+class _FakeStream:
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+
+    async def read(self, n: int = -1) -> bytes:
+        return await self._chunks.__anext__() if self._chunks is not None else b''
+
+
+class FakeNmapProcess:
+    """Processo do nmap simulado: saída em texto (um host) ou XML em fluxo (-oX -, vários hosts)."""
+
+    def __init__(self, network: SimulatedNetwork, args: List[str]):
+        self.network = network
+        self.returncode: Optional[int] = None
+        index = args.index('-p')
+        self.ports = args[index + 1]
+        rest = args[index + 2:]
+        self.xml = rest[:2] == ['-oX', '-']
+        self.ips = rest[2:] if self.xml else rest
+        self.stdout = _FakeStream(self._xml_chunks()) if self.xml else None
+
+    def _delay(self, ip: str) -> float:
+        host = self.network.hosts.get(ip)
+        return host.scan_delay if host is not None else 0.0
+
+    async def communicate(self) -> Tuple[bytes, bytes]:
+        ip = self.ips[-1]
+        await asyncio.sleep(self._delay(ip))
+        lines = [f'Nmap scan report for {ip}', 'Host is up (0.00050s latency).', '', 'PORT   STATE SERVICE']
+        lines += [f'{port}/tcp open  {service}' for port, service in self.network.open_ports(ip, self.ports)]
+        self.returncode = 0
+        return '\n'.join(lines).encode(), b''
+
+    async def _xml_chunks(self) -> AsyncIterator[bytes]:
+        # O nmap varre os hosts do lote em paralelo: cada bloco sai quando o host termina
+        yield b'<?xml version="1.0"?><nmaprun scanner="nmap">'
+        elapsed = 0.0
+        for ip in sorted(self.ips, key=self._delay):
+            delay = self._delay(ip)
+            if delay > elapsed:
+                await asyncio.sleep(delay - elapsed)
+                elapsed = delay
+            ports = ''.join(
+                f'<port protocol="tcp" portid="{port}"><state state="open"/><service name="{service}"/></port>'
+                for port, service in self.network.open_ports(ip, self.ports)
+            )
+            yield (f'<host><status state="up"/><address addr="{ip}" addrtype="ipv4"/>'
+                   f'<ports>{ports}</ports></host>').encode()
+        yield b'</nmaprun>'
+        self.returncode = 0
+        while True:
+            yield b''
+
+    async def wait(self) -> int:
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+
+def configure_logging(level: int = logging.INFO):
+    """Configura o log só no terminal, antes de criar o NetworkMonitor.
+
+    O NetworkMonitor configura o log com logging.basicConfig (terminal e network_monitor.log
+    no diretório atual), que não faz nada quando o log já está configurado.
+    """
+    logging.basicConfig(level=level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+@contextmanager
+def simulated_nmap(network: SimulatedNetwork):
+    """Redireciona as execuções do nmap (asyncio.create_subprocess_exec) para a rede simulada."""
+    original = asyncio.create_subprocess_exec
+
+    async def create_subprocess_exec(program, *args, **kwargs):
+        if program != 'nmap':
+            return await original(program, *args, **kwargs)
+        return FakeNmapProcess(network, list(args))
+
+    asyncio.create_subprocess_exec = create_subprocess_exec
+    try:
+        yield
+    finally:
+        asyncio.create_subprocess_exec = original
+
+
+def simulate_connect_scanner(scanner: AsyncConnectScanner, network: SimulatedNetwork):
+    """Faz o scanner nativo 'conectar' na rede simulada em vez de abrir sockets."""
+
+    async def probe_port(ip: str, port: int) -> Optional[Tuple[int, str]]:
+        host = network.hosts.get(ip)
+        await asyncio.sleep(host.scan_delay if host is not None else scanner.connect_timeout)
+        if host is not None and port in host.ports:
+            return port, SERVICES.get(port, 'unknown')
+        return None
+
+    scanner._probe_port = probe_port
+
+
+class FakeMessage:
+    __slots__ = ('id', 'channel')
+
+    def __init__(self, message_id: int, channel: 'FakeDMChannel'):
+        self.id = message_id
+        self.channel = channel
+
+    async def delete(self):
+        await asyncio.sleep(self.channel.latency)
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeDMChannel:
+    """Canal de DM em memória que guarda os kwargs de cada mensagem enviada."""
+
+    def __init__(self, author, latency: float = 0.0):
+        self.author = author
+        self.latency = latency
+        self.messages: Dict[int, dict] = {}
+        self.sent = 0
+        self._ids = itertools.count(1)
+
+    async def send(self, **kwargs) -> FakeMessage:
+        await asyncio.sleep(self.latency)
+        message = FakeMessage(next(self._ids), self)
+        self.messages[message.id] = kwargs
+        self.sent += 1
+        return message
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(message_id, self)
+
+    async def history(self, limit: int = 100):
+        for message_id in sorted(self.messages, reverse=True)[:limit]:
+            message = FakeMessage(message_id, self)
+            message.author = self.author
+            yield message
+
+
+class FakeUser:
+    def __init__(self, user_id: int, dm_channel: Optional[FakeDMChannel] = None):
+        self.id = user_id
+        self.dm_channel = dm_channel
+
+    async def create_dm(self) -> FakeDMChannel:
+        return self.dm_channel
+
+
+class FakeDiscordClient:
+    """Cliente do Discord que entrega as DMs em um FakeDMChannel, sem rede."""
+
+    def __init__(self, user_id: int, latency: float = 0.0):
+        self.user = FakeUser(0)
+        self.channel = FakeDMChannel(self.user, latency)
+        self._recipient = FakeUser(user_id, self.channel)
+
+    def is_ready(self) -> bool:
+        return True
+
+    def get_user(self, user_id: int) -> FakeUser:
+        return self._recipient
+
+    async def fetch_user(self, user_id: int) -> FakeUser:
+        return self._recipient
+
+    async def start(self, token: Optional[str] = None):
+        pass
+
+    async def close(self):
+        pass
+
+
+def attach_fake_discord(notifier, latency: float = 0.0) -> FakeDMChannel:
+    """Troca o cliente de um DiscordNotifier pelo falso e devolve o canal que recebe as mensagens."""
+    notifier.client = FakeDiscordClient(notifier.user_id, latency)
+    return notifier.client.channel
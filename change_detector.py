@@ -0,0 +1,134 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from device_record import DeviceRecord, ports_digest
+
+CHANGE_TYPES = ('new', 'disconnected', 'moved', 'ports_changed', 'services_changed', 'mac_conflict')
+
+# (MAC, digest das portas, digest de portas + serviços, dispositivo)
+DeviceDigest = Tuple[str, int, int, DeviceRecord]
+
+
+def device_digest(device: DeviceRecord) -> Tuple[int, int]:
+    """Resume as portas de um dispositivo em dois inteiros: só os números e números com serviços."""
+    # As tuplas de portas são internadas junto com os digests; o cálculo só acontece uma vez por conjunto
+    return ports_digest(device.ports)
+
+
+def split_changes(events: List[dict]) -> Tuple[List[DeviceRecord], List[DeviceRecord], List[DeviceRecord]]:
+    """Converte os eventos tipados na tupla (novos, desconectados, alterados) usada até então.
+
+    Alterados são só os dispositivos cujas portas mudaram; mudanças de IP, de serviços
+    e conflitos de MAC ficam de fora e são tratados por quem consome os eventos tipados.
+    """
+    new_devices, disconnected_devices, changed_devices = [], [], []
+    for event in events:
+        if event['type'] == 'new':
+            new_devices.append(event['device'])
+        elif event['type'] == 'disconnected':
+            disconnected_devices.append(event['device'])
+        elif event['type'] == 'ports_changed':
+            changed_devices.append(event['device'])
+    return new_devices, disconnected_devices, changed_devices
+
+
+class ChangeDetector:
+    """Detecta mudanças entre ciclos de varredura identificando os dispositivos pelo MAC.
+
+    Cada IP conhecido guarda apenas o MAC e um digest das portas e serviços; um host
+    sem mudanças custa uma busca no dict e uma comparação de inteiros. Os eventos
+    produzidos são dicts com 'type' (um de CHANGE_TYPES) e 'device' (um DeviceRecord),
+    mais os campos específicos de cada tipo: 'previous_ip' (moved), 'previous'
+    (ports_changed e services_changed) e 'kind', 'ips' e 'previous_mac' (mac_conflict).
+    """
+
+    def __init__(self):
+        self._by_ip: Dict[str, DeviceDigest] = {}
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._by_ip
+
+    def reset(self, devices: List[DeviceRecord]):
+        """Substitui o estado conhecido sem gerar eventos (ex.: ao restaurar o inventário)."""
+        self._by_ip = {}
+        for device in devices:
+            self.update(device)
+
+    def update(self, device: DeviceRecord):
+        """Registra o estado atual de um dispositivo sem gerar eventos."""
+        self._by_ip[device.ip] = (device.mac, *device_digest(device), device)
+
+    def diff(self, devices: List[DeviceRecord]) -> List[dict]:
+        """Compara os dispositivos de um ciclo com o ciclo anterior e devolve os eventos."""
+        previous = self._by_ip
+        current: Dict[str, DeviceDigest] = {}
+        first_ip_by_mac: Dict[str, str] = {}
+        multiple_ips: Dict[str, List[str]] = {}
+        unmatched = []
+        events = []
+
+        for device in devices:
+            ip = device.ip
+            mac = device.mac
+            first_ip = first_ip_by_mac.setdefault(mac, ip)
+            if first_ip != ip:
+                multiple_ips.setdefault(mac, [first_ip]).append(ip)
+
+            entry = previous.get(ip)
+            if entry is None or entry[0] != mac:
+                current[ip] = (mac, *device_digest(device), device)
+                unmatched.append(current[ip])
+                continue
+
+            # Portas iguais às do ciclo anterior: as tuplas internadas são o mesmo objeto
+            if entry[3].ports is device.ports:
+                current[ip] = (mac, entry[1], entry[2], device)
+            else:
+                current[ip] = (mac, *device_digest(device), device)
+            self._compare(entry, current[ip], events)
+
+        # IPs do ciclo anterior que não reapareceram com o mesmo MAC, agrupados por MAC
+        vanished: Dict[str, List[str]] = defaultdict(list)
+        if unmatched or len(current) != len(previous):
+            for ip, entry in previous.items():
+                seen = current.get(ip)
+                if seen is None or seen[0] != entry[0]:
+                    vanished[entry[0]].append(ip)
+
+        for mac, ips in multiple_ips.items():
+            # Só avisa quando o MAC passa a responder por um IP que não era dele
+            if any(previous.get(ip, (None,))[0] != mac for ip in ips):
+                events.append({
+                    'type': 'mac_conflict', 'kind': 'multiple_ips',
+                    'device': current[ips[0]][3], 'ips': sorted(ips)
+                })
+
+        for entry in unmatched:
+            mac, device = entry[0], entry[3]
+            replaced = previous.get(device.ip)
+            if replaced is not None:
+                events.append({
+                    'type': 'mac_conflict', 'kind': 'ip_mac_changed',
+                    'device': device, 'ips': [device.ip], 'previous_mac': replaced[0]
+                })
+            candidates = vanished.get(mac)
+            if candidates:
+                previous_ip = candidates.pop()
+                events.append({'type': 'moved', 'device': device, 'previous_ip': previous_ip})
+                self._compare(previous[previous_ip], entry, events)
+            else:
+                events.append({'type': 'new', 'device': device})
+
+        for ips in vanished.values():
+            for ip in ips:
+                events.append({'type': 'disconnected', 'device': previous[ip][3]})
+
+        self._by_ip = current
+        return events
+
+    @staticmethod
+    def _compare(old: DeviceDigest, new: DeviceDigest, events: List[dict]):
+        if old[1] != new[1]:
+            events.append({'type': 'ports_changed', 'device': new[3], 'previous': old[3]})
+        elif old[2] != new[2]:
+            events.append({'type': 'services_changed', 'device': new[3], 'previous': old[3]})
@@ -0,0 +1,146 @@
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+RISK_LEVELS = ('low', 'medium', 'high')
+_RISK_IDS = {risk: index for index, risk in enumerate(RISK_LEVELS)}
+
+# Cada porta aberta é um único int: bits 0-15 a porta, 16-17 o risco e, a partir do
+# bit 18, o índice do serviço na tabela de nomes internados
+PORT_MASK = 0xFFFF
+RISK_SHIFT = 16
+RISK_MASK = 0x3
+SERVICE_SHIFT = 18
+
+_services: List[str] = []
+_service_ids: Dict[str, int] = {}
+# Conjuntos de portas internados: hosts com as mesmas portas compartilham a mesma tupla.
+# Cada entrada guarda a tupla e os dois digests usados pelo ChangeDetector
+_port_sets: Dict[Tuple[int, ...], Tuple[Tuple[int, ...], int, int]] = {}
+MAX_PORT_SETS = 65536
+NO_PORTS: Tuple[int, ...] = ()
+
+
+def intern_service(name: str) -> int:
+    """Índice do nome de serviço na tabela compartilhada (os nomes vêm de um conjunto pequeno)."""
+    index = _service_ids.get(name)
+    if index is None:
+        index = _service_ids[name] = len(_services)
+        _services.append(sys.intern(name))
+    return index
+
+
+def pack_port(port: int, service: str, risk_level: str) -> int:
+    return port | _RISK_IDS.get(risk_level, 0) << RISK_SHIFT | intern_service(service) << SERVICE_SHIFT
+
+
+def intern_ports(packed: Iterable[int]) -> Tuple[int, ...]:
+    """Tupla canônica (ordenada pela porta) e compartilhada das portas empacotadas."""
+    key = tuple(sorted(packed, key=PORT_MASK.__and__))
+    if not key:
+        return NO_PORTS
+    entry = _port_sets.get(key)
+    if entry is None:
+        if len(_port_sets) >= MAX_PORT_SETS:
+            # Internar é só uma economia de memória: recomeçar a tabela não muda nenhum resultado
+            _port_sets.clear()
+        entry = _port_sets[key] = (key, hash(tuple(p & PORT_MASK for p in key)), hash(key))
+    return entry[0]
+
+
+def pack_ports(ports: Iterable[dict]) -> Tuple[int, ...]:
+    """Converte as portas no formato de dict (dos scanners e da API) para a tupla empacotada."""
+    return intern_ports(pack_port(p['port'], p['service'], p['risk_level']) for p in ports)
+
+
+def ports_digest(ports: Tuple[int, ...]) -> Tuple[int, int]:
+    """Digests (só os números, números com serviços) de uma tupla de portas empacotadas."""
+    if not ports:
+        return 0, 0
+    entry = _port_sets.get(ports)
+    if entry is None:
+        return hash(tuple(p & PORT_MASK for p in ports)), hash(ports)
+    return entry[1], entry[2]
+
+
+def port_dicts(ports: Tuple[int, ...]) -> List[dict]:
+    return [{
+        'port': p & PORT_MASK,
+        'service': _services[p >> SERVICE_SHIFT],
+        'risk_level': RISK_LEVELS[p >> RISK_SHIFT & RISK_MASK]
+    } for p in ports]
+
+
+class DeviceRecord:
+    """Registro compacto de um dispositivo, usado internamente no lugar do dict.
+
+    As portas são uma tupla internada de ints empacotados (porta, risco e serviço), o
+    MAC é uma string internada e seen é um timestamp Unix. Um registro não é alterado
+    depois de criado: quem precisa mudá-lo cria outro (ver replace), de modo que
+    snapshots e eventos podem guardar referências sem copiar. O formato em dict
+    (to_dict) só é montado na interface web, no Discord e na persistência.
+    """
+
+    __slots__ = ('ip', 'mac', 'seen', 'ports', 'sensor')
+
+    def __init__(self, ip: str, mac: str, seen: float, ports: Tuple[int, ...] = NO_PORTS,
+                 sensor: Optional[str] = None):
+        self.ip = ip
+        self.mac = sys.intern(mac.lower())
+        self.seen = seen
+        self.ports = ports
+        self.sensor = sensor  # No agregador, o sensor que viu o dispositivo
+
+    def replace(self, mac: Optional[str] = None, seen: Optional[float] = None,
+                ports: Optional[Tuple[int, ...]] = None) -> 'DeviceRecord':
+        return DeviceRecord(
+            self.ip,
+            self.mac if mac is None else mac,
+            self.seen if seen is None else seen,
+            self.ports if ports is None else ports,
+            self.sensor
+        )
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.seen).isoformat()
+
+    def port_numbers(self) -> List[int]:
+        return [p & PORT_MASK for p in self.ports]
+
+    def port_dicts(self) -> List[dict]:
+        return port_dicts(self.ports)
+
+    def risk_level(self) -> str:
+        """Maior nível de risco entre as portas abertas ('low' sem portas)."""
+        highest = max((p >> RISK_SHIFT & RISK_MASK for p in self.ports), default=0)
+        return RISK_LEVELS[highest]
+
+    def to_dict(self) -> dict:
+        device = {'ip': self.ip, 'mac': self.mac, 'timestamp': self.timestamp, 'ports': self.port_dicts()}
+        if self.sensor is not None:
+            device['sensor'] = self.sensor
+        return device
+
+    @classmethod
+    def from_dict(cls, device: dict) -> 'DeviceRecord':
+        timestamp = device.get('timestamp')
+        if isinstance(timestamp, str):
+            seen = datetime.fromisoformat(timestamp).timestamp()
+        else:
+            seen = float(timestamp or 0.0)
+        return cls(device['ip'], device['mac'], seen, pack_ports(device.get('ports', [])), device.get('sensor'))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DeviceRecord):
+            return NotImplemented
+        return (self.ip, self.mac, self.seen, self.ports, self.sensor) == \
+            (other.ip, other.mac, other.seen, other.ports, other.sensor)
+
+    def __repr__(self) -> str:
+        return f'DeviceRecord({self.ip!r}, {self.mac!r}, {self.seen!r}, ports={self.port_numbers()})'
+
+
+def device_dict(device: Union[DeviceRecord, dict]) -> dict:
+    """Formato em dict de um dispositivo, para as fronteiras (API, Discord); dicts passam direto."""
+    return device.to_dict() if isinstance(device, DeviceRecord) else device
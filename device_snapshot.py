@@ -0,0 +1,97 @@
+import gzip
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+from device_record import DeviceRecord
+
+GZIP_MIN_SIZE = 1024  # Respostas menores que isso não compensam a compressão
+# Prefixo dos ETags: evita que a versão de um processo anterior seja aceita após reiniciar
+ETAG_PREFIX = format(int(time.time() * 1000), 'x')
+
+
+def filter_device(device: DeviceRecord) -> dict:
+    """Apenas os campos do dispositivo que a API expõe."""
+    filtered = {'ip': device.ip, 'mac': device.mac, 'ports': device.port_dicts()}
+    # No agregador, o sensor que viu o dispositivo
+    if device.sensor is not None:
+        filtered['sensor'] = device.sensor
+    return filtered
+
+
+def _seen(device: DeviceRecord) -> float:
+    return device.seen
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+class ResponseCache:
+    """Cache LRU de corpos de resposta já serializados (e comprimidos), seguro entre threads."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[bytes, bool]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], object], compress: bool) -> Tuple[bytes, bool]:
+        """Devolve (corpo, comprimido) para a chave, serializando build() na primeira vez.
+
+        O corpo só é comprimido se compress for verdadeiro e ele passar de GZIP_MIN_SIZE.
+        """
+        key = (key, compress)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        body = encode_json(build())
+        entry = (body, False)
+        if compress and len(body) >= GZIP_MIN_SIZE:
+            entry = (gzip.compress(body, compresslevel=6), True)
+
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+class DeviceSnapshot:
+    """Lista imutável e já ordenada dos dispositivos conhecidos, publicada a cada ciclo.
+
+    A interface web lê sempre um snapshot inteiro (a troca da referência é atômica),
+    sem tocar em known_devices enquanto o loop de eventos o substitui. O snapshot
+    guarda os próprios DeviceRecords (que não mudam depois de criados) e só converte
+    para dict os dispositivos da página pedida; as páginas serializadas ficam em
+    cache até a publicação do próximo snapshot.
+    """
+
+    __slots__ = ('version', 'devices', 'created', 'etag', '_cache')
+
+    def __init__(self, version: int, devices: Tuple[DeviceRecord, ...]):
+        self.version = version
+        self.devices = devices
+        self.created = time.time()
+        self.etag = f'{ETAG_PREFIX}-d{version}'
+        self._cache = ResponseCache()
+
+    @classmethod
+    def build(cls, version: int, known_devices: Dict[str, DeviceRecord]) -> 'DeviceSnapshot':
+        """Cria o snapshot a partir de known_devices, do dispositivo visto mais recentemente ao mais antigo."""
+        return cls(version, tuple(sorted(known_devices.values(), key=_seen, reverse=True)))
+
+    def page(self, page: int, limit: int) -> dict:
+        start_idx = (page - 1) * limit
+        return {
+            'devices': [filter_device(device) for device in self.devices[start_idx:start_idx + limit]],
+            'total': len(self.devices)
+        }
+
+    def page_body(self, page: int, limit: int, compress: bool = False) -> Tuple[bytes, bool]:
+        """Página serializada em JSON (e comprimida com gzip, se pedido e se compensar)."""
+        return self._cache.get((page, limit), lambda: self.page(page, limit), compress)
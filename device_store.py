@@ -0,0 +1,116 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from device_record import DeviceRecord, pack_ports
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    mac TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    ports TEXT NOT NULL DEFAULT '[]',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    online INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (mac, ip)
+);
+CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices (ip);
+CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen);
+"""
+
+
+class DeviceStore:
+    """Inventário persistente de dispositivos em SQLite (modo WAL).
+
+    Cada par (MAC, IP) guarda as portas abertas e os horários da primeira e da última
+    observação. Os resultados de um ciclo de varredura são gravados em uma única
+    transação, e o estado salvo permite retomar o monitoramento após reiniciar.
+    """
+
+    def __init__(self, path: str = 'network_monitor.db'):
+        self.path = path
+        self.logger = logging.getLogger('DeviceStore')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def save_cycle(self, devices: List[DeviceRecord], cycle_start: Optional[float] = None):
+        """Grava os dispositivos vistos em um ciclo e marca os demais como desconectados."""
+        now = time.time()
+        if cycle_start is None:
+            cycle_start = now
+        # Hosts com as mesmas portas compartilham a tupla internada: cada conjunto vira JSON uma vez
+        encoded: Dict[tuple, str] = {}
+        rows = []
+        for device in devices:
+            ports = encoded.get(device.ports)
+            if ports is None:
+                ports = encoded[device.ports] = json.dumps(device.port_dicts())
+            rows.append((device.mac, device.ip, ports, now, now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO devices (mac, ip, ports, first_seen, last_seen, online)
+                VALUES (?, ?, ?, ?, ?, 1)
+                ON CONFLICT (mac, ip) DO UPDATE SET
+                    ports = excluded.ports,
+                    last_seen = excluded.last_seen,
+                    online = 1
+                """,
+                rows
+            )
+            self._conn.execute(
+                'UPDATE devices SET online = 0 WHERE online = 1 AND last_seen < ?',
+                (cycle_start,)
+            )
+
+    def load_online(self) -> Dict[str, DeviceRecord]:
+        """Carrega os dispositivos que estavam conectados, no formato de known_devices."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT mac, ip, ports, last_seen FROM devices WHERE online = 1 ORDER BY last_seen'
+            ).fetchall()
+        return {
+            row['ip']: DeviceRecord(row['ip'], row['mac'], row['last_seen'], pack_ports(json.loads(row['ports'])))
+            for row in rows
+        }
+
+    def list_devices(self, online_only: bool = False, limit: int = 10, offset: int = 0) -> Dict:
+        """Lista o inventário, do mais recente para o mais antigo, com paginação."""
+        where = 'WHERE online = 1' if online_only else ''
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM devices {where}').fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT mac, ip, ports, first_seen, last_seen, online FROM devices {where} '
+                'ORDER BY last_seen DESC LIMIT ? OFFSET ?',
+                (limit, offset)
+            ).fetchall()
+        devices = []
+        for row in rows:
+            device = self._to_device(row)
+            device['first_seen'] = datetime.fromtimestamp(row['first_seen']).isoformat()
+            device['online'] = bool(row['online'])
+            devices.append(device)
+        return {'devices': devices, 'total': total}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_device(row) -> dict:
+        return {
+            'ip': row['ip'],
+            'mac': row['mac'],
+            'timestamp': datetime.fromtimestamp(row['last_seen']).isoformat(),
+            'ports': json.loads(row['ports'])
+        }
@@ -1,24 +1,163 @@
 import discord
 import asyncio
 import os
-from typing import Dict, List
+from typing import Dict, List, Mapping, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
+from rate_limiter import TokenBucket
+from notification_dispatcher import NotificationDispatcher, NotificationSpool, RISK_ORDER, TRANSIENT_ERRORS
+from metrics import Counter, Histogram
+from device_record import device_dict
 
 load_dotenv()
 
+# Limites de mensagens do Discord
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_FIELDS_PER_EMBED = 25
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+MAX_MESSAGE_CHARS = 6000  # Soma de títulos, campos e rodapés de todos os embeds da mensagem
+
+# Limite documentado para envio em um canal: 5 mensagens a cada 5 segundos
+DM_RATE = 1.0
+DM_BURST = 5
+# Exclusões de mensagens têm um bucket próprio no Discord (5 por segundo, conforme os cabeçalhos)
+DELETE_RATE = 5.0
+DELETE_BURST = 5
+DELETE_CONCURRENCY = 5
+SEND_ATTEMPTS = 3
+# Esperas por limite de taxa maiores que isso viram discord.RateLimited em vez de bloquear
+# a chamada dentro do discord.py (30s é o mínimo aceito pela biblioteca)
+MAX_RATELIMIT_WAIT = 30.0
+
+DISCORD_REQUEST_SECONDS = Histogram(
+    'botrede_discord_request_seconds', 'Duração das chamadas à API do Discord', ['operation']
+)
+DISCORD_RATE_LIMITED = Counter(
+    'botrede_discord_rate_limited_total', 'Respostas 429 (limite de taxa) do Discord', ['bucket']
+)
+
+RISK_COLORS = {'high': 0xFF0000, 'medium': 0xFFFF00, 'low': 0x00FF00}
+RISK_EMOJIS = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}
+
+# (tipo do alerta, nível de risco, nome do campo, valor do campo)
+DigestItem = Tuple[str, str, str, str]
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def device_field(device: Dict) -> Tuple[str, str]:
+    """Resume um dispositivo em um único campo de embed (nome e valor)."""
+    name = f"🌐 {device['ip']} · 📍 {device['mac']}"
+    lines = [
+        f"{RISK_EMOJIS.get(port['risk_level'], '🟢')} Porta **{port['port']}** - {port['service']}"
+        for port in device.get('ports', [])
+    ]
+    return _truncate(name, MAX_FIELD_NAME), _truncate("\n".join(lines) or "Sem portas abertas", MAX_FIELD_VALUE)
+
+
+def build_digest(items: List[DigestItem], timestamp: Optional[datetime] = None) -> List[List[discord.Embed]]:
+    """Agrupa os alertas por tipo e os distribui no menor número de mensagens possível.
+
+    Cada tipo de alerta vira um ou mais embeds (até 25 campos cada) e cada mensagem
+    leva até 10 embeds, respeitando o limite total de caracteres do Discord.
+    """
+    timestamp = timestamp or datetime.now()
+    groups: 'OrderedDict[str, List[DigestItem]]' = OrderedDict()
+    for item in items:
+        groups.setdefault(item[0], []).append(item)
+
+    embeds = []
+    for alert_type, group in groups.items():
+        risk_level = max((item[1] for item in group), key=lambda risk: RISK_ORDER.get(risk, 0))
+        embed = None
+        for _, _, name, value in group:
+            if embed is None or len(embed.fields) >= MAX_FIELDS_PER_EMBED \
+                    or len(embed) + len(name) + len(value) > MAX_MESSAGE_CHARS:
+                title = f"{RISK_EMOJIS.get(risk_level, '🟢')} Alerta de Rede: {alert_type} ({len(group)})"
+                if embed is not None:
+                    title += " (continuação)"
+                embed = discord.Embed(title=title, color=RISK_COLORS.get(risk_level, 0x00FF00), timestamp=timestamp)
+                embed.set_footer(text="Horário da Detecção")
+                embeds.append(embed)
+            embed.add_field(name=name, value=value, inline=False)
+
+    messages: List[List[discord.Embed]] = []
+    chars = 0
+    for embed in embeds:
+        if not messages or len(messages[-1]) >= MAX_EMBEDS_PER_MESSAGE or chars + len(embed) > MAX_MESSAGE_CHARS:
+            messages.append([])
+            chars = 0
+        messages[-1].append(embed)
+        chars += len(embed)
+    return messages
+
+
 class DiscordNotifier:
-    def __init__(self):
+    def __init__(self, digest: bool = False, digest_window: float = 0.0, queue_size: int = 1000,
+                 backpressure: str = 'drop_lowest', workers: int = 1, spool_path: Optional[str] = None,
+                 cleanup_limit: int = 100, max_attempts: int = 20):
         self.token = os.getenv('DISCORD_TOKEN')
-        self.user_id = int(os.getenv('DISCORD_USER_ID'))
+        # Sem DISCORD_USER_ID o cliente ainda conecta, mas não há para quem enviar os alertas
+        user_id = os.getenv('DISCORD_USER_ID')
+        self.user_id = int(user_id) if user_id else None
+        # No modo digest os alertas são agrupados em poucas mensagens; com digest_window = 0
+        # o agrupamento cobre tudo que foi gerado no mesmo ciclo
+        self.digest = digest
+        self.digest_window = digest_window
+        self.rate_limiter = TokenBucket(DM_RATE, DM_BURST)
+        self.delete_limiter = TokenBucket(DELETE_RATE, DELETE_BURST)
+        DISCORD_RATE_LIMITED.set_function(lambda: {
+            ('dm',): self.rate_limiter.limited, ('delete',): self.delete_limiter.limited
+        })
+        self.cleanup_limit = max(1, cleanup_limit)  # Máximo de mensagens apagadas por limpeza
+        self._dm_channel = None
+        # IDs das mensagens enviadas pelo bot, para a limpeza não precisar percorrer o histórico
+        self._sent_messages: 'OrderedDict[int, None]' = OrderedDict()
+        self._cleanup_task: Optional[asyncio.Task] = None
+        # Os alertas passam por uma fila e são enviados em segundo plano, sem bloquear quem os gera
+        self.dispatcher = NotificationDispatcher(
+            self.deliver,
+            max_size=queue_size,
+            policy=backpressure,
+            workers=workers,
+            batch_size=queue_size if digest else 1,
+            batch_window=digest_window if digest else 0.0,
+            max_attempts=max_attempts,
+            is_transient=self._is_transient,
+            spool=NotificationSpool(spool_path) if spool_path else None
+        )
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = False  # Disable members intent since we don't need it
         intents.presences = False  # Disable presences intent since we don't need it
-        self.client = discord.Client(intents=intents)
+        self.client = discord.Client(intents=intents, max_ratelimit_timeout=MAX_RATELIMIT_WAIT,
+                                     http_trace=self._rate_limit_trace())
         self._setup_logging()
         self._setup_client()
+        if self.user_id is None:
+            self.logger.warning("DISCORD_USER_ID não definido; os alertas não serão enviados")
+
+    def _rate_limit_trace(self):
+        """Observa as respostas HTTP do discord.py para repassar os 429 aos limitadores.
+
+        O discord.py repete sozinho as requisições recusadas por limite de taxa, sem
+        levantar exceção; só pelas respostas os baldes ficam sabendo do limite.
+        """
+        import aiohttp
+
+        async def on_request_end(session, context, params):
+            if params.response.status == 429:
+                limiter = self.delete_limiter if params.method == 'DELETE' else self.rate_limiter
+                self._rate_limited(limiter, params.response.headers)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        return trace
 
     def _setup_logging(self):
         self.logger = logging.getLogger('DiscordNotifier')
@@ -27,109 +166,250 @@ class DiscordNotifier:
         @self.client.event
         async def on_ready():
             self.logger.info(f'Bot do Discord conectado como {self.client.user}')
-            await self._cleanup_messages()
+            self._start_cleanup()
 
         @self.client.event
         async def on_message(message):
             if not self.client.is_ready():
                 return
             if message.author.id == self.user_id and message.content.lower() == '/clear':
-                await self._cleanup_messages()
+                self._start_cleanup()
                 await message.delete()
                 self.logger.info(f'Limpeza manual acionada pelo usuário {message.author}')
 
     async def start(self):
-        """Inicia o cliente do Discord."""
+        """Inicia o envio de notificações e o cliente do Discord."""
+        self.dispatcher.start()
         await self.client.start(self.token)
 
     async def stop(self):
-        """Para o cliente do Discord."""
+        """Para o cliente do Discord, tentando antes entregar os alertas pendentes."""
+        await self.dispatcher.stop(timeout=5.0 if self.client.is_ready() else 0.0)
+        if self.dispatcher.spool is not None:
+            self.dispatcher.spool.close()
         await self.client.close()
 
+    async def _get_dm_channel(self):
+        """Canal de DM com o usuário, obtido uma única vez e reaproveitado."""
+        if self._dm_channel is None:
+            user = self.client.get_user(self.user_id) or await self.client.fetch_user(self.user_id)
+            self._dm_channel = user.dm_channel or await user.create_dm()
+        return self._dm_channel
+
+    async def _send(self, **kwargs):
+        """Envia uma mensagem na DM respeitando o limite de taxa do canal."""
+        channel = await self._get_dm_channel()
+        for attempt in range(SEND_ATTEMPTS):
+            await self.rate_limiter.acquire()
+            try:
+                with DISCORD_REQUEST_SECONDS.labels('send').time():
+                    message = await channel.send(**kwargs)
+            except discord.HTTPException as e:
+                # O limitador já foi pausado ao receber o 429 (ver _rate_limit_trace)
+                if e.status != 429 or attempt == SEND_ATTEMPTS - 1:
+                    raise
+                continue
+            self._sent_messages[message.id] = None
+            while len(self._sent_messages) > self.cleanup_limit:
+                self._sent_messages.popitem(last=False)
+            return message
+
+    def _rate_limited(self, limiter: TokenBucket, headers: Mapping[str, str]):
+        """Pausa o limitador pelo tempo indicado em uma resposta 429."""
+        # Os baldes seguem os limites documentados do Discord e se ajustam pelos cabeçalhos do 429
+        retry_after = limiter.update(headers)
+        if retry_after is None:
+            retry_after = 1.0
+            limiter.pause(retry_after)
+        self.logger.warning(f"Limite de taxa do Discord atingido, aguardando {retry_after:.1f}s")
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Falhas de envio que valem nova tentativa: rede, erros 5xx e limite de taxa."""
+        import aiohttp
+
+        if isinstance(error, discord.RateLimited):
+            return True
+        if isinstance(error, discord.HTTPException):
+            return error.status >= 500 or error.status == 429
+        return isinstance(error, (aiohttp.ClientError, *TRANSIENT_ERRORS))
+
+    async def deliver(self, notifications: List[Dict]):
+        """Envia um lote de notificações da fila; levanta uma exceção para que o lote seja repetido."""
+        if self.user_id is None:
+            return  # Sem destinatário: repetir não adiantaria, e o aviso já foi dado ao iniciar
+        if not self.client.is_ready():
+            raise ConnectionError("cliente do Discord não está conectado")
+
+        if self.digest:
+            items = []
+            for notification in notifications:
+                if notification['kind'] == 'anomaly':
+                    items.append(self._anomaly_item(notification['devices'][0], notification['anomalies']))
+                else:
+                    items.extend((notification['alert_type'], notification['risk_level'], *device_field(device))
+                                 for device in notification['devices'])
+            messages = build_digest(items)
+        else:
+            messages = []
+            for notification in notifications:
+                if notification['kind'] == 'anomaly':
+                    messages.append([self._anomaly_embed(notification['devices'][0], notification['anomalies'])])
+                else:
+                    messages.extend([embed] for embed in self._alert_embeds(
+                        notification['alert_type'], notification['devices'], notification['risk_level']
+                    ))
+
+        for embeds in messages:
+            try:
+                await self._send(embeds=embeds)
+            except discord.HTTPException as e:
+                # Erros do cliente (exceto 429) não se resolvem repetindo o envio
+                if 400 <= e.status < 500 and e.status != 429:
+                    self.logger.error(f"Alerta do Discord rejeitado: {e}")
+                    continue
+                raise
+
+    def _start_cleanup(self):
+        """Inicia a limpeza em segundo plano, se ela já não estiver em andamento."""
+        if self.user_id is None:
+            return
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.ensure_future(self._cleanup_messages())
+
     async def _cleanup_messages(self):
-        """Apaga mensagens anteriores do bot ao iniciar ou quando o comando /clear é usado."""
-        try:
-            user = await self.client.fetch_user(self.user_id)
-            if not user:
-                self.logger.error(f"Não foi possível encontrar o usuário com ID {self.user_id}")
-                return
+        """Apaga mensagens anteriores do bot ao iniciar ou quando o comando /clear é usado.
 
-            deleted_count = 0
-            dm_channel = user.dm_channel
-            if not dm_channel:
-                dm_channel = await user.create_dm()
+        Usa os IDs das mensagens enviadas nesta execução; sem eles (logo após iniciar),
+        procura as mensagens do bot nas últimas cleanup_limit mensagens da DM.
+        """
+        try:
+            dm_channel = await self._get_dm_channel()
+            if self._sent_messages:
+                message_ids = list(self._sent_messages)
+            else:
+                message_ids = [message.id async for message in dm_channel.history(limit=self.cleanup_limit)
+                               if message.author == self.client.user]
 
-            async for message in dm_channel.history(limit=100):
-                if message.author == self.client.user:
-                    await message.delete()
-                    deleted_count += 1
-                    await asyncio.sleep(0.5)  # Adiciona atraso para evitar limite de taxa
+            # As exclusões rodam em paralelo, limitadas pelo bucket de exclusões
+            slots = asyncio.Semaphore(DELETE_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._delete_message(dm_channel, message_id, slots) for message_id in message_ids
+            ))
+            deleted_count = sum(results)
             
             if deleted_count > 0:
                 self.logger.info(f"Limpeza de {deleted_count} mensagens do bot concluída com sucesso")
-                confirmation = await user.send(f"✅ Mensagens limpas: {deleted_count}")
-                await asyncio.sleep(5)
-                await confirmation.delete()
+                confirmation = await self._send(content=f"✅ Mensagens limpas: {deleted_count}")
             else:
                 self.logger.info("Nenhuma mensagem para limpar")
-                confirmation = await user.send("✨ Nenhuma mensagem para limpar")
-                await asyncio.sleep(5)
-                await confirmation.delete()
+                confirmation = await self._send(content="✨ Nenhuma mensagem para limpar")
+            await asyncio.sleep(5)
+            await self._delete_message(dm_channel, confirmation.id, slots)
 
         except Exception as e:
             self.logger.error(f"Erro ao limpar mensagens: {e}")
 
+    async def _delete_message(self, channel, message_id: int, slots: asyncio.Semaphore) -> bool:
+        """Apaga uma mensagem pelo ID; devolve True se ela foi apagada agora."""
+        async with slots:
+            for attempt in range(SEND_ATTEMPTS):
+                await self.delete_limiter.acquire()
+                try:
+                    with DISCORD_REQUEST_SECONDS.labels('delete').time():
+                        await channel.get_partial_message(message_id).delete()
+                    self._sent_messages.pop(message_id, None)
+                    return True
+                except discord.NotFound:
+                    self._sent_messages.pop(message_id, None)
+                    return False
+                except discord.RateLimited as e:
+                    self.logger.error(f"Erro ao apagar mensagem {message_id}: limite de taxa por {e.retry_after:.1f}s")
+                    return False
+                except discord.HTTPException as e:
+                    if e.status != 429 or attempt == SEND_ATTEMPTS - 1:
+                        self.logger.error(f"Erro ao apagar mensagem {message_id}: {e}")
+                        return False
+        return False
+
     async def send_alert(self, alert_type: str, devices: List[Dict], risk_level: str = 'low'):
-        """Envia um alerta para o usuário do Discord usando embeds."""
-        try:
-            user = await self.client.fetch_user(self.user_id)
-            if not user:
-                self.logger.error(f"Não foi possível encontrar o usuário com ID {self.user_id}")
-                return
+        """Enfileira um alerta para o usuário do Discord; o envio acontece em segundo plano."""
+        # A fila (e o spool em SQLite) guarda os dispositivos já no formato em dict
+        self.dispatcher.submit('alert', alert_type, [device_dict(device) for device in devices], risk_level)
 
-            risk_emoji = '🔴' if risk_level == 'high' else '🟡' if risk_level == 'medium' else '🟢'
-            timestamp = datetime.now()
-            
-            for device in devices:
-                # Cria embed com cor baseada no nível de risco
-                embed = discord.Embed(
-                    title=f"{risk_emoji} Alerta de Rede: {alert_type}",
-                    color=0xFF0000 if risk_level == 'high' else 0xFFFF00 if risk_level == 'medium' else 0x00FF00,
-                    timestamp=timestamp
-                )
-
-                # Adiciona informações do dispositivo
-                embed.add_field(
-                    name="📱 Informações do Dispositivo",
-                    value=f"🌐 **Endereço IP:** {device['ip']}\n📍 **Endereço MAC:** {device['mac']}",
-                    inline=False
-                )
-
-                # Adiciona informações das portas se disponível
-                if 'ports' in device and device['ports']:
-                    ports_info = ""
-                    for port in device['ports']:
-                        port_emoji = '🔴' if port['risk_level'] == 'high' else '🟡' if port['risk_level'] == 'medium' else '🟢'
-                        risk_text = '⚠️ ALTO RISCO' if port['risk_level'] == 'high' else '⚠️ Risco Médio' if port['risk_level'] == 'medium' else '✅ Baixo Risco'
-                        ports_info += f"{port_emoji} Porta **{port['port']}** - {port['service']}\n   └─ {risk_text}\n"
-                    
-                    if ports_info:
-                        embed.add_field(
-                            name="🔍 Portas Abertas",
-                            value=ports_info,
-                            inline=False
-                        )
-
-                # Adiciona rodapé com timestamp
-                embed.set_footer(text="Horário da Detecção")
-                
-                await user.send(embed=embed)
+    def _alert_embeds(self, alert_type: str, devices: List[Dict], risk_level: str) -> List[discord.Embed]:
+        """Um embed por dispositivo, com as portas abertas e seus níveis de risco."""
+        risk_emoji = RISK_EMOJIS.get(risk_level, '🟢')
+        timestamp = datetime.now()
+        embeds = []
 
-        except Exception as e:
-            self.logger.error(f"Erro ao enviar alerta do Discord: {e}")
+        for device in devices:
+            # Cria embed com cor baseada no nível de risco
+            embed = discord.Embed(
+                title=f"{risk_emoji} Alerta de Rede: {alert_type}",
+                color=RISK_COLORS.get(risk_level, 0x00FF00),
+                timestamp=timestamp
+            )
+
+            # Adiciona informações do dispositivo
+            embed.add_field(
+                name="📱 Informações do Dispositivo",
+                value=f"🌐 **Endereço IP:** {device['ip']}\n📍 **Endereço MAC:** {device['mac']}",
+                inline=False
+            )
+
+            # Adiciona informações das portas se disponível
+            if 'ports' in device and device['ports']:
+                ports_info = ""
+                for port in device['ports']:
+                    port_emoji = RISK_EMOJIS.get(port['risk_level'], '🟢')
+                    risk_text = '⚠️ ALTO RISCO' if port['risk_level'] == 'high' else '⚠️ Risco Médio' if port['risk_level'] == 'medium' else '✅ Baixo Risco'
+                    ports_info += f"{port_emoji} Porta **{port['port']}** - {port['service']}\n   └─ {risk_text}\n"
+
+                if ports_info:
+                    embed.add_field(
+                        name="🔍 Portas Abertas",
+                        value=_truncate(ports_info, MAX_FIELD_VALUE),
+                        inline=False
+                    )
+
+            # Adiciona rodapé com timestamp
+            embed.set_footer(text="Horário da Detecção")
+            embeds.append(embed)
+        return embeds
+
+    async def send_anomaly_alert(self, device: Dict, anomalies: List[Dict]):
+        """Enfileira um alerta de anomalias de tráfego detectadas para um dispositivo."""
+        self.dispatcher.submit('anomaly', "Anomalia de Tráfego", [device_dict(device)], 'high', anomalies)
+
+    @staticmethod
+    def _anomaly_item(device: Dict, anomalies: List[Dict]) -> DigestItem:
+        name = f"🌐 {device['ip']} · 📍 {device['mac']}"
+        description = "\n".join(f"⚠️ {anomaly['description']}" for anomaly in anomalies)
+        return "Anomalia de Tráfego", 'high', _truncate(name, MAX_FIELD_NAME), _truncate(description, MAX_FIELD_VALUE)
+
+    def _anomaly_embed(self, device: Dict, anomalies: List[Dict]) -> discord.Embed:
+        embed = discord.Embed(
+            title="🔴 Alerta de Rede: Anomalia de Tráfego",
+            color=0xFF0000,
+            timestamp=datetime.now()
+        )
+        embed.add_field(
+            name="📱 Informações do Dispositivo",
+            value=f"🌐 **Endereço IP:** {device['ip']}\n📍 **Endereço MAC:** {device['mac']}",
+            inline=False
+        )
+        embed.add_field(
+            name="📈 Anomalias",
+            value=self._anomaly_item(device, anomalies)[3],
+            inline=False
+        )
+        embed.set_footer(text="Horário da Detecção")
+        return embed
 
     async def notify_network_changes(self, new_devices: List[Dict], disconnected_devices: List[Dict], changed_devices: List[Dict]):
         """Envia notificações sobre mudanças na rede."""
+        changed_devices = [device_dict(device) for device in changed_devices]
         if new_devices:
             await self.send_alert("Novo Dispositivo Conectado", new_devices, 'low')
 
@@ -138,11 +418,14 @@ class DiscordNotifier:
 
         if changed_devices:
             for device in changed_devices:
-                risk_level = 'low'
-                for port in device.get('ports', []):
-                    if port['risk_level'] == 'high':
-                        risk_level = 'high'
-                        break
-                    elif port['risk_level'] == 'medium':
-                        risk_level = 'medium'
-                await self.send_alert("Alterações de Porta Detectadas", [device], risk_level)
\ No newline at end of file
+                await self.send_alert("Alterações de Porta Detectadas", [device], self._highest_risk([device]))
+
+    @staticmethod
+    def _highest_risk(devices: List[Dict]) -> str:
+        """Maior nível de risco entre as portas abertas dos dispositivos."""
+        risk_level = 'low'
+        for device in devices:
+            for port in device.get('ports', []):
+                if RISK_ORDER.get(port['risk_level'], 0) > RISK_ORDER[risk_level]:
+                    risk_level = port['risk_level']
+        return risk_level
\ No newline at end of file
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+# (número de sequência, tipo do evento, dados já serializados em JSON)
+StreamMessage = Tuple[int, str, str]
+
+
+class EventStream:
+    """Fila de mensagens numeradas para os clientes do stream SSE do painel.
+
+    As mensagens são serializadas uma única vez ao serem publicadas e mantidas em um
+    histórico limitado, para que um cliente que reconecta com o último número de
+    sequência recebido (Last-Event-ID) receba apenas o que perdeu. Publicar e ler
+    são seguros entre threads.
+    """
+
+    def __init__(self, backlog: int = 1000):
+        self._messages: 'deque[StreamMessage]' = deque(maxlen=backlog)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, event: str, data) -> int:
+        """Publica uma mensagem e acorda os clientes conectados; devolve seu número de sequência."""
+        payload = json.dumps(data, separators=(',', ':'))
+        with self._condition:
+            self._seq += 1
+            self._messages.append((self._seq, event, payload))
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+            seq = self._seq
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        return seq
+
+    def since(self, seq: int) -> Optional[List[StreamMessage]]:
+        """Mensagens posteriores a seq, ou None se parte delas já saiu do histórico."""
+        with self._condition:
+            if seq > self._seq:
+                return None
+            if self._messages and seq < self._messages[0][0] - 1:
+                return None
+            if not self._messages and seq < self._seq:
+                return None
+            return [message for message in self._messages if message[0] > seq]
+
+    def wait(self, seq: int, timeout: float) -> Optional[List[StreamMessage]]:
+        """Espera até timeout segundos por mensagens posteriores a seq (ver since)."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq, timeout=timeout)
+        return self.since(seq)
+
+    async def wait_async(self, seq: int, timeout: float) -> Optional[List[StreamMessage]]:
+        """Versão de wait para o loop de eventos, sem bloquear a thread."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._seq > seq:
+                return self.since(seq)
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._condition:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+        return self.since(seq)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def format_sse(message: StreamMessage) -> str:
+    """Formata uma mensagem no protocolo Server-Sent Events."""
+    seq, event, payload = message
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
@@ -1,79 +1,461 @@
+import argparse
 import asyncio
+import logging
 import os
+import socket
+import time
+
+# Início do processo, antes das demais importações, para medir o tempo de inicialização
+STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 from network_monitor import NetworkMonitor
-from discord_notifier import DiscordNotifier
+from port_scanner import AsyncConnectScanner
+from arp_discovery import ArpDiscovery
+from scan_cache import PortResultCache
+from traffic_capture import TrafficCapture
+from device_store import DeviceStore
+from change_detector import split_changes
+from device_record import DeviceRecord
+from scan_history import ScanHistoryStore
+from scan_scheduler import FixedRateTicker, PortScanScheduler
 from web_interface import WebInterface
+from aggregator import Aggregator
+from sensor_link import SensorClient
+from metrics import Gauge
 import threading
 
+# scapy (descoberta passiva), discord.py e aiohttp são importados só pelos componentes que os usam
+
+STARTUP_SECONDS = Gauge('botrede_startup_seconds', 'Tempo entre o início do processo e o bot ficar pronto')
+
 load_dotenv()
 
 class NetworkMonitorBot:
     def __init__(self):
+        # 'sensor' só varre e envia as mudanças ao agregador; 'aggregator' não varre, junta o que
+        # os sensores enviam e cuida da interface web e do Discord; 'standalone' faz tudo
+        self.mode = os.getenv('BOT_MODE', 'standalone').lower()
+        if self.mode not in ('standalone', 'sensor', 'aggregator'):
+            raise ValueError(f"BOT_MODE desconhecido: {self.mode}")
+        self.logger = logging.getLogger('NetworkMonitorBot')
+        # Componentes desligáveis: só varredura (sem web nem Discord), só a interface web
+        # (sobre o inventário salvo) ou sem Discord
+        self.scan_enabled = os.getenv('SCAN_ENABLED', 'True').lower() == 'true'
+        web_enabled = os.getenv('WEB_ENABLED', 'True').lower() == 'true'
+        discord_enabled = os.getenv('DISCORD_ENABLED', 'True').lower() == 'true'
+        if discord_enabled and not os.getenv('DISCORD_TOKEN') and self.mode != 'sensor':
+            self.logger.warning("DISCORD_TOKEN não definido; iniciando sem o Discord")
+            discord_enabled = False
+
+        self.network_monitor = None
+        self.passive_discovery = None
+        self.traffic_capture = None
+        self.port_scheduler = None
+        self.aggregator = None
+        self.sensor_client = None
+        if self.mode == 'aggregator':
+            if not web_enabled:
+                raise ValueError("BOT_MODE=aggregator requer WEB_ENABLED=True: os sensores enviam os lotes por HTTP")
+            if not os.getenv('SENSOR_TOKEN'):
+                self.logger.warning("SENSOR_TOKEN não definido; o agregador aceitará lotes de qualquer origem")
+            self.aggregator = Aggregator(
+                token=os.getenv('SENSOR_TOKEN') or None,
+                sensor_timeout=float(os.getenv('SENSOR_TIMEOUT', 900)),
+                dedup_window=float(os.getenv('ALERT_DEDUP_WINDOW', 300))
+            )
+        else:
+            self._setup_scanning()
+
+        if self.mode == 'sensor':
+            if not os.getenv('AGGREGATOR_URL'):
+                raise ValueError("BOT_MODE=sensor requer AGGREGATOR_URL")
+            if not self.scan_enabled:
+                raise ValueError("BOT_MODE=sensor requer SCAN_ENABLED=True")
+            if not os.getenv('SENSOR_TOKEN'):
+                self.logger.warning("SENSOR_TOKEN não definido; os lotes serão enviados sem autenticação")
+            self.sensor_client = SensorClient(
+                os.getenv('AGGREGATOR_URL'),
+                os.getenv('SENSOR_NAME') or socket.gethostname(),
+                inventory=lambda: self.network_monitor.known_devices,
+                ready=lambda: self.network_monitor.inventory_loaded,
+                token=os.getenv('SENSOR_TOKEN') or None,
+                flush_interval=float(os.getenv('SENSOR_FLUSH_INTERVAL', 1.0))
+            )
+            # O sensor não notifica nem atende a interface web: isso fica com o agregador
+            self.discord_notifier = None
+            self.web_interface = None
+            self.web_server = None
+            return
+
+        self.discord_notifier = None
+        if discord_enabled:
+            from discord_notifier import DiscordNotifier
+            self.discord_notifier = DiscordNotifier(
+                digest=os.getenv('DISCORD_DIGEST', 'False').lower() == 'true',
+                digest_window=float(os.getenv('DISCORD_DIGEST_WINDOW', 0)),
+                queue_size=int(os.getenv('NOTIFY_QUEUE_SIZE', 1000)),
+                backpressure=os.getenv('NOTIFY_BACKPRESSURE', 'drop_lowest'),
+                workers=int(os.getenv('NOTIFY_WORKERS', 1)),
+                spool_path=os.getenv('NOTIFY_SPOOL') or None,
+                cleanup_limit=int(os.getenv('DISCORD_CLEANUP_LIMIT', 100)),
+                max_attempts=int(os.getenv('NOTIFY_MAX_ATTEMPTS', 20))
+            )
+        self.web_interface = None
+        self.web_server = None
+        if not web_enabled:
+            return
+        # No agregador, a interface web mostra a visão combinada dos sensores
+        self.web_interface = WebInterface(self.aggregator or self.network_monitor)
+        # 'aiohttp' atende no próprio loop de eventos do bot; 'flask' usa o servidor de desenvolvimento em uma thread
+        if os.getenv('WEB_SERVER', 'aiohttp').lower() == 'aiohttp':
+            from async_web import AsyncWebServer
+            self.web_server = AsyncWebServer(self.web_interface, aggregator=self.aggregator)
+        elif self.aggregator is not None:
+            raise ValueError("BOT_MODE=aggregator requer WEB_SERVER=aiohttp")
+
+    def _setup_scanning(self):
+        """Cria o NetworkMonitor e os componentes de descoberta (modos standalone e sensor).
+
+        Com SCAN_ENABLED=False o NetworkMonitor não varre: só entrega à interface web o
+        inventário e o histórico salvos (DEVICE_DB, HISTORY_DB).
+        """
+        # Na descoberta passiva, a varredura ativa vira apenas uma reconciliação ocasional
+        self.passive_discovery = None
+        scan_interval = int(os.getenv('SCAN_INTERVAL', 300))
+        if self.scan_enabled and os.getenv('PASSIVE_DISCOVERY', 'False').lower() == 'true':
+            from passive_discovery import PassiveDiscovery
+            self.passive_discovery = PassiveDiscovery(
+                interface=os.getenv('PASSIVE_INTERFACE') or None,
+                offline=os.getenv('PASSIVE_PCAP') or None
+            )
+            scan_interval = int(os.getenv('RECONCILE_INTERVAL', 3600))
+
+        # Captura de tráfego alimentando a detecção de anomalias
+        self.traffic_capture = None
+        if self.scan_enabled and os.getenv('TRAFFIC_CAPTURE', 'False').lower() == 'true':
+            self.traffic_capture = TrafficCapture(
+                interface=os.getenv('TRAFFIC_INTERFACE') or None,
+                window_seconds=float(os.getenv('TRAFFIC_WINDOW', 10)),
+                offline=os.getenv('TRAFFIC_PCAP') or None
+            )
+
         # Inicializa os componentes
         self.network_monitor = NetworkMonitor(
-            scan_interval=int(os.getenv('SCAN_INTERVAL', 300)),
+            scan_interval=scan_interval,
             port_scan_timeout=int(os.getenv('PORT_SCAN_TIMEOUT', 2)),
-            scan_common_ports=os.getenv('PORT_SCAN_COMMON', 'True').lower() == 'true'
+            scan_common_ports=os.getenv('PORT_SCAN_COMMON', 'True').lower() == 'true',
+            max_concurrent_scans=int(os.getenv('PORT_SCAN_WORKERS', 32)),
+            host_scan_timeout=float(os.getenv('HOST_SCAN_TIMEOUT', 30)),
+            port_scan_engine=os.getenv('PORT_SCAN_ENGINE', 'nmap'),
+            nmap_batch_size=int(os.getenv('NMAP_BATCH_SIZE', 64)),
+            connect_scanner=AsyncConnectScanner(
+                global_limit=int(os.getenv('CONNECT_SCAN_CONCURRENCY', 256)),
+                per_host_limit=int(os.getenv('CONNECT_SCAN_PER_HOST', 64)),
+                connect_timeout=float(os.getenv('CONNECT_SCAN_TIMEOUT', 1.0)),
+                grab_banners=os.getenv('CONNECT_SCAN_BANNERS', 'False').lower() == 'true'
+            ),
+            arp_discovery=ArpDiscovery(
+                timeout=float(os.getenv('ARP_TIMEOUT', 3)),
+                retries=int(os.getenv('ARP_RETRIES', 1)),
+                send_rate=int(os.getenv('ARP_SEND_RATE', 1000)),
+                shard_prefix=int(os.getenv('ARP_SHARD_PREFIX', 24)),
+                processes=int(os.getenv('ARP_PROCESSES', 4))
+            ),
+            scan_interfaces=[i.strip() for i in os.getenv('SCAN_INTERFACES', '').split(',') if i.strip()],
+            scan_networks=[n.strip() for n in os.getenv('SCAN_NETWORKS', '').split(',') if n.strip()],
+            port_cache=PortResultCache(
+                max_entries=int(os.getenv('PORT_CACHE_SIZE', 4096)),
+                ttl=float(os.getenv('PORT_CACHE_TTL', 3600))
+            ) if os.getenv('INCREMENTAL_SCAN', 'False').lower() == 'true' else None,
+            device_store=DeviceStore(os.getenv('DEVICE_DB')) if os.getenv('DEVICE_DB') else None,
+            scan_history=ScanHistoryStore(
+                os.getenv('HISTORY_DB'),
+                raw_retention_days=int(os.getenv('HISTORY_RAW_DAYS', 7)),
+                rollup_retention_days=int(os.getenv('HISTORY_ROLLUP_DAYS', 365))
+            ) if os.getenv('HISTORY_DB') else None
         )
-        self.discord_notifier = DiscordNotifier()
-        self.web_interface = WebInterface(self.network_monitor)
+        # 'tiered' separa a varredura de presença (ARP, a cada PRESENCE_INTERVAL) da varredura
+        # de portas, espalhada para que cada host seja escaneado uma vez por SCAN_INTERVAL
+        self.scan_scheduler = os.getenv('SCAN_SCHEDULER', 'full').lower()
+        if self.scan_scheduler not in ('full', 'tiered'):
+            raise ValueError(f"SCAN_SCHEDULER desconhecido: {self.scan_scheduler}")
+        self.presence_interval = float(os.getenv('PRESENCE_INTERVAL', 30))
+        self.port_scheduler = PortScanScheduler(self.network_monitor.scan_interval) \
+            if self.scan_scheduler == 'tiered' else None
 
     async def monitor_network(self):
         """Loop contínuo de monitoramento de rede."""
+        # Os ciclos começam em intervalos fixos, sem somar a duração da varredura ao intervalo
+        ticker = FixedRateTicker(self.network_monitor.scan_interval, 'scan')
         while True:
+            await ticker.wait()
+
             # Obtém as mudanças na rede
-            new_devices, disconnected_devices, changed_devices = await self.network_monitor.get_network_changes()
+            events = await self.network_monitor.detect_changes()
+            await self.report_events(events)
+
+    async def monitor_presence(self):
+        """Modo em camadas: varreduras de presença frequentes, com as portas escaneadas à parte."""
+        ticker = FixedRateTicker(self.presence_interval, 'presence')
+        port_workers = []
+        while True:
+            await ticker.wait()
+            events = await self.network_monitor.detect_changes(scan_ports=False)
+
+            # Na primeira varredura todos os hosts são novos e entram na fila sem prioridade
+            changed = [] if not port_workers else [
+                event['device'].ip for event in events if event['type'] in ('new', 'moved', 'mac_conflict')
+            ]
+            self.port_scheduler.sync(self.network_monitor.known_devices, changed)
+            if not port_workers:
+                port_workers = [asyncio.ensure_future(self.scan_ports_continuously())
+                                for _ in range(self.network_monitor.max_concurrent_scans)]
+            await self.report_events(events)
 
-            # Atualiza os eventos na interface web
+    async def scan_ports_continuously(self):
+        """Escaneia as portas dos hosts no ritmo definido pelo PortScanScheduler."""
+        while True:
+            ip, had_baseline = await self.port_scheduler.next_host()
+            try:
+                changed = await self.network_monitor.refresh_host_ports(ip)
+            except Exception as e:
+                self.network_monitor.logger.error(f"Erro ao escanear portas de {ip}: {e}")
+                continue
+            if not changed:
+                continue
+            device = self.network_monitor.known_devices[ip]
+            if had_baseline:
+                self.port_scheduler.watch(ip)
+                await self.report_changes([], [], [device])
+            else:
+                # As portas encontradas na primeira varredura de um host não são uma mudança dele:
+                # só atualizam o dispositivo no painel (ou no agregador), sem evento nem alerta
+                self.publish_device(device)
+
+    def publish_device(self, device):
+        """Atualiza um dispositivo na interface web (ou no agregador) sem registrar um evento."""
+        if self.sensor_client is not None:
+            self.sensor_client.track([device], [])
+        elif self.web_interface is not None:
+            self.web_interface.publish_devices([device], [])
+
+    async def report_changes(self, new_devices, disconnected_devices, changed_devices):
+        """Publica as mudanças na interface web e envia as notificações do Discord."""
+        if self.sensor_client is not None:
+            self.sensor_client.track(new_devices + changed_devices, [d.ip for d in disconnected_devices])
+            return
+
+        # Atualiza os eventos na interface web
+        if self.web_interface is not None:
             for device in new_devices:
                 self.web_interface.add_event("Novo Dispositivo Conectado", device, 'low')
             for device in disconnected_devices:
                 self.web_interface.add_event("Dispositivo desconectado", device, 'low')
             for device in changed_devices:
-                risk_level = 'low'
-                for port in device.get('ports', []):
-                    if port['risk_level'] == 'high':
-                        risk_level = 'high'
-                        break
-                    elif port['risk_level'] == 'medium':
-                        risk_level = 'medium'
-                self.web_interface.add_event("Port Changes Detected", device, risk_level)
-
-            # Envia notificações do Discord
+                self.web_interface.add_event("Port Changes Detected", device, device.risk_level())
+            self.web_interface.publish_devices(new_devices + changed_devices, [d.ip for d in disconnected_devices])
+        elif self.discord_notifier is None:
+            # Só varredura: as mudanças ficam no log
+            for device in new_devices:
+                self.logger.info(f"Novo dispositivo: {device.ip} ({device.mac})")
+            for device in disconnected_devices:
+                self.logger.info(f"Dispositivo desconectado: {device.ip} ({device.mac})")
+            for device in changed_devices:
+                self.logger.info(f"Portas alteradas em {device.ip}: {device.port_numbers()}")
+
+        # Enfileira as notificações do Discord (enviadas em segundo plano)
+        if self.discord_notifier is not None:
             await self.discord_notifier.notify_network_changes(
                 new_devices, disconnected_devices, changed_devices
             )
 
-            # Aguarda o próximo intervalo de varredura
-            await asyncio.sleep(self.network_monitor.scan_interval)
+    async def report_events(self, events):
+        """Publica os eventos tipados de um ciclo: mudanças de IP e conflitos de MAC, além das demais."""
+        if self.sensor_client is not None:
+            # O agregador detecta de novo as mudanças na visão combinada e gera os alertas
+            self.sensor_client.track_events(events)
+            return
+
+        # moved e services_changed são publicados aqui; split_changes só leva adiante as mudanças de portas
+        conflicts, moved, services = [], [], []
+        for event in events:
+            if event['type'] == 'mac_conflict':
+                conflicts.append(event['device'])
+            elif event['type'] == 'moved':
+                moved.append(event['device'])
+            elif event['type'] == 'services_changed':
+                services.append(event['device'])
+            if self.web_interface is None:
+                if self.discord_notifier is None and event['type'] in ('moved', 'services_changed'):
+                    # Só varredura: as mudanças ficam no log
+                    self.logger.info(f"{event['type']}: {event['device'].ip} ({event['device'].mac})")
+                continue
+            if event['type'] == 'moved':
+                self.web_interface.add_event(f"Dispositivo mudou de IP (antes {event['previous_ip']})", event['device'], 'low')
+                self.web_interface.publish_devices([event['device']], [event['previous_ip']])
+            elif event['type'] == 'services_changed':
+                self.web_interface.add_event("Serviços alterados", event['device'], 'medium')
+                self.web_interface.publish_devices([event['device']], [])
+            elif event['type'] == 'mac_conflict':
+                if event['kind'] == 'multiple_ips':
+                    description = f"MAC respondendo por vários IPs: {', '.join(event['ips'])}"
+                else:
+                    description = f"IP trocou de MAC (antes {event['previous_mac']})"
+                self.web_interface.add_event(f"Conflito de MAC: {description}", event['device'], 'high')
+
+        if self.discord_notifier is not None:
+            if conflicts:
+                await self.discord_notifier.send_alert("Conflito de MAC (possível ARP spoofing)", conflicts, 'high')
+            if moved:
+                await self.discord_notifier.send_alert("Dispositivo mudou de IP", moved, 'low')
+            if services:
+                await self.discord_notifier.send_alert("Serviços alterados", services, 'medium')
+        await self.report_changes(*split_changes(events))
+
+    def publish_repeated(self, events):
+        """Atualiza o painel com as mudanças cujos alertas o agregador descartou por repetição."""
+        new_devices, disconnected_devices, changed_devices = split_changes(events)
+        updated = new_devices + changed_devices
+        updated += [event['device'] for event in events if event['type'] in ('moved', 'services_changed')]
+        removed = [d.ip for d in disconnected_devices]
+        removed += [event['previous_ip'] for event in events if event['type'] == 'moved']
+        self.web_interface.publish_devices(updated, removed)
+
+    async def watch_passive_discovery(self):
+        """Registra os hosts anunciados via ARP/DHCP assim que aparecem na rede."""
+        # As respostas ARP da própria máquina também passam pela captura
+        local_ips = {str(iface.ip) for _, iface in self.network_monitor.get_interface_networks()}
+        async for ip, mac in self.passive_discovery.listen():
+            if ip in local_ips:
+                continue
+            events = self.network_monitor.register_host(ip, mac)
+            if not events:
+                continue
+            await self.report_events(events)
+            if events[0]['type'] == 'new':
+                if self.port_scheduler is not None:
+                    self.port_scheduler.prioritize(ip)
+                else:
+                    asyncio.ensure_future(self._scan_passive_host(ip))
+
+    async def _scan_passive_host(self, ip: str):
+        """Escaneia as portas de um host novo visto passivamente e avisa se houver portas abertas."""
+        if await self.network_monitor.refresh_host_ports(ip):
+            await self.report_changes([], [], [self.network_monitor.known_devices[ip]])
+
+    async def watch_traffic(self):
+        """Analisa cada janela de tráfego capturada e alerta sobre as anomalias encontradas."""
+        async for summary in self.traffic_capture.windows():
+            anomalies = self.network_monitor.analyze_traffic_window(summary)
+            for ip, found in anomalies.items():
+                device = self.network_monitor.known_devices.get(ip) or DeviceRecord(ip, 'desconhecido', time.time())
+                await self.report_anomalies(device, found)
+
+    async def report_anomalies(self, device, anomalies):
+        """Publica as anomalias de tráfego de um dispositivo e envia o alerta do Discord."""
+        if self.sensor_client is not None:
+            self.sensor_client.track_anomalies(device, anomalies)
+            return
+        if self.web_interface is not None:
+            for anomaly in anomalies:
+                self.web_interface.add_event(f"Anomalia de Tráfego: {anomaly['description']}", device, anomaly['severity'])
+        elif self.discord_notifier is None:
+            for anomaly in anomalies:
+                self.logger.warning(f"Anomalia de tráfego em {device.ip}: {anomaly['description']}")
+        if self.discord_notifier is not None:
+            await self.discord_notifier.send_anomaly_alert(device, anomalies)
 
     def start_web_interface(self):
         """Inicia a interface web em uma thread separada."""
         self.web_interface.run()
 
+    def _report_startup(self):
+        """Registra o tempo entre o início do processo e o bot ficar pronto para varrer e atender."""
+        elapsed = time.perf_counter() - STARTED
+        STARTUP_SECONDS.set(elapsed)
+        components = [name for name, enabled in (
+            ('agregador', self.aggregator is not None),
+            ('varredura', self.network_monitor is not None and self.scan_enabled),
+            ('sensor', self.sensor_client is not None),
+            ('web', self.web_interface is not None),
+            ('Discord', self.discord_notifier is not None)
+        ) if enabled]
+        self.logger.info(f"Bot pronto em {elapsed:.2f}s (modo {self.mode}: {', '.join(components)})")
+
     async def start(self):
         """Inicia todos os componentes do bot de monitoramento de rede."""
-        # Inicia a interface web em uma thread separada
-        web_thread = threading.Thread(target=self.start_web_interface)
-        web_thread.daemon = True
-        web_thread.start()
+        if self.web_server is not None:
+            await self.web_server.start(os.getenv('WEB_HOST', '127.0.0.1'), int(os.getenv('WEB_PORT', 5000)))
+        elif self.web_interface is not None:
+            # Inicia a interface web em uma thread separada
+            web_thread = threading.Thread(target=self.start_web_interface)
+            web_thread.daemon = True
+            web_thread.start()
+        self._report_startup()
+
+        if self.aggregator is not None:
+            # O agregador não varre: publica as mudanças da visão combinada dos sensores
+            await self.aggregator.run(self.report_events, self.publish_repeated, self.report_anomalies)
+            return
+        if not self.scan_enabled:
+            # Só a interface web: o inventário não muda enquanto o bot roda
+            return
+        if self.sensor_client is not None:
+            asyncio.ensure_future(self.sensor_client.run())
+
+        # Inicia a descoberta passiva em paralelo com a varredura ativa
+        if self.passive_discovery:
+            asyncio.ensure_future(self.watch_passive_discovery())
+        if self.traffic_capture:
+            asyncio.ensure_future(self.watch_traffic())
 
         # Inicia o monitoramento de rede
-        await self.monitor_network()
+        if self.port_scheduler is not None:
+            await self.monitor_presence()
+        else:
+            await self.monitor_network()
 
 if __name__ == '__main__':
+    # Atalhos para as variáveis de ambiente dos componentes; têm precedência sobre o .env
+    parser = argparse.ArgumentParser(description='Bot de monitoramento de rede')
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument('--scan-only', action='store_true', help='só varre a rede, sem interface web nem Discord')
+    modes.add_argument('--web-only', action='store_true',
+                       help='só a interface web, sobre o inventário e o histórico salvos')
+    parser.add_argument('--no-discord', action='store_true', help='não conecta ao Discord')
+    args = parser.parse_args()
+    if args.scan_only:
+        os.environ.update(WEB_ENABLED='False', DISCORD_ENABLED='False')
+    if args.web_only:
+        os.environ.update(SCAN_ENABLED='False', DISCORD_ENABLED='False')
+    if args.no_discord:
+        os.environ['DISCORD_ENABLED'] = 'False'
+
     bot = NetworkMonitorBot()
+    if not logging.getLogger().handlers:
+        # Sem NetworkMonitor (agregador) ninguém configurou o log
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     try:
         # Inicia o cliente Discord e o monitoramento de rede
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.create_task(bot.discord_notifier.start())
+        if bot.discord_notifier is not None:
+            loop.create_task(bot.discord_notifier.start())
         loop.create_task(bot.start())
         loop.run_forever()
     except KeyboardInterrupt:
         print("\nDesligando...")
     finally:
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(bot.discord_notifier.stop())
+        if bot.discord_notifier is not None:
+            loop.run_until_complete(bot.discord_notifier.stop())
+        if bot.web_server is not None:
+            loop.run_until_complete(bot.web_server.stop())
+        if bot.network_monitor is not None:
+            bot.network_monitor.arp_discovery.close()
+            if bot.network_monitor.device_store:
+                bot.network_monitor.device_store.close()
+            if bot.network_monitor.scan_history:
+                bot.network_monitor.scan_history.close()
         loop.close()
\ No newline at end of file
@@ -0,0 +1,227 @@
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Limites (em segundos) dos buckets padrão dos histogramas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (sufixo do nome, labels, valor) de cada linha exposta por uma métrica
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels) + '}'
+
+
+class Registry:
+    """Conjunto de métricas expostas juntas no formato de texto do Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, 'Metric'] = {}
+
+    def register(self, metric: 'Metric'):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional['Metric']:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Todas as métricas no formato de exposição em texto (versão 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base das métricas: um valor (ou filho) por combinação de labels.
+
+    As atualizações são feitas sem trava: o bot só altera as métricas a partir da
+    thread do loop de eventos, e uma leitura concorrente enxerga no máximo uma
+    observação a menos.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._function: Optional[Callable[[], object]] = None
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Filho da métrica para os valores de labels informados (criado no primeiro uso)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera os labels {self.labelnames}")
+            child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def set_function(self, function: Callable[[], object]):
+        """Calcula o valor apenas na leitura das métricas, sem custo no caminho quente.
+
+        A função devolve um número, ou, para métricas com labels, um dict que associa
+        a tupla de valores dos labels a um número.
+        """
+        self._function = function
+
+    def _function_samples(self) -> Iterator[Sample]:
+        values = self._function()
+        if not self.labelnames:
+            values = {(): values}
+        for label_values, value in values.items():
+            yield '', tuple(zip(self.labelnames, label_values)), float(value)
+
+    def samples(self) -> Iterator[Sample]:
+        if self._function is not None:
+            yield from self._function_samples()
+            return
+        for label_values, child in list(self._children.items()):
+            labels = tuple(zip(self.labelnames, label_values))
+            yield from child.samples(labels)
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, labels) -> Iterator[Sample]:
+        yield '', labels, self.value
+
+
+class Counter(Metric):
+    """Contador que só cresce (por convenção, o nome termina em _total)."""
+
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+
+class Gauge(Metric):
+    """Valor que sobe e desce, como tamanhos de fila e contagens atuais."""
+
+    type = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._children[()].dec(amount)
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: '_HistogramValue'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)  # O último bucket é o +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        """Context manager que observa a duração do bloco."""
+        return _Timer(self)
+
+    def samples(self, labels) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            yield '_bucket', labels + (('le', _format_value(bound)),), cumulative
+        yield '_sum', labels, self.sum
+        yield '_count', labels, cumulative
+
+
+class Histogram(Metric):
+    """Distribuição de durações (ou tamanhos) em buckets cumulativos."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def set_function(self, function: Callable[[], object]):
+        raise TypeError("Histogramas não aceitam valores calculados na leitura")
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self) -> _Timer:
+        return self._children[()].time()
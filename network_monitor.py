@@ -1,24 +1,87 @@
-import scapy.all as scapy
-import nmap
 import netifaces
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import ipaddress
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import logging
 import asyncio
+import time
 from collections import defaultdict
-import statistics
+from arp_discovery import ArpDiscovery
+from port_scanner import (AsyncConnectScanner, SUBPROCESSES_RUNNING, SUBPROCESSES_STARTED, parse_port_range,
+                          scan_ports_nmap_batch)
+from scan_cache import PortResultCache
+from device_store import DeviceStore
+from scan_history import ScanHistoryStore
+from change_detector import ChangeDetector, split_changes
+from device_snapshot import DeviceSnapshot
+from device_record import NO_PORTS, DeviceRecord, pack_ports
+from traffic_history import TrafficRingBuffer, exact_mean, exact_stdev
+from metrics import Counter, Gauge, Histogram
+
+# Engines de varredura de portas disponíveis
+PORT_SCAN_ENGINES = ('nmap', 'nmap_batch', 'native')
+
+# Janela de amostras usada na detecção de anomalias e retenção do histórico de tráfego
+ANOMALY_WINDOW = 10
+TRAFFIC_RETENTION = 24 * 3600
+# Maior rede varrida de uma vez (/16 = 65.536 endereços); redes maiores são reduzidas a ela
+MIN_SCAN_PREFIX = 16
+
+# Métricas expostas em /metrics. As fases 'discovery' (varredura ARP) e 'port_scan'
+# (da primeira resposta ARP até a última varredura de portas) se sobrepõem
+SCAN_PHASE_SECONDS = Histogram(
+    'botrede_scan_phase_seconds', 'Duração de cada fase do ciclo de varredura', ['phase']
+)
+HOST_PORT_SCAN_SECONDS = Histogram(
+    'botrede_host_port_scan_seconds', 'Duração da varredura de portas de cada host', ['engine']
+)
+HOST_PORT_SCAN_TIMEOUTS = Counter(
+    'botrede_host_port_scan_timeouts_total', 'Varreduras de portas de um host que excederam host_scan_timeout'
+)
+DEVICES = Gauge('botrede_devices', 'Dispositivos conhecidos')
+CHANGE_EVENTS = Counter('botrede_change_events_total', 'Eventos de mudança detectados', ['type'])
 
 class NetworkMonitor:
-    def __init__(self, scan_interval: int = 300, port_scan_timeout: int = 2, scan_common_ports: bool = True):
+    def __init__(self, scan_interval: int = 300, port_scan_timeout: int = 2, scan_common_ports: bool = True,
+                 max_concurrent_scans: int = 32, host_scan_timeout: float = 30.0,
+                 port_scan_engine: str = 'nmap', nmap_batch_size: int = 64,
+                 connect_scanner: Optional[AsyncConnectScanner] = None,
+                 arp_discovery: Optional[ArpDiscovery] = None,
+                 scan_interfaces: Optional[List[str]] = None, scan_networks: Optional[List[str]] = None,
+                 port_cache: Optional[PortResultCache] = None, traffic_history_capacity: int = 8640,
+                 device_store: Optional[DeviceStore] = None,
+                 scan_history: Optional[ScanHistoryStore] = None):
+        if port_scan_engine not in PORT_SCAN_ENGINES:
+            raise ValueError(f"Engine de varredura de portas desconhecida: {port_scan_engine}")
         self.scan_interval = scan_interval
         self.port_scan_timeout = port_scan_timeout
         self.scan_common_ports = scan_common_ports
-        self.known_devices: Dict[str, dict] = {}
-        self.nm = nmap.PortScanner()
+        self.max_concurrent_scans = max(1, max_concurrent_scans)  # Limite de varreduras de porta simultâneas
+        self.host_scan_timeout = host_scan_timeout  # Tempo máximo da varredura de portas de um host
+        self.port_scan_engine = port_scan_engine
+        self.nmap_batch_size = max(1, nmap_batch_size)  # Hosts por execução do nmap no modo 'nmap_batch'
+        self.connect_scanner = connect_scanner or AsyncConnectScanner()  # Usado no modo 'native'
+        self.arp_discovery = arp_discovery or ArpDiscovery()
+        self.scan_interfaces = scan_interfaces or []  # Interfaces varridas (vazio = interface primária)
+        self.port_cache = port_cache  # Modo incremental: reaproveita portas de hosts sem mudanças
+        self.device_store = device_store  # Inventário persistente (SQLite)
+        self.scan_history = scan_history  # Série temporal das observações de cada ciclo
+        self.known_devices: Dict[str, DeviceRecord] = {}  # Registros compactos; dicts só nas fronteiras
+        self.change_detector = ChangeDetector()  # Compara os ciclos pelo MAC de cada dispositivo
+        self.snapshot = DeviceSnapshot(0, ())  # Cópia imutável de known_devices lida pela interface web
+        self._snapshot_scheduled = False
+        self._history_recorded = 0.0  # Horário do último ciclo gravado no histórico
+        # True depois do primeiro ciclo de varredura ou de restaurar um inventário salvo
+        self.inventory_loaded = False
+        DEVICES.set_function(lambda: len(self.known_devices))
         self._setup_logging()
+        self.scan_networks = self._parse_scan_networks(scan_networks or [])  # Redes CIDR adicionais a varrer
+        self._monitored_networks: Optional[List[ipaddress.IPv4Network]] = None  # Redes do último get_scan_targets
         
         # Atributos para análise de tráfego e detecção de anomalias
-        self.traffic_history = defaultdict(list)  # Histórico de tráfego por IP
+        # Histórico de tráfego por IP, em buffers circulares de tamanho fixo
+        self.traffic_history: Dict[str, TrafficRingBuffer] = defaultdict(
+            lambda: TrafficRingBuffer(traffic_history_capacity, ANOMALY_WINDOW)
+        )
         self.baseline_traffic = {}  # Padrões normais de tráfego
         self.anomaly_thresholds = {
             'traffic_spike': 2.0,  # Multiplicador para picos de tráfego
@@ -26,72 +89,381 @@ class NetworkMonitor:
             'connection_frequency': 10  # Conexões por minuto
         }
 
+        if self.device_store is not None:
+            self.warm_start()
+
     def _setup_logging(self):
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             handlers=[
-                logging.FileHandler('network_monitor.log'),
+                # delay: o arquivo só é criado se o handler for usado (basicConfig é ignorado
+                # quando o log já foi configurado, como nos benchmarks)
+                logging.FileHandler('network_monitor.log', delay=True),
                 logging.StreamHandler()
             ]
         )
         self.logger = logging.getLogger('NetworkMonitor')
 
-    def get_network_interface(self) -> Optional[Tuple[str, str]]:
-        """Obtém a interface de rede primária e seu endereço IP."""
+    def warm_start(self):
+        """Restaura o inventário salvo para que um reinício não reporte tudo como novo."""
+        try:
+            self.known_devices = self.device_store.load_online()
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar o inventário salvo: {e}")
+            return
+        self.change_detector.reset(list(self.known_devices.values()))
+        self._publish_snapshot()
+        self.inventory_loaded = bool(self.known_devices)
+
+        # Portas recentes voltam ao cache e não precisam ser escaneadas de novo
+        if self.port_cache is not None:
+            now = time.time()
+            for ip, device in self.known_devices.items():
+                self.port_cache.put(device.mac, ip, device.ports, age=max(0.0, now - device.seen))
+
+        self.logger.info(f"Inventário restaurado com {len(self.known_devices)} dispositivos")
+
+    def get_interface_networks(self) -> List[Tuple[str, ipaddress.IPv4Interface]]:
+        """Lista os endereços IPv4 (com a máscara real) de todas as interfaces não-loopback."""
+        networks = []
         try:
             for interface in netifaces.interfaces():
                 addrs = netifaces.ifaddresses(interface)
-                if netifaces.AF_INET in addrs:
-                    for addr in addrs[netifaces.AF_INET]:
-                        ip = addr['addr']
-                        if not ip.startswith('127.'):
-                            return interface, ip
+                for addr in addrs.get(netifaces.AF_INET, []):
+                    ip = addr['addr']
+                    if ip.startswith('127.'):
+                        continue
+                    netmask = addr.get('netmask') or '255.255.255.0'
+                    networks.append((interface, ipaddress.IPv4Interface(f"{ip}/{netmask}")))
         except Exception as e:
-            self.logger.error(f"Erro ao obter interface de rede: {e}")
-        return None
+            self.logger.error(f"Erro ao obter interfaces de rede: {e}")
+        return networks
 
-    async def scan_network(self) -> List[dict]:
-        """Escaneia a rede em busca de dispositivos conectados."""
+    def _parse_scan_networks(self, cidrs: List[str]) -> List[ipaddress.IPv4Network]:
+        """Valida as redes CIDR configuradas; entradas inválidas são ignoradas com um erro no log.
+
+        Redes maiores que /16 são reduzidas ao /16 inicial, como as das interfaces.
+        """
+        networks = []
+        for cidr in cidrs:
+            try:
+                network = ipaddress.IPv4Network(cidr, strict=False)
+            except ValueError as e:
+                self.logger.error(f"Rede inválida em scan_networks ignorada: {e}")
+                continue
+            if network.prefixlen < MIN_SCAN_PREFIX:
+                capped = ipaddress.IPv4Network((network.network_address, MIN_SCAN_PREFIX))
+                self.logger.warning(f"Rede {network} de scan_networks é grande demais; varrendo apenas {capped}")
+                network = capped
+            networks.append(network)
+        return networks
+
+    def get_scan_targets(self) -> List[Tuple[str, Optional[str]]]:
+        """Monta a lista de redes (cidr, interface) a varrer.
+
+        Sem configuração, varre apenas a rede da interface primária. Com scan_interfaces,
+        varre as redes dessas interfaces; redes de scan_networks são sempre incluídas e
+        associadas à interface que as contém, quando houver.
+        """
+        interface_networks = self.get_interface_networks()
+        if self.scan_interfaces:
+            selected = [(name, iface) for name, iface in interface_networks if name in self.scan_interfaces]
+        elif self.scan_networks:
+            selected = []
+        else:
+            selected = interface_networks[:1]
+
+        targets: Dict[str, Optional[str]] = {}
+        for name, iface in selected:
+            network = iface.network
+            if network.prefixlen < MIN_SCAN_PREFIX:
+                # Evita varrer milhões de endereços em interfaces com máscaras muito largas
+                self.logger.warning(f"Rede {network} de {name} é grande demais; varrendo apenas /{MIN_SCAN_PREFIX} de {iface.ip}")
+                network = ipaddress.IPv4Interface(f"{iface.ip}/{MIN_SCAN_PREFIX}").network
+            targets.setdefault(str(network), name)
+
+        for network in self.scan_networks:
+            interface = next((name for name, iface in interface_networks if network.overlaps(iface.network)), None)
+            targets.setdefault(str(network), interface)
+
+        self._monitored_networks = [ipaddress.IPv4Network(cidr) for cidr in targets]
+        return list(targets.items())
+
+    async def scan_network(self, scan_ports: bool = True) -> List[DeviceRecord]:
+        """Escaneia a rede em busca de dispositivos conectados.
+
+        Com scan_ports=False faz apenas a varredura de presença (ARP): cada host mantém
+        as portas já conhecidas, que ficam a cargo de refresh_host_ports.
+        """
         try:
-            interface_info = self.get_network_interface()
-            if not interface_info:
+            targets = self.get_scan_targets()
+            if not targets:
                 self.logger.error("Nenhuma interface de rede adequada encontrada")
                 return []
 
-            interface, ip = interface_info
-            network = '.'.join(ip.split('.')[:-1]) + '.0/24'
-
-            # Escaneamento ARP para descobrir dispositivos
-            arp_request = scapy.ARP(pdst=network)
-            broadcast = scapy.Ether(dst="ff:ff:ff:ff:ff:ff")
-            arp_request_broadcast = broadcast/arp_request
-            answered_list = scapy.srp(arp_request_broadcast, timeout=3, verbose=False)[0]
+            # O ciclo inteiro (ARP + portas) deve caber dentro de scan_interval
+            deadline = asyncio.get_event_loop().time() + self.scan_interval
 
-            devices = []
-            for element in answered_list:
-                ports = await self.scan_ports_async(element[1].psrc) if self.scan_common_ports else []
-                device = {
-                    'ip': element[1].psrc,
-                    'mac': element[1].hwsrc,
-                    'timestamp': datetime.now().isoformat(),
-                    'ports': ports
-                }
-                devices.append(device)
+            # Escaneamento ARP para descobrir dispositivos; as respostas chegam conforme
+            # os hosts respondem, sem bloquear o loop de eventos. Os resultados de todas as
+            # redes são mesclados em um único mapa de dispositivos, indexado pelo IP.
+            hosts = self._timed_discovery(self.arp_discovery.sweep_many(targets))
+            if not scan_ports:
+                # As portas são lidas só no fim da varredura, para incluir as varreduras
+                # de portas que terminarem enquanto ela acontece
+                discovered = {host_ip: mac async for host_ip, mac in hosts}
+                return [self._build_device(host_ip, mac, self._known_ports(host_ip, mac))
+                        for host_ip, mac in discovered.items()]
+            if not self.scan_common_ports:
+                devices = {host_ip: self._build_device(host_ip, mac, NO_PORTS) async for host_ip, mac in hosts}
+                return list(devices.values())
 
-            return devices
+            with SCAN_PHASE_SECONDS.labels('port_scan').time():
+                return await self._scan_hosts_ports(hosts, deadline)
 
         except Exception as e:
             self.logger.error(f"Erro ao escanear rede: {e}")
             return []
 
-    async def scan_ports_async(self, ip: str) -> List[dict]:
-        """Versão assíncrona do scanner de portas para melhor eficiência."""
+    async def _timed_discovery(self, hosts: AsyncIterator[Tuple[str, str]]) -> AsyncIterator[Tuple[str, str]]:
+        """Repassa os hosts descobertos, medindo quanto a varredura ARP levou até terminar."""
+        start = time.perf_counter()
+        async for host in hosts:
+            yield host
+        SCAN_PHASE_SECONDS.labels('discovery').observe(time.perf_counter() - start)
+
+    def _build_device(self, ip: str, mac: str, ports: Tuple[int, ...]) -> DeviceRecord:
+        """Monta o registro de um dispositivo visto agora, com as portas já empacotadas."""
+        return DeviceRecord(ip, mac, time.time(), ports)
+
+    def _last_known_ports(self, ip: str) -> Tuple[int, ...]:
+        """Portas do ciclo anterior, usadas quando a varredura de um host não termina a tempo."""
+        device = self.known_devices.get(ip)
+        return device.ports if device is not None else NO_PORTS
+
+    def _known_ports(self, ip: str, mac: str) -> Tuple[int, ...]:
+        """Portas já conhecidas de um host, desde que ele ainda seja o mesmo dispositivo (mesmo MAC)."""
+        device = self.known_devices.get(ip)
+        if device is not None and device.mac == mac.lower():
+            return device.ports
+        cached_ports = self.port_cache.peek(mac, ip) if self.port_cache is not None else None
+        return cached_ports or NO_PORTS
+
+    async def _scan_hosts_ports(self, hosts: AsyncIterator[Tuple[str, str]], deadline: float) -> List[DeviceRecord]:
+        """Escaneia as portas dos hosts em paralelo conforme eles são descobertos.
+
+        O número de varreduras simultâneas é limitado por max_concurrent_scans. Os dispositivos
+        são devolvidos na ordem em que suas varreduras terminam. Hosts que excedem
+        host_scan_timeout, ou que ainda estão pendentes quando o ciclo ultrapassa o prazo,
+        mantêm as portas conhecidas do ciclo anterior para não gerar alterações falsas.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_scans)
+        results: Dict[str, DeviceRecord] = {}
+        discovered: Dict[str, str] = {}
+        tasks: List[asyncio.Future] = []
+
+        async def run_stage():
+            batch: List[Tuple[str, str]] = []
+            async for host_ip, mac in hosts:
+                if host_ip in discovered:
+                    continue
+                discovered[host_ip] = mac
+                cached_ports = self.port_cache.get(mac, host_ip) if self.port_cache is not None else None
+                if cached_ports is not None:
+                    results[host_ip] = self._build_device(host_ip, mac, cached_ports)
+                elif self.port_scan_engine == 'nmap_batch':
+                    batch.append((host_ip, mac))
+                    if len(batch) >= self.nmap_batch_size:
+                        tasks.append(asyncio.ensure_future(self._scan_batch(batch, semaphore, results)))
+                        batch = []
+                else:
+                    tasks.append(asyncio.ensure_future(self._scan_host(host_ip, mac, semaphore, results)))
+            if batch:
+                tasks.append(asyncio.ensure_future(self._scan_batch(batch, semaphore, results)))
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
         try:
-            if self.scan_common_ports:
-                ports = '20-23,25,53,80,110,143,443,445,3389'
+            remaining = max(0.0, deadline - asyncio.get_event_loop().time())
+            await asyncio.wait_for(run_stage(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pending = sum(1 for host_ip in discovered if host_ip not in results)
+            self.logger.warning(
+                f"Ciclo de varredura excedeu scan_interval ({self.scan_interval}s); "
+                f"cancelando {pending} varreduras pendentes"
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        for host_ip, mac in discovered.items():
+            if host_ip not in results:
+                results[host_ip] = self._build_device(host_ip, mac, self._last_known_ports(host_ip))
+
+        if self.port_cache is not None:
+            stats = self.port_cache.stats()
+            self.logger.info(
+                f"Cache de portas: {stats['hits']} acertos, {stats['misses']} falhas, {stats['size']} entradas"
+            )
+
+        return list(results.values())
+
+    def register_host(self, ip: str, mac: str) -> List[dict]:
+        """Registra um host observado pela descoberta passiva e devolve os eventos gerados.
+
+        - IP novo com MAC desconhecido: evento 'new'.
+        - IP conhecido que passou a responder com outro MAC: 'mac_conflict' (possível
+          ARP spoofing), emitido na hora.
+        - IP novo com um MAC já visto em outro IP: o ChangeDetector não é atualizado, e
+          o próximo ciclo decide se o host mudou de IP ('moved') ou se o MAC responde
+          pelos dois ('mac_conflict').
+        - Host já conhecido com o mesmo MAC: só atualiza o horário da última observação.
+        """
+        mac = mac.lower()
+        device = self.known_devices.get(ip)
+        if device is not None:
+            # Os registros são imutáveis: o snapshot publicado continua com a versão anterior
+            previous_mac = device.mac
+            device = self.known_devices[ip] = device.replace(mac=mac, seen=time.time())
+            self.change_detector.update(device)
+            self._schedule_snapshot()
+            if previous_mac == mac:
+                return []
+            return [{
+                'type': 'mac_conflict', 'kind': 'ip_mac_changed',
+                'device': device, 'ips': [ip], 'previous_mac': previous_mac
+            }]
+
+        known_mac = any(known.mac == mac for known in self.known_devices.values())
+        cached_ports = self.port_cache.get(mac, ip) if self.port_cache is not None else None
+        device = self._build_device(ip, mac, cached_ports or NO_PORTS)
+        self.known_devices[ip] = device
+        self._schedule_snapshot()
+        if known_mac:
+            return []
+        self.change_detector.update(device)
+        return [{'type': 'new', 'device': device}]
+
+    async def refresh_host_ports(self, ip: str) -> bool:
+        """Escaneia as portas de um host conhecido e atualiza known_devices.
+
+        Devolve True se as portas abertas mudaram em relação ao que estava registrado.
+        """
+        device = self.known_devices.get(ip)
+        if device is None:
+            return False
+        mac = device.mac
+        results: Dict[str, DeviceRecord] = {}
+        await self._scan_host(ip, mac, asyncio.Semaphore(1), results)
+        # Uma varredura de presença pode ter substituído known_devices durante a varredura
+        device = self.known_devices.get(ip)
+        if device is None or device.mac != mac:
+            return False
+        old_ports = device.port_numbers()
+        device = self.known_devices[ip] = device.replace(ports=results[ip].ports)
+        self.change_detector.update(device)
+        self._schedule_snapshot()
+        return old_ports != device.port_numbers()
+
+    def _publish_snapshot(self):
+        """Publica uma nova versão do snapshot de dispositivos para a interface web."""
+        self._snapshot_scheduled = False
+        self.snapshot = DeviceSnapshot.build(self.snapshot.version + 1, self.known_devices)
+
+    def _schedule_snapshot(self):
+        """Publica o snapshot na próxima volta do loop, juntando as mudanças feitas até lá."""
+        if not self._snapshot_scheduled:
+            self._snapshot_scheduled = True
+            asyncio.get_event_loop().call_soon(self._publish_snapshot)
+
+    async def _scan_host(self, ip: str, mac: str, semaphore: asyncio.Semaphore, results: Dict[str, DeviceRecord]):
+        """Escaneia as portas de um único host com o nmap ou com o scanner nativo.
+
+        No modo 'nmap_batch', um host isolado é escaneado com um processo nmap próprio.
+        Se a varredura falhar ou não terminar a tempo, o host mantém as portas do ciclo
+        anterior e nada entra no cache.
+        """
+        async with semaphore:
+            if self.port_scan_engine == 'native':
+                engine, scan = 'native', self.scan_ports_native(ip)
             else:
-                ports = '1-1024'
+                engine, scan = 'nmap', self.scan_ports_async(ip)
+            start = time.perf_counter()
+            try:
+                open_ports = await asyncio.wait_for(scan, self.host_scan_timeout)
+            except asyncio.TimeoutError:
+                HOST_PORT_SCAN_TIMEOUTS.inc()
+                self.logger.warning(f"Tempo esgotado ao escanear portas de {ip}")
+                open_ports = None
+            if open_ports is None:
+                ports = self._last_known_ports(ip)
+            else:
+                ports = pack_ports(open_ports)
+                self._cache_ports(mac, ip, ports)
+            HOST_PORT_SCAN_SECONDS.labels(engine).observe(time.perf_counter() - start)
+        results[ip] = self._build_device(ip, mac, ports)
+
+    def _cache_ports(self, mac: str, ip: str, ports: Tuple[int, ...]):
+        if self.port_cache is not None:
+            self.port_cache.put(mac, ip, ports)
+
+    async def _scan_batch(self, hosts: List[Tuple[str, str]], semaphore: asyncio.Semaphore,
+                          results: Dict[str, DeviceRecord]):
+        """Escaneia um lote de hosts com uma única execução do nmap.
+
+        Cada host entra em results assim que seu bloco XML é recebido, sem esperar o lote inteiro.
+        Hosts cuja varredura falhou mantêm as portas do ciclo anterior e não entram no cache,
+        como no tempo esgotado da varredura por host.
+        """
+        macs = dict(hosts)
+        async with semaphore:
+            # A latência de cada host conta do início do lote até a chegada do seu resultado
+            latency = HOST_PORT_SCAN_SECONDS.labels('nmap_batch')
+            start = time.perf_counter()
+            try:
+                async for ip, ports in scan_ports_nmap_batch(
+                    list(macs), self._port_range(), self.port_scan_timeout, self.assess_port_risk
+                ):
+                    if ip not in macs:
+                        continue
+                    latency.observe(time.perf_counter() - start)
+                    if ports is None:
+                        HOST_PORT_SCAN_TIMEOUTS.inc()
+                        self.logger.warning(f"Varredura de portas de {ip} não concluída no lote do nmap")
+                        packed = self._last_known_ports(ip)
+                    else:
+                        packed = pack_ports(ports)
+                        self._cache_ports(macs[ip], ip, packed)
+                    results[ip] = self._build_device(ip, macs[ip], packed)
+            except Exception as e:
+                self.logger.error(f"Erro ao escanear portas de {len(macs)} hosts em lote: {e}")
+
+    def _port_range(self) -> str:
+        """Faixa de portas usada pelas varreduras, no formato do nmap."""
+        if self.scan_common_ports:
+            return '20-23,25,53,80,110,143,443,445,3389'
+        return '1-1024'
+
+    async def scan_ports_native(self, ip: str) -> Optional[List[dict]]:
+        """Escaneia as portas de um host com conexões TCP diretas, sem iniciar o nmap.
+
+        Devolve None se a varredura falhar.
+        """
+        try:
+            return await self.connect_scanner.scan_host(ip, parse_port_range(self._port_range()), self.assess_port_risk)
+        except Exception as e:
+            self.logger.error(f"Erro ao escanear portas para {ip}: {e}")
+            return None
+
+    async def scan_ports_async(self, ip: str) -> Optional[List[dict]]:
+        """Versão assíncrona do scanner de portas para melhor eficiência.
+
+        Devolve None se a varredura falhar (erro ao executar o nmap, código de saída diferente de
+        zero ou host abandonado por --host-timeout).
+        """
+        try:
+            ports = self._port_range()
 
             # Usa asyncio para executar o nmap de forma não bloqueante
             process = await asyncio.create_subprocess_exec(
@@ -100,62 +472,77 @@ class NetworkMonitor:
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            stdout, stderr = await process.communicate()
+            SUBPROCESSES_STARTED.labels('nmap').inc()
+            running = SUBPROCESSES_RUNNING.labels('nmap')
+            running.inc()
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # Evita processos nmap órfãos quando a varredura é cancelada
+                if process.returncode is None:
+                    process.kill()
+                raise
+            finally:
+                running.dec()
+
+            if process.returncode != 0:
+                self.logger.error(f"nmap terminou com código {process.returncode} ao escanear {ip}: "
+                                  f"{stderr.decode(errors='replace').strip()}")
+                return None
+            output = stdout.decode()
+            if 'due to host timeout' in output:
+                # O nmap desiste do host mas sai com código zero; a lista de portas estaria incompleta
+                return None
 
             open_ports = []
-            if process.returncode == 0:
-                # Processa a saída do nmap
-                for line in stdout.decode().split('\n'):
-                    if 'open' in line and 'tcp' in line:
-                        parts = line.split()
-                        port = int(parts[0].split('/')[0])
-                        service = parts[2] if len(parts) > 2 else 'unknown'
-                        open_ports.append({
-                            'port': port,
-                            'service': service,
-                            'risk_level': self.assess_port_risk(port, service)
-                        })
+            # Processa a saída do nmap
+            for line in output.split('\n'):
+                if 'open' in line and 'tcp' in line:
+                    parts = line.split()
+                    port = int(parts[0].split('/')[0])
+                    service = parts[2] if len(parts) > 2 else 'unknown'
+                    open_ports.append({
+                        'port': port,
+                        'service': service,
+                        'risk_level': self.assess_port_risk(port, service)
+                    })
 
             return open_ports
 
         except Exception as e:
             self.logger.error(f"Erro ao escanear portas para {ip}: {e}")
-            return []
+            return None
 
     def analyze_traffic(self, ip: str, packet_count: int, packet_size: int) -> Dict:
         """Analisa o tráfego de rede para um IP específico."""
-        timestamp = datetime.now()
-        traffic_data = {
-            'timestamp': timestamp,
-            'packet_count': packet_count,
-            'packet_size': packet_size
-        }
-        
+        timestamp = time.time()
+        history = self.traffic_history[ip]
+
         # Adiciona dados ao histórico
-        self.traffic_history[ip].append(traffic_data)
-        
+        history.append(timestamp, packet_count, packet_size)
+
         # Mantém apenas as últimas 24 horas de dados
-        cutoff = timestamp - timedelta(hours=24)
-        self.traffic_history[ip] = [d for d in self.traffic_history[ip] if d['timestamp'] > cutoff]
-        
+        history.evict_older_than(timestamp - TRAFFIC_RETENTION)
+
         return self.detect_anomalies(ip)
 
     def detect_anomalies(self, ip: str) -> Dict:
         """Detecta anomalias no tráfego de rede."""
-        if not self.traffic_history[ip]:
+        history = self.traffic_history[ip]
+        if not history:
             return {'anomalies': []}
 
-        recent_traffic = self.traffic_history[ip][-10:]  # Últimas 10 amostras
-        packet_counts = [d['packet_count'] for d in recent_traffic]
-        packet_sizes = [d['packet_size'] for d in recent_traffic]
+        # Estatísticas das últimas ANOMALY_WINDOW amostras, mantidas incrementalmente
+        n = history.window_length
+        packet_counts = history.window_counts()
 
         anomalies = []
 
         # Calcula estatísticas
-        avg_count = statistics.mean(packet_counts)
-        std_count = statistics.stdev(packet_counts) if len(packet_counts) > 1 else 0
-        avg_size = statistics.mean(packet_sizes)
-        std_size = statistics.stdev(packet_sizes) if len(packet_sizes) > 1 else 0
+        avg_count = exact_mean(history.count_sum, n)
+        std_count = exact_stdev(history.count_sum, history.count_sq_sum, n) if n > 1 else 0
+        avg_size = exact_mean(history.size_sum, n)
+        std_size = exact_stdev(history.size_sum, history.size_sq_sum, n) if n > 1 else 0
 
         # Detecta picos de tráfego
         current_count = packet_counts[-1]
@@ -167,7 +554,7 @@ class NetworkMonitor:
             })
 
         # Detecta padrões suspeitos de varredura de porta
-        port_scan_count = sum(1 for d in recent_traffic if d['packet_count'] > avg_count * 2)
+        port_scan_count = sum(1 for count in packet_counts if count > avg_count * 2)
         if port_scan_count >= self.anomaly_thresholds['port_scan_attempts']:
             anomalies.append({
                 'type': 'port_scan',
@@ -185,6 +572,36 @@ class NetworkMonitor:
             }
         }
 
+    def analyze_traffic_window(self, summary: dict) -> Dict[str, List[dict]]:
+        """Alimenta a detecção de anomalias com o resumo de uma janela de captura.
+
+        Apenas IPs das redes monitoradas são analisados; o tráfego com endereços externos
+        é ignorado. As redes são as da última varredura, para não consultar as interfaces
+        a cada janela. Devolve {ip: anomalias} somente dos hosts com alguma anomalia.
+        """
+        if self._monitored_networks is None:
+            self.get_scan_targets()
+        networks = self._monitored_networks
+        found: Dict[str, List[dict]] = {}
+        for ip, (packet_count, packet_size) in summary['hosts'].items():
+            address = ipaddress.ip_address(ip)
+            if not any(address in network for network in networks):
+                continue
+            result = self.analyze_traffic(ip, packet_count, packet_size)
+            if result['anomalies']:
+                found[ip] = result['anomalies']
+        return found
+
+    def analyze_traffic_batch(self, ips: List[str], packet_counts, packet_sizes) -> Dict[str, Dict]:
+        """Detecta anomalias de vários hosts de uma vez a partir de matrizes de amostras.
+
+        Cada linha de packet_counts/packet_sizes é a janela de um IP (última coluna = amostra
+        mais recente, NaN nas posições vazias). Devolve {ip: resultado de detect_anomalies}.
+        """
+        # O numpy só é carregado quando a análise em lote é usada
+        from anomaly_batch import detect_anomalies_batch
+        return detect_anomalies_batch(ips, packet_counts, packet_sizes, self.anomaly_thresholds)
+
     def assess_port_risk(self, port: int, service: str) -> str:
         """Avalia o nível de risco de uma porta aberta."""
         high_risk_ports = {21, 22, 23, 3389}  # FTP, SSH, Telnet, RDP
@@ -198,30 +615,54 @@ class NetworkMonitor:
         return 'low'
 
     async def get_network_changes(self) -> Tuple[List[dict], List[dict], List[dict]]:
-        """Detecta mudanças na rede."""
-        current_devices = {device['ip']: device for device in await self.scan_network()}
-        
-        new_devices = []
-        disconnected_devices = []
-        changed_devices = []
-
-        # Verifica novos dispositivos e alterações
-        for ip, device in current_devices.items():
-            if ip not in self.known_devices:
-                new_devices.append(device)
-            else:
-                # Verifica mudanças nas portas
-                old_ports = {p['port'] for p in self.known_devices[ip].get('ports', [])}
-                new_ports = {p['port'] for p in device.get('ports', [])}
-                if old_ports != new_ports:
-                    changed_devices.append(device)
+        """Detecta mudanças na rede.
+
+        Devolve (novos, desconectados, alterados), com os dispositivos em dict; para os
+        eventos tipados (mudança de IP, de serviços, conflitos de MAC), use detect_changes.
+        """
+        new_devices, disconnected_devices, changed_devices = split_changes(await self.detect_changes())
+        return ([device.to_dict() for device in new_devices], [device.to_dict() for device in disconnected_devices],
+                [device.to_dict() for device in changed_devices])
+
+    async def detect_changes(self, scan_ports: bool = True) -> List[dict]:
+        """Executa um ciclo de varredura e devolve os eventos de mudança (ver ChangeDetector).
+
+        Com scan_ports=False o ciclo é só de presença (ver scan_network).
+        """
+        cycle_start = time.time()
+        with SCAN_PHASE_SECONDS.labels('cycle' if scan_ports else 'presence').time():
+            current_devices = {device.ip: device for device in await self.scan_network(scan_ports)}
+            with SCAN_PHASE_SECONDS.labels('diff').time():
+                events = self.change_detector.diff(list(current_devices.values()))
+            for event in events:
+                CHANGE_EVENTS.labels(event['type']).inc()
+
+            # Atualiza dispositivos conhecidos
+            self.known_devices = current_devices
+            self.inventory_loaded = True
+            with SCAN_PHASE_SECONDS.labels('snapshot').time():
+                self._publish_snapshot()
 
-        # Verifica dispositivos desconectados
-        for ip in self.known_devices:
-            if ip not in current_devices:
-                disconnected_devices.append(self.known_devices[ip])
+            # Persiste o ciclo em uma única transação, fora do loop de eventos
+            if self.device_store is not None:
+                try:
+                    with SCAN_PHASE_SECONDS.labels('inventory').time():
+                        await asyncio.get_event_loop().run_in_executor(
+                            None, self.device_store.save_cycle, list(current_devices.values()), cycle_start
+                        )
+                except Exception as e:
+                    self.logger.error(f"Erro ao salvar o inventário: {e}")
 
-        # Atualiza dispositivos conhecidos
-        self.known_devices = current_devices
+            # Varreduras de presença são frequentes: o histórico recebe no máximo uma por scan_interval
+            if self.scan_history is not None and (
+                    scan_ports or cycle_start - self._history_recorded >= self.scan_interval):
+                self._history_recorded = cycle_start
+                try:
+                    with SCAN_PHASE_SECONDS.labels('history').time():
+                        await asyncio.get_event_loop().run_in_executor(
+                            None, self.scan_history.record_cycle, list(current_devices.values()), cycle_start
+                        )
+                except Exception as e:
+                    self.logger.error(f"Erro ao gravar o histórico de varreduras: {e}")
 
-        return new_devices, disconnected_devices, changed_devices
\ No newline at end of file
+        return events
\ No newline at end of file
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+from metrics import Counter, Gauge, Histogram
+
+RISK_ORDER = {'low': 0, 'medium': 1, 'high': 2}
+BACKPRESSURE_POLICIES = ('drop_lowest', 'merge')
+
+Sender = Callable[[List[dict]], Awaitable[None]]
+# Erros que costumam passar sozinhos (rede, destino fora do ar); os demais não são repetidos
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+# Operação pendente no spool: ('add' | 'update', id, payload em JSON) ou ('remove', id, None)
+SpoolOp = Tuple[str, int, Optional[str]]
+
+QUEUE_DEPTH = Gauge('botrede_notification_queue_depth', 'Notificações aguardando envio')
+IN_FLIGHT = Gauge('botrede_notifications_in_flight', 'Notificações sendo enviadas')
+NOTIFICATIONS = Counter('botrede_notifications_total', 'Notificações por resultado', ['outcome'])
+ALERT_LATENCY_SECONDS = Histogram(
+    'botrede_alert_latency_seconds', 'Tempo entre o alerta ser enfileirado e ser entregue'
+)
+
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL
+);
+"""
+
+
+class NotificationSpool:
+    """Cópia em disco (SQLite) das notificações ainda não entregues.
+
+    Os IDs são atribuídos na hora (next_id), sem esperar a gravação: quem usa o spool
+    acumula as operações e as grava em lote com write, fora do loop de eventos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SPOOL_SCHEMA)
+            self._conn.commit()
+            self._next_id = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM notifications').fetchone()[0] + 1
+
+    def next_id(self) -> int:
+        spool_id = self._next_id
+        self._next_id += 1
+        return spool_id
+
+    def write(self, ops: List[SpoolOp]):
+        """Aplica as operações pendentes, na ordem, em uma única transação."""
+        with self._lock, self._conn:
+            for op, spool_id, payload in ops:
+                if op == 'add':
+                    self._conn.execute('INSERT INTO notifications (id, payload) VALUES (?, ?)', (spool_id, payload))
+                elif op == 'update':
+                    self._conn.execute('UPDATE notifications SET payload = ? WHERE id = ?', (payload, spool_id))
+                else:
+                    self._conn.execute('DELETE FROM notifications WHERE id = ?', (spool_id,))
+
+    def load(self) -> List[dict]:
+        """Notificações pendentes, da mais antiga para a mais nova."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, payload FROM notifications ORDER BY id').fetchall()
+        notifications = []
+        for spool_id, payload in rows:
+            notification = json.loads(payload)
+            notification['id'] = spool_id
+            notifications.append(notification)
+        return notifications
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NotificationDispatcher:
+    """Fila limitada de notificações entregues por tarefas em segundo plano.
+
+    submit nunca bloqueia: com a fila cheia, a política 'drop_lowest' descarta a
+    notificação de menor risco (a mais antiga entre as de mesmo risco) e 'merge' junta
+    a nova a uma pendente do mesmo tipo e risco, recorrendo ao descarte se não houver.
+    Falhas transitórias (is_transient) são repetidas com espera exponencial, até
+    max_attempts tentativas; depois disso, ou diante de um erro permanente, o lote é
+    descartado para não travar a fila. Com um spool, as notificações pendentes
+    sobrevivem a reinícios e a quedas do destino. As gravações no spool são acumuladas
+    e feitas em uma transação por vez, fora do loop de eventos.
+
+    Cada notificação é um dict com 'kind', 'alert_type', 'risk_level', 'devices',
+    'anomalies' e 'created'. O sender recebe lotes de até batch_size notificações,
+    reunidas durante batch_window segundos, e deve levantar uma exceção para que o
+    lote seja reenviado (a entrega é ao menos uma vez).
+    """
+
+    def __init__(self, sender: Sender, max_size: int = 1000, policy: str = 'drop_lowest',
+                 workers: int = 1, batch_size: int = 1, batch_window: float = 0.0,
+                 retry_base: float = 1.0, retry_max: float = 300.0, max_attempts: int = 20,
+                 is_transient: Optional[Callable[[Exception], bool]] = None,
+                 spool: Optional[NotificationSpool] = None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Política de contrapressão desconhecida: {policy}")
+        self.sender = sender
+        self.max_size = max(1, max_size)
+        self.policy = policy
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max(1, max_attempts)
+        self.is_transient = is_transient or (lambda error: isinstance(error, TRANSIENT_ERRORS))
+        self.spool = spool
+        self.logger = logging.getLogger('NotificationDispatcher')
+        self.stats = {'submitted': 0, 'delivered': 0, 'dropped': 0, 'merged': 0, 'retries': 0, 'failed': 0}
+        self._queue: Deque[dict] = deque()
+        self._in_flight = 0
+        self._available: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._spool_ops: List[SpoolOp] = []
+        self._spool_task: Optional[asyncio.Task] = None
+        QUEUE_DEPTH.set_function(lambda: len(self._queue))
+        IN_FLIGHT.set_function(lambda: self._in_flight)
+        NOTIFICATIONS.set_function(lambda: {(outcome,): count for outcome, count in self.stats.items()})
+
+        if self.spool is not None:
+            for notification in self.spool.load():
+                self._enqueue(notification)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        """Inicia as tarefas de envio no loop de eventos atual."""
+        self._available = asyncio.Event()
+        if self._queue:
+            self._available.set()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._schedule_spool_write()
+
+    async def stop(self, timeout: float = 5.0):
+        """Aguarda até timeout segundos a entrega do que está na fila e encerra as tarefas."""
+        deadline = time.monotonic() + timeout
+        while (self._queue or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # O que ainda não foi gravado no spool é gravado antes de encerrar
+        if self._spool_task is not None and not self._spool_task.done():
+            await self._spool_task
+        await self._write_spool()
+
+    def submit(self, kind: str, alert_type: str, devices: List[dict], risk_level: str = 'low',
+               anomalies: Optional[List[dict]] = None):
+        """Enfileira uma notificação sem esperar pela entrega."""
+        notification = {
+            'kind': kind,
+            'alert_type': alert_type,
+            'risk_level': risk_level,
+            'devices': devices,
+            'anomalies': anomalies or [],
+            'created': time.time()
+        }
+        self.stats['submitted'] += 1
+        if self.spool is not None:
+            notification['id'] = self.spool.next_id()
+            self._spool_op('add', notification)
+        self._enqueue(notification)
+
+    def _spool_op(self, op: str, notification: dict):
+        payload = None
+        if op != 'remove':
+            # Serializado agora: a gravação acontece em outra thread, e a notificação pode mudar até lá
+            try:
+                payload = json.dumps({k: v for k, v in notification.items() if k != 'id'})
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"Erro ao gravar notificação no spool: {e}")
+                return
+        self._spool_ops.append((op, notification['id'], payload))
+        self._schedule_spool_write()
+
+    def _schedule_spool_write(self):
+        # Antes de start não há loop de eventos; as operações esperam até lá
+        if self._available is None or not self._spool_ops:
+            return
+        if self._spool_task is None or self._spool_task.done():
+            self._spool_task = asyncio.ensure_future(self._write_spool())
+
+    async def _write_spool(self):
+        """Grava as operações acumuladas no spool, uma transação por vez, fora do loop de eventos."""
+        while self._spool_ops:
+            ops, self._spool_ops = self._spool_ops, []
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, self.spool.write, ops)
+            except Exception as e:
+                self.logger.error(f"Erro ao gravar o spool de notificações: {e}")
+
+    def _enqueue(self, notification: dict):
+        if len(self._queue) >= self.max_size:
+            if self.policy == 'merge' and self._merge(notification):
+                return
+            if not self._drop_lowest(notification):
+                return
+        self._queue.append(notification)
+        if self._available is not None:
+            self._available.set()
+
+    def _merge(self, notification: dict) -> bool:
+        """Junta os dispositivos a uma notificação pendente equivalente, se houver."""
+        for pending in reversed(self._queue):
+            if pending['kind'] == notification['kind'] == 'alert' \
+                    and pending['alert_type'] == notification['alert_type'] \
+                    and pending['risk_level'] == notification['risk_level']:
+                pending['devices'] = pending['devices'] + notification['devices']
+                self.stats['merged'] += 1
+                self._persist_merge(pending, notification)
+                return True
+        return False
+
+    def _persist_merge(self, pending: dict, merged: dict):
+        if self.spool is None:
+            return
+        if pending.get('id') is not None:
+            self._spool_op('update', pending)
+        if merged.get('id') is not None:
+            self._spool_op('remove', merged)
+
+    def _drop_lowest(self, notification: dict) -> bool:
+        """Abre espaço descartando a notificação de menor risco; devolve False se a descartada for a nova."""
+        lowest = min(self._queue, key=lambda pending: RISK_ORDER.get(pending['risk_level'], 0))
+        if RISK_ORDER.get(notification['risk_level'], 0) <= RISK_ORDER.get(lowest['risk_level'], 0):
+            dropped = notification
+        else:
+            dropped = lowest
+            self._queue.remove(lowest)
+        self.stats['dropped'] += 1
+        self.logger.warning(f"Fila de notificações cheia, descartando alerta '{dropped['alert_type']}'")
+        self._forget([dropped])
+        return dropped is not notification
+
+    def _forget(self, notifications: List[dict]):
+        if self.spool is None:
+            return
+        for notification in notifications:
+            if notification.get('id') is not None:
+                self._spool_op('remove', notification)
+
+    async def _worker(self):
+        while True:
+            while not self._queue:
+                self._available.clear()
+                await self._available.wait()
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                continue
+            self._in_flight += len(batch)
+            try:
+                await self._deliver(batch)
+            finally:
+                self._in_flight -= len(batch)
+
+    async def _deliver(self, batch: List[dict]):
+        """Entrega um lote, repetindo as falhas transitórias com espera exponencial (e variação aleatória)."""
+        attempt = 1
+        while True:
+            try:
+                await self.sender(batch)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.is_transient(e) or attempt >= self.max_attempts:
+                    self.stats['failed'] += len(batch)
+                    self.logger.error(f"Descartando {len(batch)} notificações após {attempt} tentativa(s): {e!r}")
+                    self._forget(batch)
+                    return
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                self.stats['retries'] += 1
+                self.logger.warning(f"Falha ao enviar notificações (tentativa {attempt}/{self.max_attempts}): {e}; "
+                                    f"nova tentativa em {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+        self.stats['delivered'] += len(batch)
+        now = time.time()
+        for notification in batch:
+            ALERT_LATENCY_SECONDS.observe(now - notification['created'])
+        self._forget(batch)
@@ -0,0 +1,113 @@
+import scapy.all as scapy
+import asyncio
+import logging
+from typing import AsyncIterator, Optional, Tuple
+
+# Tráfego observado: ARP e DHCP (servidor na porta 67, cliente na 68)
+PASSIVE_BPF_FILTER = 'arp or (udp and (port 67 or 68))'
+
+DHCP_REQUEST = 3
+DHCP_ACK = 5
+
+
+class PassiveDiscovery:
+    """Descoberta passiva de dispositivos a partir do tráfego ARP e DHCP.
+
+    Não envia nenhum pacote: apenas escuta a interface (ou reproduz um arquivo pcap,
+    com offline) e produz (ip, mac) sempre que um host se anuncia na rede.
+    """
+
+    def __init__(self, interface: Optional[str] = None, offline: Optional[str] = None):
+        self.interface = interface
+        self.offline = offline  # Arquivo pcap reproduzido no lugar da captura ao vivo
+        self.logger = logging.getLogger('PassiveDiscovery')
+
+    async def listen(self) -> AsyncIterator[Tuple[str, str]]:
+        """Produz (ip, mac) para cada anúncio ARP/DHCP observado.
+
+        Na captura ao vivo o iterador não termina; ao reproduzir um pcap, termina no fim do arquivo.
+        """
+        loop = asyncio.get_event_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def on_packet(packet):
+            # Executado na thread de captura
+            host = extract_host(packet)
+            if host is not None:
+                loop.call_soon_threadsafe(events.put_nowait, host)
+
+        sock = None
+        if self.offline:
+            sniffer = scapy.AsyncSniffer(offline=self.offline, lfilter=_is_discovery_packet,
+                                         prn=on_packet, store=False)
+        else:
+            sock = await loop.run_in_executor(None, self._open_socket)
+            sniffer = scapy.AsyncSniffer(opened_socket=sock, lfilter=_is_discovery_packet,
+                                         prn=on_packet, store=False)
+        sniffer.start()
+
+        async def wait_capture_end():
+            await loop.run_in_executor(None, sniffer.join)
+            events.put_nowait(finished)
+
+        watcher = asyncio.ensure_future(wait_capture_end())
+        try:
+            while True:
+                event = await events.get()
+                if event is finished:
+                    break
+                yield event
+        finally:
+            watcher.cancel()
+            await loop.run_in_executor(None, self._stop_sniffer, sniffer, sock)
+
+    def _open_socket(self):
+        """Abre o socket de captura, filtrando no kernel quando o BPF está disponível."""
+        try:
+            return scapy.conf.L2listen(iface=self.interface, filter=PASSIVE_BPF_FILTER)
+        except Exception as e:
+            self.logger.debug(f"Filtro BPF indisponível, capturando sem filtro: {e}")
+            return scapy.conf.L2listen(iface=self.interface)
+
+    @staticmethod
+    def _stop_sniffer(sniffer, sock):
+        try:
+            if sniffer.running:
+                sniffer.stop()
+        except Exception:
+            pass
+        # O AsyncSniffer só fecha os sockets que ele mesmo abriu
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+
+def _is_discovery_packet(packet) -> bool:
+    return scapy.ARP in packet or scapy.DHCP in packet
+
+
+def extract_host(packet) -> Optional[Tuple[str, str]]:
+    """Extrai (ip, mac) de um pacote ARP ou DHCP, ou None se ele não identifica um host."""
+    if scapy.ARP in packet:
+        arp = packet[scapy.ARP]
+        # Probes ARP (psrc 0.0.0.0) ainda não têm endereço
+        if arp.psrc and arp.psrc != '0.0.0.0':
+            return arp.psrc, arp.hwsrc
+        return None
+
+    if scapy.DHCP in packet and scapy.BOOTP in packet:
+        bootp = packet[scapy.BOOTP]
+        options = {
+            option[0]: option[1] for option in packet[scapy.DHCP].options
+            if isinstance(option, tuple) and len(option) >= 2
+        }
+        mac = scapy.str2mac(bytes(bootp.chaddr)[:6])
+        message_type = options.get('message-type')
+        if message_type == DHCP_ACK and bootp.yiaddr != '0.0.0.0':
+            return bootp.yiaddr, mac
+        if message_type == DHCP_REQUEST and options.get('requested_addr'):
+            return options['requested_addr'], mac
+    return None
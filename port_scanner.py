@@ -0,0 +1,249 @@
+import asyncio
+import socket
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from metrics import Counter, Gauge
+
+# Função que recebe (porta, serviço) e devolve o nível de risco ('low', 'medium' ou 'high')
+RiskAssessor = Callable[[int, str], str]
+
+# Processos do nmap iniciados pelas varreduras (por host ou em lote)
+SUBPROCESSES_STARTED = Counter(
+    'botrede_subprocesses_started_total', 'Processos externos iniciados', ['command']
+)
+SUBPROCESSES_RUNNING = Gauge(
+    'botrede_subprocesses_running', 'Processos externos em execução', ['command']
+)
+
+
+class NmapXMLStreamParser:
+    """Parser incremental da saída XML do nmap (-oX -).
+
+    Recebe a saída em pedaços conforme ela chega do processo e devolve cada host
+    assim que seu elemento <host> é fechado, sem esperar o fim da varredura. Hosts que
+    excederam --host-timeout (timedout="true") vêm com None no lugar das portas: a
+    lista de portas deles está incompleta e não significa "nenhuma porta aberta".
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._root = None
+
+    def feed(self, data: bytes) -> List[Tuple[str, Optional[List[Tuple[int, str]]]]]:
+        """Alimenta o parser e devolve os hosts concluídos como (ip, [(porta, serviço)] ou None)."""
+        self._parser.feed(data)
+        return self._read_hosts()
+
+    def close(self) -> List[Tuple[str, Optional[List[Tuple[int, str]]]]]:
+        """Finaliza o documento e devolve os hosts que ainda estavam pendentes."""
+        try:
+            self._parser.close()
+        except ET.ParseError:
+            # Saída truncada (processo cancelado ou encerrado com erro)
+            pass
+        return self._read_hosts()
+
+    def _read_hosts(self) -> List[Tuple[str, Optional[List[Tuple[int, str]]]]]:
+        hosts = []
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag != 'host':
+                continue
+
+            ip = self._parse_address(elem)
+            if ip:
+                timed_out = elem.get('timedout') == 'true'
+                hosts.append((ip, None if timed_out else self._parse_open_ports(elem)))
+
+            # Libera o host já processado para manter o uso de memória constante
+            elem.clear()
+            try:
+                self._root.remove(elem)
+            except ValueError:
+                pass
+        return hosts
+
+    @staticmethod
+    def _parse_address(host: ET.Element) -> str:
+        for address in host.iter('address'):
+            if address.get('addrtype') in ('ipv4', 'ipv6'):
+                return address.get('addr', '')
+        return ''
+
+    @staticmethod
+    def _parse_open_ports(host: ET.Element) -> List[Tuple[int, str]]:
+        open_ports = []
+        for port in host.iter('port'):
+            state = port.find('state')
+            # Ignora portas 'filtered', 'closed' e 'open|filtered'
+            if port.get('protocol') != 'tcp' or state is None or state.get('state') != 'open':
+                continue
+            service = port.find('service')
+            name = service.get('name') if service is not None else None
+            open_ports.append((int(port.get('portid')), name or 'unknown'))
+        return open_ports
+
+
+async def scan_ports_nmap_batch(ips: List[str], ports: str, host_timeout: int,
+                                assess_risk: RiskAssessor) -> AsyncIterator[Tuple[str, Optional[List[Dict]]]]:
+    """Escaneia vários hosts com uma única execução do nmap.
+
+    Os resultados são produzidos host a host conforme o XML é recebido. Hosts cuja
+    varredura falhou (excederam host_timeout ou não aparecem na saída, por falta de
+    resposta ou erro do nmap) são devolvidos com None, para que quem chama mantenha
+    as portas conhecidas em vez de registrar todas como fechadas.
+    """
+    process = await asyncio.create_subprocess_exec(
+        'nmap', '-sT', '-T4', f'--host-timeout={host_timeout}s',
+        '-p', ports, '-oX', '-', *ips,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    SUBPROCESSES_STARTED.labels('nmap_batch').inc()
+    running = SUBPROCESSES_RUNNING.labels('nmap_batch')
+    running.inc()
+    parser = NmapXMLStreamParser()
+    pending = set(ips)
+
+    def to_dicts(open_ports: Optional[List[Tuple[int, str]]]) -> Optional[List[Dict]]:
+        if open_ports is None:
+            return None
+        return [{
+            'port': port,
+            'service': service,
+            'risk_level': assess_risk(port, service)
+        } for port, service in open_ports]
+
+    try:
+        while True:
+            chunk = await process.stdout.read(65536)
+            if not chunk:
+                break
+            for ip, open_ports in parser.feed(chunk):
+                if ip in pending:
+                    pending.discard(ip)
+                    yield ip, to_dicts(open_ports)
+        await process.wait()
+        for ip, open_ports in parser.close():
+            if ip in pending:
+                pending.discard(ip)
+                yield ip, to_dicts(open_ports)
+    finally:
+        running.dec()
+        # Evita processos nmap órfãos quando a varredura é cancelada
+        if process.returncode is None:
+            process.kill()
+
+    for ip in ips:
+        if ip in pending:
+            yield ip, None
+
+
+def parse_port_range(ports: str) -> List[int]:
+    """Converte uma faixa no formato do nmap ('20-23,25,80') em uma lista de portas."""
+    result = []
+    for part in ports.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            result.extend(range(int(start), int(end) + 1))
+        else:
+            result.append(int(part))
+    return sorted(set(result))
+
+
+@lru_cache(maxsize=2048)
+def _service_by_port(port: int) -> str:
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return 'unknown'
+
+
+# Prefixos de banners conhecidos e o serviço correspondente
+_BANNER_SIGNATURES = (
+    (b'SSH-', 'ssh'),
+    (b'HTTP/', 'http'),
+    (b'RFB ', 'vnc'),
+    (b'* OK', 'imap'),
+    (b'+OK', 'pop3'),
+)
+
+
+def _service_from_banner(banner: bytes) -> Optional[str]:
+    for prefix, service in _BANNER_SIGNATURES:
+        if banner.startswith(prefix):
+            return service
+    if banner.startswith(b'220'):
+        lowered = banner.lower()
+        if b'ftp' in lowered:
+            return 'ftp'
+        if b'smtp' in lowered or b'esmtp' in lowered:
+            return 'smtp'
+    return None
+
+
+class AsyncConnectScanner:
+    """Scanner de portas TCP connect implementado diretamente com asyncio.
+
+    Alternativa ao nmap para faixas pequenas: não inicia processos e limita as
+    conexões simultâneas tanto no total (global_limit) quanto por host (per_host_limit).
+    """
+
+    def __init__(self, global_limit: int = 256, per_host_limit: int = 64,
+                 connect_timeout: float = 1.0, grab_banners: bool = False, banner_timeout: float = 1.0):
+        self.global_limit = max(1, global_limit)
+        self.per_host_limit = max(1, per_host_limit)
+        self.connect_timeout = connect_timeout
+        self.grab_banners = grab_banners
+        self.banner_timeout = banner_timeout
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+
+    async def scan_host(self, ip: str, ports: List[int], assess_risk: RiskAssessor) -> List[Dict]:
+        """Escaneia as portas de um host e devolve as abertas, ordenadas pelo número da porta."""
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.global_limit)
+        host_semaphore = asyncio.Semaphore(self.per_host_limit)
+
+        async def probe(port: int) -> Optional[Tuple[int, str]]:
+            async with host_semaphore, self._global_semaphore:
+                return await self._probe_port(ip, port)
+
+        results = await asyncio.gather(*(probe(port) for port in ports))
+        return [{
+            'port': port,
+            'service': service,
+            'risk_level': assess_risk(port, service)
+        } for port, service in sorted(r for r in results if r is not None)]
+
+    async def _probe_port(self, ip: str, port: int) -> Optional[Tuple[int, str]]:
+        """Tenta conectar em uma porta; devolve (porta, serviço) se ela estiver aberta."""
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.connect_timeout)
+        except (asyncio.TimeoutError, OSError):
+            # Recusada (fechada) ou sem resposta (filtrada)
+            return None
+
+        service = None
+        try:
+            if self.grab_banners:
+                try:
+                    banner = await asyncio.wait_for(reader.read(256), self.banner_timeout)
+                    service = _service_from_banner(banner)
+                except (asyncio.TimeoutError, OSError):
+                    pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+        return port, service or _service_by_port(port)
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Mapping, Optional
+
+
+class TokenBucket:
+    """Limitador de taxa assíncrono no modelo token bucket.
+
+    Acumula até capacity fichas, repostas a rate fichas por segundo; acquire espera
+    até haver uma ficha disponível. pause e update permitem seguir os limites
+    informados pelo servidor (ex.: cabeçalhos de rate limit do Discord).
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.limited = 0  # Vezes em que o servidor recusou por limite de taxa
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Consome uma ficha, esperando o tempo necessário (na ordem de chegada)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # Reavalia ao menos a cada segundo: a taxa pode mudar durante a espera
+                await asyncio.sleep(min(1.0, (1 - self.tokens) / self.rate))
+
+    def pause(self, seconds: float):
+        """Bloqueia novas fichas por seconds segundos (ex.: após um 429)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.limited += 1
+        self.tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def update(self, headers: Mapping[str, str]) -> Optional[float]:
+        """Ajusta o balde aos cabeçalhos de rate limit de uma resposta HTTP.
+
+        Devolve quantos segundos esperar antes de tentar de novo, quando a resposta
+        indica que o limite foi atingido.
+        """
+        retry_after = headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After')
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(remaining))
+        if retry_after is not None and (remaining is None or float(remaining) == 0):
+            self.pause(float(retry_after))
+            return float(retry_after)
+        return None
@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class PortResultCache:
+    """Cache LRU dos resultados de varredura de portas, indexado por (MAC, IP).
+
+    Uma entrada só é reaproveitada enquanto for mais nova que ttl segundos; um host
+    novo, ou que trocou de MAC, não encontra entrada e volta a ser escaneado.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 3600.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, Tuple[int, ...]]]' = OrderedDict()
+
+    def get(self, mac: str, ip: str) -> Optional[Tuple[int, ...]]:
+        """Devolve as portas em cache do host (empacotadas, ver device_record), ou None se ele precisar ser escaneado."""
+        key = (mac.lower(), ip)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, mac: str, ip: str) -> Optional[Tuple[int, ...]]:
+        """Como get, mas sem contar acerto ou falha nem alterar a ordem LRU (consultas que não evitam uma varredura)."""
+        entry = self._entries.get((mac.lower(), ip))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, mac: str, ip: str, ports: Tuple[int, ...], age: float = 0.0):
+        """Guarda o resultado de uma varredura, descartando a entrada menos usada se necessário.
+
+        age indica há quantos segundos o resultado foi obtido (ex.: ao restaurar o inventário salvo).
+        """
+        key = (mac.lower(), ip)
+        self._entries[key] = (time.monotonic() - age, ports)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de acertos e falhas desde a criação do cache."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,198 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from device_record import DeviceRecord
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cycles (
+    ts INTEGER PRIMARY KEY,
+    devices INTEGER NOT NULL,
+    open_ports INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    ip TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    mac TEXT NOT NULL,
+    ports TEXT NOT NULL,
+    PRIMARY KEY (ip, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_observations_ts ON observations (ts);
+CREATE TABLE IF NOT EXISTS hourly_cycles (
+    hour INTEGER PRIMARY KEY,
+    cycles INTEGER NOT NULL,
+    avg_devices REAL NOT NULL,
+    max_devices INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hourly_observations (
+    ip TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    mac TEXT NOT NULL,
+    ports TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (ip, hour)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_hourly_observations_hour ON hourly_observations (hour);
+"""
+
+
+def _encode_ports(ports) -> str:
+    # Formato compacto: números das portas separados por vírgula, em ordem
+    return ','.join(str(port) for port in sorted(ports))
+
+
+def _decode_ports(value: str) -> List[int]:
+    return [int(port) for port in value.split(',')] if value else []
+
+
+class ScanHistoryStore:
+    """Série temporal das observações de cada ciclo de varredura, em SQLite.
+
+    Cada ciclo grava uma linha de resumo e uma linha compacta por dispositivo (portas
+    como '22,80,443'). Dados com mais de raw_retention_days são agregados por hora
+    (união das portas vistas na hora e contagem de dispositivos online) e os agregados
+    com mais de rollup_retention_days são apagados, limitando o uso de disco.
+    """
+
+    def __init__(self, path: str = 'network_monitor.db', raw_retention_days: int = 7,
+                 rollup_retention_days: int = 365):
+        self.path = path
+        self.raw_retention = raw_retention_days * DAY
+        self.rollup_retention = rollup_retention_days * DAY
+        self.logger = logging.getLogger('ScanHistoryStore')
+        self._lock = threading.Lock()
+        self._last_compaction = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # auto_vacuum só tem efeito em bancos novos; permite devolver espaço após a compactação
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def record_cycle(self, devices: List[DeviceRecord], timestamp: Optional[float] = None):
+        """Grava as observações de um ciclo e, no máximo uma vez por hora, compacta o histórico."""
+        ts = int(timestamp if timestamp is not None else time.time())
+        rows = [(device.ip, ts, device.mac, _encode_ports(device.port_numbers())) for device in devices]
+        open_ports = sum(len(device.ports) for device in devices)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cycles (ts, devices, open_ports) VALUES (?, ?, ?)',
+                (ts, len(devices), open_ports)
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO observations (ip, ts, mac, ports) VALUES (?, ?, ?, ?)', rows
+            )
+
+        if ts - self._last_compaction >= HOUR:
+            self.compact(ts)
+
+    def compact(self, now: Optional[float] = None):
+        """Agrega por hora os dados brutos antigos e apaga o que passou da retenção."""
+        now = int(now if now is not None else time.time())
+        # Só horas completas são agregadas, para não dividir uma hora entre bruto e agregado
+        cutoff = (now - self.raw_retention) // HOUR * HOUR
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO hourly_cycles (hour, cycles, avg_devices, max_devices)
+                SELECT ts / 3600 * 3600 AS hour, COUNT(*), AVG(devices), MAX(devices)
+                FROM cycles WHERE ts < ? GROUP BY hour
+                """,
+                (cutoff,)
+            )
+
+            rollups: Dict[tuple, list] = {}
+            for row in self._conn.execute(
+                'SELECT ip, ts / 3600 * 3600 AS hour, mac, ports FROM observations WHERE ts < ? ORDER BY ts',
+                (cutoff,)
+            ):
+                key = (row['ip'], row['hour'])
+                entry = rollups.setdefault(key, [row['mac'], set(), 0])
+                entry[0] = row['mac']
+                entry[1].update(_decode_ports(row['ports']))
+                entry[2] += 1
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO hourly_observations (ip, hour, mac, ports, samples) VALUES (?, ?, ?, ?, ?)',
+                [(ip, hour, mac, _encode_ports(ports), samples)
+                 for (ip, hour), (mac, ports, samples) in rollups.items()]
+            )
+
+            self._conn.execute('DELETE FROM cycles WHERE ts < ?', (cutoff,))
+            self._conn.execute('DELETE FROM observations WHERE ts < ?', (cutoff,))
+            rollup_cutoff = now - self.rollup_retention
+            self._conn.execute('DELETE FROM hourly_cycles WHERE hour < ?', (rollup_cutoff,))
+            self._conn.execute('DELETE FROM hourly_observations WHERE hour < ?', (rollup_cutoff,))
+
+        with self._lock:
+            self._conn.execute('PRAGMA incremental_vacuum')
+        self._last_compaction = now
+
+    def device_history(self, ip: str, start: float, end: float) -> List[dict]:
+        """Observações de um IP no intervalo (brutas e agregadas por hora), em ordem cronológica."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT hour AS ts, mac, ports, samples, 'hour' AS resolution FROM hourly_observations
+                WHERE ip = ? AND hour BETWEEN ? AND ?
+                UNION ALL
+                SELECT ts, mac, ports, 1 AS samples, 'raw' AS resolution FROM observations
+                WHERE ip = ? AND ts BETWEEN ? AND ?
+                ORDER BY ts
+                """,
+                (ip, int(start), int(end), ip, int(start), int(end))
+            ).fetchall()
+        return [{
+            'timestamp': row['ts'],
+            'mac': row['mac'],
+            'ports': _decode_ports(row['ports']),
+            'samples': row['samples'],
+            'resolution': row['resolution']
+        } for row in rows]
+
+    def port_history(self, ip: str, port: int, start: float, end: float) -> List[dict]:
+        """Momentos em que a porta abriu ou fechou no host, dentro do intervalo."""
+        transitions = []
+        previous = None
+        for observation in self.device_history(ip, start, end):
+            is_open = port in observation['ports']
+            if is_open != previous:
+                transitions.append({
+                    'timestamp': observation['timestamp'],
+                    'state': 'open' if is_open else 'closed',
+                    'resolution': observation['resolution']
+                })
+                previous = is_open
+        return transitions
+
+    def online_counts(self, start: float, end: float) -> List[dict]:
+        """Dispositivos online por hora (média e máximo) no intervalo."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT hour, cycles, avg_devices, max_devices FROM hourly_cycles
+                WHERE hour BETWEEN ? AND ?
+                UNION ALL
+                SELECT ts / 3600 * 3600 AS hour, COUNT(*), AVG(devices), MAX(devices) FROM cycles
+                WHERE ts BETWEEN ? AND ? GROUP BY hour
+                ORDER BY hour
+                """,
+                (int(start), int(end), int(start), int(end))
+            ).fetchall()
+        return [{
+            'hour': row['hour'],
+            'cycles': row['cycles'],
+            'avg_devices': row['avg_devices'],
+            'max_devices': row['max_devices']
+        } for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
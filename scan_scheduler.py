@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from metrics import Counter, Gauge
+from rate_limiter import TokenBucket
+
+# Hosts que mudaram são verificados de novo a cada period * RECENT_FACTOR, durante um período
+RECENT_FACTOR = 0.25
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+SKIPPED_TICKS = Counter(
+    'botrede_scheduler_skipped_ticks_total', 'Ciclos pulados porque o anterior passou do horário', ['tier']
+)
+PORT_SCAN_BACKLOG = Gauge('botrede_port_scan_backlog', 'Hosts com a varredura de portas atrasada')
+
+
+class FixedRateTicker:
+    """Ritmo fixo para tarefas periódicas, sem deriva.
+
+    Os ticks caem em início + n * interval, independentemente de quanto cada
+    iteração leva. Se uma iteração passa do horário do tick seguinte, os ticks
+    perdidos são pulados (e contados) em vez de executados em sequência.
+    """
+
+    def __init__(self, interval: float, tier: str = 'scan'):
+        self.interval = interval
+        self.tier = tier
+        self.skipped = 0
+        self.logger = logging.getLogger('FixedRateTicker')
+        self._start: Optional[float] = None
+        self._tick = 0
+
+    async def wait(self) -> int:
+        """Espera o próximo tick (o primeiro é imediato) e devolve quantos foram pulados."""
+        now = asyncio.get_event_loop().time()
+        if self._start is None:
+            self._start = now
+            return 0
+
+        tick = self._tick + 1
+        skipped = 0
+        if now > self._start + tick * self.interval:
+            tick = math.ceil((now - self._start) / self.interval)
+            skipped = tick - self._tick - 1
+        self._tick = tick
+        if skipped:
+            self.skipped += skipped
+            SKIPPED_TICKS.labels(self.tier).inc(skipped)
+            self.logger.warning(f"Ciclo '{self.tier}' passou de {self.interval}s; pulando {skipped} ciclo(s)")
+        await asyncio.sleep(max(0.0, self._start + tick * self.interval - now))
+        return skipped
+
+
+class PortScanScheduler:
+    """Distribui as varreduras de portas uniformemente ao longo de period segundos.
+
+    Cada host conhecido é escaneado uma vez por período; um token bucket com taxa
+    igual a hosts / period espaça as varreduras, em vez de dispará-las todas juntas
+    no início do ciclo. Hosts marcados com prioritize (novos, que mudaram de IP ou
+    de MAC, ou cujas portas mudaram) passam à frente da fila e, durante um período,
+    são verificados de novo a cada period * RECENT_FACTOR.
+
+    A primeira varredura de um host (ou de um novo dispositivo no mesmo IP) apenas
+    estabelece suas portas; next_host informa se o host já tinha essa referência,
+    para que a diferença encontrada na primeira varredura não conte como mudança.
+    """
+
+    def __init__(self, period: float, burst: int = 1):
+        self.period = max(1.0, period)
+        self.bucket = TokenBucket(1.0 / self.period, burst)
+        self.logger = logging.getLogger('PortScanScheduler')
+        # Heap de [prioridade, horário, sequência, ip, válido]; entradas substituídas ficam inválidas
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._recent: Dict[str, float] = {}  # ip -> até quando o host é verificado com mais frequência
+        self._baseline: Set[str] = set()  # Hosts cujas portas já foram escaneadas
+        self._seq = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+        PORT_SCAN_BACKLOG.set_function(self.backlog)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._entries
+
+    @staticmethod
+    def _now() -> float:
+        return time.monotonic()
+
+    def backlog(self) -> int:
+        """Hosts cujo horário de varredura já passou."""
+        now = self._now()
+        return sum(1 for entry in list(self._entries.values()) if entry[1] <= now)
+
+    def _push(self, ip: str, priority: int, due: float):
+        old = self._entries.get(ip)
+        if old is not None:
+            old[4] = False
+        entry = [priority, due, next(self._seq), ip, True]
+        self._entries[ip] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # Descarta as entradas inválidas acumuladas pelos reagendamentos
+            self._heap = [e for e in self._heap if e[4]]
+            heapq.heapify(self._heap)
+        if self._changed is not None:
+            self._changed.set()
+
+    def _update_rate(self):
+        # Os hosts recentes são escaneados 1 / RECENT_FACTOR vezes por período
+        demand = len(self._entries) + len(self._recent) * (1 / RECENT_FACTOR - 1)
+        self.bucket.rate = max(1.0, demand) / self.period
+
+    def sync(self, ips: Iterable[str], changed: Iterable[str] = ()):
+        """Acompanha exatamente os hosts em ips; os de changed passam à frente da fila.
+
+        Hosts novos entram na fila para já, com prioridade normal, e hosts que sumiram
+        deixam de ser escaneados. Os IPs em changed são tratados como um dispositivo
+        novo (mudança de IP ou de MAC), sem referência de portas.
+        """
+        now = self._now()
+        current = set(ips)
+        for ip in list(self._entries):
+            if ip not in current:
+                self.discard(ip)
+        for ip in current:
+            if ip not in self._entries:
+                self._push(ip, PRIORITY_NORMAL, now)
+        for ip in changed:
+            if ip in current:
+                self.prioritize(ip, reset=True)
+        self._update_rate()
+
+    def prioritize(self, ip: str, reset: bool = False):
+        """Escaneia o host o quanto antes e o mantém sob verificação frequente por um período.
+
+        Com reset, a próxima varredura volta a ser tratada como a primeira do host.
+        """
+        if reset:
+            self._baseline.discard(ip)
+        now = self._now()
+        self._recent[ip] = now + self.period
+        self._push(ip, PRIORITY_HIGH, now)
+        self._update_rate()
+
+    def watch(self, ip: str):
+        """Mantém sob verificação frequente um host que acabou de ser escaneado e mudou."""
+        if ip not in self._entries:
+            return
+        now = self._now()
+        self._recent[ip] = now + self.period
+        self._push(ip, PRIORITY_NORMAL, now + self.period * RECENT_FACTOR)
+        self._update_rate()
+
+    def discard(self, ip: str):
+        entry = self._entries.pop(ip, None)
+        if entry is not None:
+            entry[4] = False
+        self._recent.pop(ip, None)
+        self._baseline.discard(ip)
+
+    def _peek(self) -> Optional[list]:
+        while self._heap and not self._heap[0][4]:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    async def next_host(self) -> Tuple[str, bool]:
+        """Espera a vez do próximo host (e uma ficha do bucket) e o devolve, já reagendado.
+
+        Devolve (ip, tinha_referência): o segundo valor é False na primeira varredura do host.
+        """
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        await self.bucket.acquire()
+        while True:
+            entry = self._peek()
+            delay = entry[1] - self._now() if entry is not None else None
+            if delay is not None and delay <= 0:
+                break
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+        ip = entry[3]
+        now = self._now()
+        recent_until = self._recent.get(ip)
+        if recent_until is not None and now < recent_until:
+            interval = self.period * RECENT_FACTOR
+        else:
+            interval = self.period
+            if self._recent.pop(ip, None) is not None:
+                self._update_rate()
+        self._push(ip, PRIORITY_NORMAL, now + interval)
+        had_baseline = ip in self._baseline
+        self._baseline.add(ip)
+        return ip, had_baseline
@@ -0,0 +1,184 @@
+import asyncio
+import gzip
+import json
+import logging
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from device_record import DeviceRecord, intern_ports, pack_port
+
+# Caminho em que o agregador recebe os lotes dos sensores
+BATCH_PATH = '/api/sensor/batch'
+# Versão do formato dos lotes; o agregador recusa versões que não conhece
+PROTOCOL_VERSION = 2
+
+
+def compact_device(device: DeviceRecord) -> list:
+    """Dispositivo no formato enviado pela rede: [ip, mac, timestamp Unix, [[porta, serviço, risco], ...]].
+
+    Os serviços vão por nome: os índices internados só valem dentro de cada processo.
+    """
+    return [
+        device.ip,
+        device.mac,
+        round(device.seen, 3),
+        [[p['port'], p['service'], p['risk_level']] for p in device.port_dicts()]
+    ]
+
+
+def expand_device(data: list, sensor: str) -> DeviceRecord:
+    """Inverso de compact_device, anotando o sensor que viu o dispositivo."""
+    ip, mac, seen, ports = data
+    return DeviceRecord(ip, mac, float(seen), intern_ports(pack_port(*port) for port in ports), sensor)
+
+
+def serialize_batch(batch: dict) -> bytes:
+    return json.dumps(batch, separators=(',', ':')).encode()
+
+
+def compress_batch(raw: bytes) -> bytes:
+    return gzip.compress(raw, compresslevel=6)
+
+
+def encode_batch(batch: dict) -> bytes:
+    return compress_batch(serialize_batch(batch))
+
+
+def decode_batch(body: bytes) -> dict:
+    """Lê um lote, comprimido ou não (o servidor HTTP pode já ter removido o gzip)."""
+    if body[:2] == b'\x1f\x8b':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+class SensorClient:
+    """Envia ao agregador as mudanças no inventário deste sensor, em lotes comprimidos.
+
+    As mudanças são acumuladas (a última versão de cada IP prevalece) e enviadas a
+    cada flush_interval segundos por HTTP, com o corpo em JSON compactado com gzip.
+    Cada lote tem um número de sequência; se o agregador perder algum (reinício,
+    falha de rede), ele responde 409 e o sensor reenvia o inventário completo. Sem
+    mudanças, um lote vazio a cada heartbeat segundos mantém o sensor ativo.
+
+    Nada é enviado enquanto ready() for falso: o primeiro lote substitui a visão do
+    sensor no agregador, e um inventário ainda vazio (antes da primeira varredura)
+    faria toda a rede do sensor constar como desconectada.
+    """
+
+    def __init__(self, url: str, name: str, inventory: Callable[[], Dict[str, DeviceRecord]],
+                 token: Optional[str] = None, flush_interval: float = 1.0, heartbeat: float = 30.0,
+                 timeout: float = 30.0, retry_max: float = 60.0, ready: Callable[[], bool] = lambda: True):
+        self.url = url.rstrip('/') + BATCH_PATH
+        self.name = name
+        self.inventory = inventory  # Estado completo do sensor, usado nas ressincronizações
+        self.ready = ready  # Se o inventário já pode ser enviado
+        self.token = token
+        self.flush_interval = flush_interval
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.retry_max = retry_max
+        self.logger = logging.getLogger('SensorClient')
+        self.stats = {'batches': 0, 'full_syncs': 0, 'failures': 0, 'raw_bytes': 0, 'sent_bytes': 0}
+        self._upserts: Dict[str, DeviceRecord] = {}
+        self._removed: Set[str] = set()
+        self._anomalies: List[dict] = []
+        self._seq = 0
+        self._need_full = True  # O primeiro lote sempre leva o inventário completo
+        self._last_sent = 0.0
+
+    def track(self, updated: List[DeviceRecord], removed_ips: List[str]):
+        """Registra dispositivos novos ou alterados e IPs que saíram da rede."""
+        for ip in removed_ips:
+            self._upserts.pop(ip, None)
+            self._removed.add(ip)
+        for device in updated:
+            self._removed.discard(device.ip)
+            self._upserts[device.ip] = device
+
+    def track_events(self, events: List[dict]):
+        """Registra os eventos de um ciclo do NetworkMonitor (ver ChangeDetector)."""
+        updated, removed = [], []
+        for event in events:
+            if event['type'] == 'disconnected':
+                removed.append(event['device'].ip)
+            else:
+                if event['type'] == 'moved':
+                    removed.append(event['previous_ip'])
+                updated.append(event['device'])
+        self.track(updated, removed)
+
+    def track_anomalies(self, device: DeviceRecord, anomalies: List[dict]):
+        self._anomalies.append({'device': compact_device(device), 'anomalies': anomalies})
+
+    def _build_batch(self) -> dict:
+        batch = {'version': PROTOCOL_VERSION, 'sensor': self.name, 'seq': self._seq + 1, 'full': self._need_full}
+        if self._need_full:
+            batch['upserts'] = [compact_device(device) for device in self.inventory().values()]
+            batch['removed'] = []
+        else:
+            batch['upserts'] = [compact_device(device) for device in self._upserts.values()]
+            batch['removed'] = sorted(self._removed)
+        batch['anomalies'] = self._anomalies
+        return batch
+
+    async def run(self):
+        """Envia os lotes até ser cancelada, repetindo com espera exponencial em caso de falha."""
+        import aiohttp
+
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        failures = 0
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                if not self.ready():
+                    continue
+                idle = not (self._upserts or self._removed or self._anomalies or self._need_full)
+                if idle and time.monotonic() - self._last_sent < self.heartbeat:
+                    continue
+                if await self._flush(session):
+                    failures = 0
+                    continue
+                failures += 1
+                self.stats['failures'] += 1
+                delay = min(self.retry_max, self.flush_interval * 2 ** failures) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+    async def _flush(self, session) -> bool:
+        """Envia um lote; devolve False se ele precisa ser repetido."""
+        import aiohttp
+
+        batch = self._build_batch()
+        # O que chegar durante o envio fica para o próximo lote
+        sent_anomalies = self._anomalies
+        self._upserts, self._removed, self._anomalies = {}, set(), []
+        raw = serialize_batch(batch)
+        body = compress_batch(raw)
+        try:
+            async with session.post(self.url, data=body) as response:
+                if response.status == 409:
+                    self.logger.info("Agregador pediu ressincronização; enviando o inventário completo")
+                    self._need_full = True
+                    self._anomalies = sent_anomalies + self._anomalies
+                    return True
+                response.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Falha ao enviar lote ao agregador: {e}")
+            # Sem saber se o lote foi aplicado, a próxima tentativa envia o inventário completo;
+            # as anomalias não fazem parte do inventário e voltam para a fila
+            self._need_full = True
+            self._anomalies = sent_anomalies + self._anomalies
+            return False
+
+        self._seq = batch['seq']
+        if batch['full']:
+            self._need_full = False
+            self.stats['full_syncs'] += 1
+        self._last_sent = time.monotonic()
+        self.stats['batches'] += 1
+        self.stats['raw_bytes'] += len(raw)
+        self.stats['sent_bytes'] += len(body)
+        return True
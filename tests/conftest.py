@@ -0,0 +1,8 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Log só no terminal: com o log já configurado, o NetworkMonitor não grava network_monitor.log
+logging.basicConfig(level=logging.WARNING)
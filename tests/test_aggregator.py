@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from aggregator import AlertDeduplicator, Aggregator
+from device_record import DeviceRecord
+from sensor_link import PROTOCOL_VERSION, SensorClient, compact_device, decode_batch, encode_batch
+
+
+def host(ip, mac, seen=1.0, ports=()):
+    return [ip, mac, seen, [list(port) for port in ports]]
+
+
+def batch(sensor, seq, full=False, upserts=(), removed=(), anomalies=()):
+    return {'version': PROTOCOL_VERSION, 'sensor': sensor, 'seq': seq, 'full': full,
+            'upserts': list(upserts), 'removed': list(removed), 'anomalies': list(anomalies)}
+
+
+def event_types(aggregator):
+    events, _, _ = aggregator.collect()
+    return sorted((event['type'], event['device'].ip) for event in events)
+
+
+def test_unknown_protocol_version_is_rejected():
+    aggregator = Aggregator()
+    with pytest.raises(ValueError):
+        aggregator.apply_batch({**batch('s1', 1, full=True), 'version': PROTOCOL_VERSION + 1})
+
+
+def test_delta_without_previous_batch_asks_for_resync():
+    aggregator = Aggregator()
+    assert aggregator.apply_batch(batch('s1', 7, upserts=[host('10.0.0.1', 'aa')])) is False
+    assert aggregator.stats['resyncs'] == 1
+    assert aggregator.views == {}
+
+
+def test_gap_in_sequence_asks_for_resync():
+    aggregator = Aggregator()
+    assert aggregator.apply_batch(batch('s1', 1, full=True))
+    assert aggregator.apply_batch(batch('s1', 2, upserts=[host('10.0.0.1', 'aa')]))
+    assert aggregator.apply_batch(batch('s1', 4, upserts=[host('10.0.0.2', 'bb')])) is False
+    assert list(aggregator.views['s1']) == ['10.0.0.1']
+    # O inventário completo é aceito em qualquer sequência e substitui a visão do sensor
+    assert aggregator.apply_batch(batch('s1', 5, full=True, upserts=[host('10.0.0.2', 'bb')]))
+    assert list(aggregator.views['s1']) == ['10.0.0.2']
+    assert aggregator.apply_batch(batch('s1', 6, removed=['10.0.0.2']))
+    assert aggregator.views['s1'] == {}
+
+
+def test_deltas_after_first_sync_raise_alerts():
+    aggregator = Aggregator()
+    aggregator.apply_batch(batch('s1', 1, full=True, upserts=[host('10.0.0.1', 'aa'), host('10.0.0.2', 'bb')]))
+    assert event_types(aggregator) == []
+
+    aggregator.apply_batch(batch('s1', 2, upserts=[host('10.0.0.3', 'cc')], removed=['10.0.0.2']))
+    assert event_types(aggregator) == [('disconnected', '10.0.0.2'), ('new', '10.0.0.3')]
+
+
+def test_sensor_waits_for_its_inventory_before_the_first_sync():
+    inventory = {}
+    ready = False
+    client = SensorClient('http://127.0.0.1:1', 's1', inventory=lambda: inventory, flush_interval=0.01,
+                          ready=lambda: ready)
+    sent = []
+
+    async def flush(session):
+        sent.append(client._build_batch())
+        return True
+
+    client._flush = flush
+
+    async def scenario():
+        nonlocal ready
+        task = asyncio.ensure_future(client.run())
+        await asyncio.sleep(0.05)
+        assert sent == []
+        # Primeira varredura concluída: o inventário completo vai no primeiro lote
+        inventory['10.0.0.1'] = DeviceRecord('10.0.0.1', 'aa', 1.0)
+        ready = True
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert sent[0]['full'] and [d[0] for d in sent[0]['upserts']] == ['10.0.0.1']
+
+
+def test_malformed_full_batch_keeps_the_previous_view():
+    aggregator = Aggregator()
+    aggregator.apply_batch(batch('s1', 1, full=True, upserts=[host('10.0.0.1', 'aa'), host('10.0.0.2', 'bb')]))
+    aggregator.collect()
+    with pytest.raises((ValueError, TypeError)):
+        aggregator.apply_batch(batch('s1', 2, full=True, upserts=[host('10.0.0.1', 'aa'), ['10.0.0.3']]))
+    assert set(aggregator.views['s1']) == {'10.0.0.1', '10.0.0.2'}
+    assert event_types(aggregator) == []
+    assert aggregator.last_seq['s1'] == 1
+
+
+def test_first_full_batch_after_restart_is_a_baseline():
+    aggregator = Aggregator()
+    # Agregador reiniciado: o sensor continua a sequência, recebe 409 e reenvia tudo
+    assert aggregator.apply_batch(batch('s1', 41, upserts=[host('10.0.0.3', 'cc')])) is False
+    aggregator.apply_batch(batch('s1', 42, full=True, upserts=[host('10.0.0.1', 'aa'), host('10.0.0.2', 'bb')]))
+    assert event_types(aggregator) == []
+    assert set(aggregator.known_devices) == {'10.0.0.1', '10.0.0.2'}
+
+    # Depois da linha de base, um novo inventário completo do mesmo sensor é comparado normalmente
+    aggregator.apply_batch(batch('s1', 43, full=True, upserts=[host('10.0.0.1', 'aa'), host('10.0.0.3', 'cc')]))
+    assert event_types(aggregator) == [('disconnected', '10.0.0.2'), ('new', '10.0.0.3')]
+
+
+def test_ip_seen_by_two_sensors_keeps_its_owner():
+    aggregator = Aggregator()
+    aggregator.apply_batch(batch('s1', 1, full=True))
+    aggregator.apply_batch(batch('s1', 2, upserts=[host('10.0.0.1', 'aa', seen=1.0)]))
+    aggregator.collect()
+    aggregator.apply_batch(batch('s2', 1, full=True))
+    aggregator.apply_batch(batch('s2', 2, upserts=[host('10.0.0.1', 'aa', seen=5.0, ports=[(22, 'ssh', 'high')])]))
+    assert event_types(aggregator) == []
+    assert aggregator.owners['10.0.0.1'] == 's1'
+
+    # s1 deixa de ver o IP: o dispositivo passa a vir de s2, e a diferença de portas vira mudança
+    aggregator.apply_batch(batch('s1', 3, removed=['10.0.0.1']))
+    assert event_types(aggregator) == [('ports_changed', '10.0.0.1')]
+    assert aggregator.owners['10.0.0.1'] == 's2'
+
+
+def test_expired_sensor_devices_are_disconnected():
+    aggregator = Aggregator(sensor_timeout=60.0)
+    aggregator.apply_batch(batch('s1', 1, full=True))
+    aggregator.apply_batch(batch('s1', 2, upserts=[host('10.0.0.1', 'aa')]))
+    aggregator.collect()
+    aggregator.expire_sensors(now=aggregator.last_seen['s1'] + 61.0)
+    assert event_types(aggregator) == [('disconnected', '10.0.0.1')]
+    # Sem o número de sequência, o próximo delta do sensor pede ressincronização
+    assert aggregator.apply_batch(batch('s1', 3)) is False
+
+
+def test_repeated_alerts_are_deduplicated():
+    deduplicator = AlertDeduplicator(window=300.0)
+    event = {'type': 'new', 'device': DeviceRecord('10.0.0.1', 'aa', 1.0)}
+    key = AlertDeduplicator.event_key(event)
+    assert deduplicator.allow(key, now=0.0)
+    assert not deduplicator.allow(key, now=100.0)
+    assert deduplicator.allow(key, now=301.0)
+
+
+def test_sensor_batches_round_trip():
+    device = DeviceRecord('10.0.0.1', 'aa', 1.5)
+    client = SensorClient('http://127.0.0.1:1', 's1', inventory=lambda: {device.ip: device})
+    first = client._build_batch()
+    assert first['full'] and first['seq'] == 1
+    assert decode_batch(encode_batch(first)) == first
+
+    aggregator = Aggregator()
+    assert aggregator.apply_batch(decode_batch(encode_batch(first)))
+    aggregator.collect()
+    assert aggregator.known_devices['10.0.0.1'].sensor == 's1'
+    assert compact_device(aggregator.known_devices['10.0.0.1']) == compact_device(device)
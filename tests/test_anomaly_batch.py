@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from anomaly_batch import detect_anomalies_batch
+from network_monitor import ANOMALY_WINDOW, NetworkMonitor
+
+
+def samples(hosts, seed):
+    """Janelas aleatórias com picos, rajadas e hosts com menos amostras que a janela."""
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(100, size=(hosts, ANOMALY_WINDOW)).astype(np.float64)
+    sizes = rng.integers(64, 1500, size=(hosts, ANOMALY_WINDOW)).astype(np.float64)
+    counts[rng.random(hosts) < 0.1, -1] *= 20
+    bursts = rng.random(hosts) < 0.1
+    counts[bursts, 1::4] *= 5
+    for row in np.flatnonzero(rng.random(hosts) < 0.2):
+        missing = rng.integers(1, ANOMALY_WINDOW)
+        counts[row, :missing] = np.nan
+        sizes[row, :missing] = np.nan
+    return counts, sizes
+
+
+def scalar_results(monitor, ips, counts, sizes):
+    for ip, count_row, size_row in zip(ips, counts.tolist(), sizes.tolist()):
+        for timestamp, (count, size) in enumerate(zip(count_row, size_row)):
+            if not math.isnan(count):
+                monitor.traffic_history[ip].append(float(timestamp), int(count), int(size))
+    return {ip: monitor.detect_anomalies(ip) for ip in ips}
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('port_scan_attempts', [5, 2])
+def test_batch_matches_per_host_detection(seed, port_scan_attempts):
+    monitor = NetworkMonitor(traffic_history_capacity=ANOMALY_WINDOW)
+    # Com janelas de 10 amostras, 5 acima do dobro da média é impossível; 2 exercita a regra
+    monitor.anomaly_thresholds['port_scan_attempts'] = port_scan_attempts
+    ips = [f'10.0.{i >> 8}.{i & 255}' for i in range(500)]
+    counts, sizes = samples(len(ips), seed)
+
+    expected = scalar_results(monitor, ips, counts, sizes)
+    batch = monitor.analyze_traffic_batch(ips, counts, sizes)
+
+    assert any(result['anomalies'] for result in expected.values())
+    assert batch.keys() == expected.keys()
+    for ip, result in expected.items():
+        assert batch[ip]['anomalies'] == result['anomalies'], ip
+        # O caminho host a host calcula o desvio padrão com aritmética exata; o lote, em float64
+        assert batch[ip]['stats'] == pytest.approx(result['stats'], rel=1e-12), ip
+
+
+def test_constant_traffic_has_no_anomalies():
+    counts = np.full((2, ANOMALY_WINDOW), 50.0)
+    sizes = np.full((2, ANOMALY_WINDOW), 500.0)
+    thresholds = NetworkMonitor(traffic_history_capacity=ANOMALY_WINDOW).anomaly_thresholds
+    result = detect_anomalies_batch(['10.0.0.1', '10.0.0.2'], counts, sizes, thresholds)
+    assert [r['anomalies'] for r in result.values()] == [[], []]
+    assert result['10.0.0.1']['stats']['std_packet_count'] == 0.0
+
+
+def test_mismatched_shapes_are_rejected():
+    with pytest.raises(ValueError):
+        detect_anomalies_batch(['10.0.0.1'], np.zeros((1, 3)), np.zeros((1, 4)), {})
@@ -0,0 +1,102 @@
+from change_detector import CHANGE_TYPES, ChangeDetector, split_changes
+from device_record import DeviceRecord, intern_ports, pack_port
+
+
+def device(ip, mac, *ports, seen=1.0):
+    """Dispositivo com portas dadas como (porta, serviço)."""
+    return DeviceRecord(ip, mac, seen, intern_ports(pack_port(port, service, 'low') for port, service in ports))
+
+
+def detector_with(*devices):
+    detector = ChangeDetector()
+    detector.reset(list(devices))
+    return detector
+
+
+def types(events):
+    return sorted(event['type'] for event in events)
+
+
+def test_reset_and_unchanged_cycle_emit_nothing():
+    a = device('10.0.0.1', 'aa', (22, 'ssh'))
+    detector = detector_with(a)
+    assert detector.diff([device('10.0.0.1', 'aa', (22, 'ssh'), seen=2.0)]) == []
+    assert '10.0.0.1' in detector
+
+
+def test_new_and_disconnected():
+    detector = detector_with(device('10.0.0.1', 'aa'))
+    events = detector.diff([device('10.0.0.2', 'bb')])
+    assert types(events) == ['disconnected', 'new']
+    by_type = {event['type']: event for event in events}
+    assert by_type['new']['device'].ip == '10.0.0.2'
+    assert by_type['disconnected']['device'].ip == '10.0.0.1'
+
+
+def test_ports_changed_keeps_previous_device():
+    old = device('10.0.0.1', 'aa', (22, 'ssh'))
+    detector = detector_with(old)
+    events = detector.diff([device('10.0.0.1', 'aa', (22, 'ssh'), (80, 'http'))])
+    assert types(events) == ['ports_changed']
+    assert events[0]['previous'] is old
+    assert events[0]['device'].port_numbers() == [22, 80]
+
+
+def test_service_change_on_same_ports_is_services_changed():
+    detector = detector_with(device('10.0.0.1', 'aa', (8080, 'http-proxy')))
+    events = detector.diff([device('10.0.0.1', 'aa', (8080, 'http'))])
+    assert types(events) == ['services_changed']
+    assert split_changes(events) == ([], [], [])
+
+
+def test_same_mac_on_new_ip_is_moved():
+    detector = detector_with(device('10.0.0.1', 'aa', (22, 'ssh')))
+    events = detector.diff([device('10.0.0.7', 'aa', (22, 'ssh'))])
+    assert types(events) == ['moved']
+    assert events[0]['previous_ip'] == '10.0.0.1'
+    assert events[0]['device'].ip == '10.0.0.7'
+
+
+def test_moved_host_with_new_ports_reports_both():
+    detector = detector_with(device('10.0.0.1', 'aa', (22, 'ssh')))
+    events = detector.diff([device('10.0.0.7', 'aa', (22, 'ssh'), (23, 'telnet'))])
+    assert types(events) == ['moved', 'ports_changed']
+
+
+def test_mac_answering_for_two_ips_is_a_conflict():
+    detector = detector_with(device('10.0.0.1', 'aa'), device('10.0.0.2', 'bb'))
+    events = detector.diff([device('10.0.0.1', 'aa'), device('10.0.0.2', 'bb'), device('10.0.0.3', 'aa')])
+    conflicts = [event for event in events if event['type'] == 'mac_conflict']
+    assert len(conflicts) == 1
+    assert conflicts[0]['kind'] == 'multiple_ips'
+    assert conflicts[0]['ips'] == ['10.0.0.1', '10.0.0.3']
+
+
+def test_ip_answered_by_another_mac_is_a_conflict():
+    detector = detector_with(device('10.0.0.1', 'aa'))
+    events = detector.diff([device('10.0.0.1', 'cc')])
+    assert types(events) == ['disconnected', 'mac_conflict', 'new']
+    conflict = next(event for event in events if event['type'] == 'mac_conflict')
+    assert conflict['kind'] == 'ip_mac_changed'
+    assert conflict['previous_mac'] == 'aa'
+    assert conflict['ips'] == ['10.0.0.1']
+
+
+def test_every_event_has_a_known_type_and_a_device():
+    detector = detector_with(device('10.0.0.1', 'aa', (22, 'ssh')), device('10.0.0.2', 'bb'),
+                             device('10.0.0.3', 'cc', (80, 'http')))
+    events = detector.diff([device('10.0.0.1', 'aa', (22, 'ssh'), (443, 'https')), device('10.0.0.9', 'bb'),
+                            device('10.0.0.3', 'dd'), device('10.0.0.4', 'ee')])
+    assert events
+    for event in events:
+        assert event['type'] in CHANGE_TYPES
+        assert isinstance(event['device'], DeviceRecord)
+
+
+def test_split_changes_only_counts_port_changes_as_changed():
+    detector = detector_with(device('10.0.0.1', 'aa', (22, 'ssh')), device('10.0.0.2', 'bb'))
+    events = detector.diff([device('10.0.0.1', 'aa'), device('10.0.0.5', 'bb'), device('10.0.0.3', 'cc')])
+    new, disconnected, changed = split_changes(events)
+    assert [d.ip for d in new] == ['10.0.0.3']
+    assert disconnected == []
+    assert [d.ip for d in changed] == ['10.0.0.1']
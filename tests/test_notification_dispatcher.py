@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from discord_notifier import DiscordNotifier
+from notification_dispatcher import NotificationDispatcher
+
+
+def run_dispatcher(sender, **options):
+    """Envia duas notificações e devolve o dispatcher depois que a fila esvazia."""
+    dispatcher = NotificationDispatcher(sender, retry_base=0.0, **options)
+
+    async def scenario():
+        dispatcher.start()
+        dispatcher.submit('alert', 'primeiro', [{'ip': '10.0.0.1'}])
+        dispatcher.submit('alert', 'segundo', [{'ip': '10.0.0.2'}])
+        await dispatcher.stop(timeout=5.0)
+
+    asyncio.run(scenario())
+    return dispatcher
+
+
+def test_permanent_failure_is_dropped_without_blocking_the_queue():
+    delivered, attempts = [], []
+
+    async def sender(batch):
+        attempts.append(batch[0]['alert_type'])
+        if batch[0]['alert_type'] == 'primeiro':
+            raise KeyError('devices')
+        delivered.extend(batch)
+
+    dispatcher = run_dispatcher(sender)
+    assert attempts == ['primeiro', 'segundo']
+    assert [n['alert_type'] for n in delivered] == ['segundo']
+    assert dispatcher.stats['failed'] == 1 and dispatcher.stats['retries'] == 0
+
+
+def test_transient_failures_are_retried_up_to_max_attempts():
+    attempts = []
+
+    async def sender(batch):
+        attempts.append(batch[0]['alert_type'])
+        if batch[0]['alert_type'] == 'primeiro' or len(attempts) < 5:
+            raise ConnectionError('destino fora do ar')
+
+    dispatcher = run_dispatcher(sender, max_attempts=3)
+    # 'primeiro' desiste após 3 tentativas; 'segundo' falha uma vez e é entregue na seguinte
+    assert attempts == ['primeiro'] * 3 + ['segundo'] * 2
+    assert dispatcher.stats['failed'] == 1 and dispatcher.stats['delivered'] == 1
+    assert dispatcher.stats['retries'] == 3
+
+
+@pytest.mark.parametrize('error, transient', [
+    (discord.HTTPException(SimpleNamespace(status=503, reason='Service Unavailable'), ''), True),
+    (discord.HTTPException(SimpleNamespace(status=429, reason='Too Many Requests'), ''), True),
+    (discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), ''), False),
+    (ConnectionError('cliente do Discord não está conectado'), True),
+    (asyncio.TimeoutError(), True),
+    (KeyError('devices'), False),
+])
+def test_discord_transient_errors(error, transient):
+    assert DiscordNotifier._is_transient(error) is transient
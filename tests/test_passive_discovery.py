@@ -0,0 +1,65 @@
+import asyncio
+
+import scapy.all as scapy
+
+from passive_discovery import DHCP_ACK, DHCP_REQUEST, PassiveDiscovery, extract_host
+
+CLIENT_MAC = '02:00:00:00:00:01'
+
+
+def dhcp(message_type, yiaddr='0.0.0.0', requested=None):
+    options = [('message-type', message_type)]
+    if requested:
+        options.append(('requested_addr', requested))
+    return (scapy.Ether(src=CLIENT_MAC) / scapy.IP() / scapy.UDP(sport=68, dport=67)
+            / scapy.BOOTP(chaddr=scapy.mac2str(CLIENT_MAC), yiaddr=yiaddr)
+            / scapy.DHCP(options=options + ['end']))
+
+
+def test_extract_host_from_arp():
+    assert extract_host(scapy.Ether() / scapy.ARP(psrc='10.0.0.5', hwsrc=CLIENT_MAC)) == ('10.0.0.5', CLIENT_MAC)
+    # Probe ARP: o host ainda não tem endereço
+    assert extract_host(scapy.Ether() / scapy.ARP(psrc='0.0.0.0', hwsrc=CLIENT_MAC)) is None
+
+
+def test_extract_host_from_dhcp():
+    assert extract_host(dhcp(DHCP_ACK, yiaddr='10.0.0.9')) == ('10.0.0.9', CLIENT_MAC)
+    assert extract_host(dhcp(DHCP_REQUEST, requested='10.0.0.10')) == ('10.0.0.10', CLIENT_MAC)
+    assert extract_host(dhcp(1)) is None  # DISCOVER não traz endereço
+    assert extract_host(scapy.Ether() / scapy.IP() / scapy.TCP()) is None
+
+
+def test_listen_replays_pcap(tmp_path):
+    pcap = str(tmp_path / 'discovery.pcap')
+    scapy.wrpcap(pcap, [
+        scapy.Ether() / scapy.ARP(psrc='10.0.0.5', hwsrc='02:00:00:00:00:05'),
+        scapy.Ether() / scapy.IP(dst='10.0.0.1') / scapy.TCP(),
+        dhcp(DHCP_ACK, yiaddr='10.0.0.9'),
+    ])
+
+    async def collect():
+        return [host async for host in PassiveDiscovery(offline=pcap).listen()]
+
+    assert asyncio.run(asyncio.wait_for(collect(), 30)) == [
+        ('10.0.0.5', '02:00:00:00:00:05'), ('10.0.0.9', CLIENT_MAC)
+    ]
+
+
+
+def test_listen_closes_the_capture_socket(monkeypatch):
+    from scapy.automaton import ObjectPipe
+
+    # Um pipe no lugar do socket L2listen: como numa captura real, ele nunca chega ao fim
+    sock = ObjectPipe()
+    sock.send(scapy.Ether() / scapy.ARP(psrc='10.0.0.5', hwsrc='02:00:00:00:00:05'))
+    discovery = PassiveDiscovery()
+    monkeypatch.setattr(discovery, '_open_socket', lambda: sock)
+
+    async def first_host():
+        hosts = discovery.listen()
+        host = await hosts.__anext__()
+        await hosts.aclose()
+        return host
+
+    assert asyncio.run(asyncio.wait_for(first_host(), 30)) == ('10.0.0.5', '02:00:00:00:00:05')
+    assert sock.closed
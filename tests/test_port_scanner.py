@@ -0,0 +1,83 @@
+import asyncio
+import socket
+
+from port_scanner import AsyncConnectScanner, parse_port_range
+from scan_cache import PortResultCache
+
+
+def risk(port, service):
+    return 'high' if service == 'ssh' else 'low'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def scan_local(scanner, ports, banner=None):
+    """Sobe servidores TCP em localhost nas portas dadas e escaneia elas mais uma porta fechada."""
+    async def handle(reader, writer):
+        if banner is not None:
+            writer.write(banner)
+            await writer.drain()
+        writer.close()
+
+    servers = [await asyncio.start_server(handle, '127.0.0.1', port) for port in ports]
+    closed = free_port()
+    try:
+        return closed, await scanner.scan_host('127.0.0.1', sorted(ports + [closed]), risk)
+    finally:
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+
+
+def test_parse_port_range():
+    assert parse_port_range('20-23,25, 80,22,') == [20, 21, 22, 23, 25, 80]
+    assert parse_port_range('') == []
+
+
+def test_connect_scan_finds_only_listening_ports():
+    ports = [free_port(), free_port()]
+    closed, found = asyncio.run(scan_local(AsyncConnectScanner(connect_timeout=1.0), ports))
+    assert [p['port'] for p in found] == sorted(ports)
+    assert closed not in [p['port'] for p in found]
+    assert all(set(p) == {'port', 'service', 'risk_level'} for p in found)
+
+
+def test_connect_scan_identifies_service_from_banner():
+    scanner = AsyncConnectScanner(grab_banners=True, banner_timeout=1.0)
+    _, found = asyncio.run(scan_local(scanner, [free_port()], banner=b'SSH-2.0-OpenSSH_9.6\r\n'))
+    assert [(p['service'], p['risk_level']) for p in found] == [('ssh', 'high')]
+
+
+def test_connect_scan_respects_per_host_limit():
+    active = peak = 0
+    scanner = AsyncConnectScanner(per_host_limit=3)
+
+    async def probe(ip, port):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return (port, 'unknown') if port % 2 else None
+
+    scanner._probe_port = probe
+    found = asyncio.run(scanner.scan_host('10.0.0.1', list(range(1, 21)), risk))
+    assert peak == 3
+    assert [p['port'] for p in found] == list(range(1, 21, 2))
+
+
+def test_cache_peek_does_not_count_or_reorder():
+    cache = PortResultCache(max_entries=2)
+    cache.put('AA', '10.0.0.1', (22,))
+    cache.put('bb', '10.0.0.2', (80,))
+    assert cache.peek('aa', '10.0.0.1') == (22,)
+    assert cache.peek('cc', '10.0.0.3') is None
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'size': 2}
+
+    # O peek não renova a entrada: ela continua a menos usada e sai primeiro
+    cache.put('cc', '10.0.0.3', (443,))
+    assert cache.get('aa', '10.0.0.1') is None
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from device_record import DeviceRecord, intern_ports, pack_port
+
+
+class StopScanning(Exception):
+    pass
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.changes = []
+
+    async def notify_network_changes(self, new_devices, disconnected_devices, changed_devices):
+        self.changes.append((new_devices, disconnected_devices, changed_devices))
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    for name, value in {
+        'BOT_MODE': 'standalone', 'SCAN_SCHEDULER': 'tiered', 'DISCORD_ENABLED': 'False',
+        'WEB_ENABLED': 'True', 'WEB_SERVER': 'aiohttp', 'DEVICE_DB': '', 'HISTORY_DB': '',
+        'PASSIVE_DISCOVERY': 'False', 'TRAFFIC_CAPTURE': 'False', 'INCREMENTAL_SCAN': 'False'
+    }.items():
+        monkeypatch.setenv(name, value)
+    from main import NetworkMonitorBot
+    bot = NetworkMonitorBot()
+    bot.discord_notifier = FakeNotifier()
+    return bot
+
+
+def scan(bot, hosts):
+    """Roda scan_ports_continuously sobre (ip, tinha_referência); cada host ganha a porta 22."""
+    queue = list(hosts)
+    monitor = bot.network_monitor
+
+    async def next_host():
+        if not queue:
+            raise StopScanning
+        return queue.pop(0)
+
+    async def refresh_host_ports(ip):
+        device = monitor.known_devices[ip]
+        monitor.known_devices[ip] = device.replace(ports=intern_ports([pack_port(22, 'ssh', 'high')]))
+        return True
+
+    bot.port_scheduler.next_host = next_host
+    monitor.refresh_host_ports = refresh_host_ports
+    for ip, _ in hosts:
+        monitor.known_devices[ip] = DeviceRecord(ip, 'aa:bb:cc:00:00:0' + ip[-1], 1.0)
+    with pytest.raises(StopScanning):
+        asyncio.run(bot.scan_ports_continuously())
+
+
+def test_first_port_scan_publishes_device_without_change_alert(bot):
+    published = []
+    bot.web_interface.publish_devices = lambda updated, removed: published.append([d.ip for d in updated])
+    scan(bot, [('10.0.0.1', False)])
+
+    assert bot.discord_notifier.changes == []
+    assert list(bot.web_interface.events) == []
+    assert published == [['10.0.0.1']]
+
+
+def test_port_change_after_baseline_is_reported(bot):
+    scan(bot, [('10.0.0.2', True)])
+
+    assert [[d.ip for d in changed] for _, _, changed in bot.discord_notifier.changes] == [['10.0.0.2']]
+    assert [event['type'] for event in bot.web_interface.events] == ['Port Changes Detected']
@@ -0,0 +1,48 @@
+import socket
+
+from network_monitor import NetworkMonitor
+from traffic_capture import ETH_P_8021Q, ETH_P_IP, WindowAggregator, parse_ipv4_addresses
+
+
+def frame(src, dst, vlan=None, ethertype=ETH_P_IP):
+    """Quadro Ethernet mínimo com um cabeçalho IPv4 de 20 bytes."""
+    header = b'\xff' * 6 + b'\x02' * 6
+    if vlan is not None:
+        header += ETH_P_8021Q.to_bytes(2, 'big') + vlan.to_bytes(2, 'big')
+    ip = b'\x45\x00' + b'\x00' * 10 + socket.inet_aton(src) + socket.inet_aton(dst)
+    return header + ethertype.to_bytes(2, 'big') + ip
+
+
+def test_parse_ipv4_addresses_handles_vlan_tags_and_other_protocols():
+    addresses = (socket.inet_aton('10.0.0.1'), socket.inet_aton('10.0.0.2'))
+    assert parse_ipv4_addresses(frame('10.0.0.1', '10.0.0.2')) == addresses
+    assert parse_ipv4_addresses(frame('10.0.0.1', '10.0.0.2', vlan=10)) == addresses
+    assert parse_ipv4_addresses(frame('10.0.0.1', '10.0.0.2', ethertype=0x0806)) is None
+    assert parse_ipv4_addresses(b'\x00' * 20) is None
+
+
+def test_window_aggregator_counts_both_ends_per_window():
+    windows = WindowAggregator(10.0)
+    assert windows.add(100.0, frame('10.0.0.1', '10.0.0.2'), 60) is None
+    assert windows.add(105.0, frame('10.0.0.1', '10.0.0.3'), 100) is None
+    summary = windows.add(131.0, frame('10.0.0.2', '10.0.0.3'), 40)
+
+    assert summary['window_start'] == 100.0 and summary['window_end'] == 110.0
+    assert summary['hosts'] == {'10.0.0.1': (2, 160), '10.0.0.2': (1, 60), '10.0.0.3': (1, 100)}
+    # Janelas sem tráfego são puladas: o pacote de 131s abre a janela de 130s
+    last = windows.flush()
+    assert last['window_start'] == 130.0
+    assert last['hosts'] == {'10.0.0.2': (1, 40), '10.0.0.3': (1, 40)}
+    assert windows.flush() is None
+
+
+def test_traffic_window_ignores_external_hosts_and_invalid_networks():
+    monitor = NetworkMonitor(scan_networks=['10.0.0.0/24', 'não-é-rede'])
+    monitor.get_interface_networks = lambda: []
+    for _ in range(9):
+        monitor.analyze_traffic_window({'hosts': {'10.0.0.5': (10, 1000), '8.8.8.8': (10, 1000)}})
+    found = monitor.analyze_traffic_window({'hosts': {'10.0.0.5': (500, 50000), '8.8.8.8': (500, 50000)}})
+
+    assert [a['type'] for a in found['10.0.0.5']] == ['traffic_spike']
+    assert '8.8.8.8' not in found
+    assert '8.8.8.8' not in monitor.traffic_history
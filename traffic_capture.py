@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import select
+import socket
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+
+
+def parse_ipv4_addresses(frame: bytes) -> Optional[Tuple[bytes, bytes]]:
+    """Extrai (origem, destino) de um quadro Ethernet IPv4 sem dissecar o pacote com o scapy."""
+    if len(frame) < 34:
+        return None
+    offset = 12
+    ethertype = int.from_bytes(frame[offset:offset + 2], 'big')
+    if ethertype == ETH_P_8021Q:
+        offset += 4
+        ethertype = int.from_bytes(frame[offset:offset + 2], 'big')
+    if ethertype != ETH_P_IP:
+        return None
+    ip_start = offset + 2
+    if len(frame) < ip_start + 20:
+        return None
+    return frame[ip_start + 12:ip_start + 16], frame[ip_start + 16:ip_start + 20]
+
+
+class WindowAggregator:
+    """Agrega pacotes e bytes por IP em janelas de tempo fixas."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.window_start: Optional[float] = None
+        self.hosts: Dict[bytes, list] = {}
+
+    def add(self, timestamp: float, frame: bytes, wire_length: int) -> Optional[dict]:
+        """Contabiliza um quadro; devolve o resumo da janela anterior quando ela se fecha."""
+        summary = None
+        if self.window_start is None:
+            self.window_start = timestamp
+        elif timestamp >= self.window_start + self.window_seconds:
+            summary = self.flush(timestamp)
+
+        addresses = parse_ipv4_addresses(frame)
+        if addresses is None:
+            return summary
+        # O tráfego conta para os dois lados da conversa
+        for address in addresses:
+            totals = self.hosts.get(address)
+            if totals is None:
+                self.hosts[address] = [1, wire_length]
+            else:
+                totals[0] += 1
+                totals[1] += wire_length
+        return summary
+
+    def flush(self, now: Optional[float] = None) -> Optional[dict]:
+        """Fecha a janela atual e devolve seu resumo compacto, ou None se não há janela aberta.
+
+        Com now, a próxima janela passa a ser a que contém now (janelas sem tráfego são
+        puladas); sem now, a agregação é encerrada.
+        """
+        if self.window_start is None:
+            return None
+        summary = {
+            'window_start': self.window_start,
+            'window_end': self.window_start + self.window_seconds,
+            'hosts': {socket.inet_ntoa(address): (packets, size)
+                      for address, (packets, size) in self.hosts.items()}
+        }
+        if now is None:
+            self.window_start = None
+        else:
+            elapsed_windows = max(1, int((now - self.window_start) // self.window_seconds))
+            self.window_start += elapsed_windows * self.window_seconds
+        self.hosts = {}
+        return summary
+
+
+def _publish(output: multiprocessing.Queue, summary: Optional[dict], block: bool = False):
+    """Envia um resumo ao processo principal.
+
+    Na captura ao vivo não bloqueia: se o consumidor está atrasado, a janela é descartada
+    para não perder pacotes. Na reprodução de pcap (block=True) nenhuma janela é perdida.
+    """
+    try:
+        if summary is None:
+            output.put(None, timeout=5)
+        elif summary['hosts']:
+            if block:
+                output.put(summary)
+            else:
+                output.put_nowait(summary)
+    except queue.Full:
+        pass
+
+
+def _capture_worker(interface: Optional[str], offline: Optional[str], window_seconds: float,
+                    output: multiprocessing.Queue, stop: multiprocessing.Event):
+    """Processo de captura: lê quadros crus e envia apenas os resumos de cada janela."""
+    import time
+    import scapy.all as scapy
+
+    aggregator = WindowAggregator(window_seconds)
+
+    if offline:
+        # Reprodução de pcap: as janelas seguem os horários gravados no arquivo
+        with scapy.RawPcapReader(offline) as reader:
+            for frame, metadata in reader:
+                if stop.is_set():
+                    break
+                timestamp = metadata.sec + metadata.usec / 1e6
+                summary = aggregator.add(timestamp, frame, metadata.wirelen)
+                if summary:
+                    _publish(output, summary, block=True)
+        summary = aggregator.flush()
+        if summary:
+            _publish(output, summary, block=True)
+        _publish(output, None)
+        return
+
+    try:
+        sock = scapy.conf.L2listen(iface=interface, filter='ip')
+    except Exception:
+        sock = scapy.conf.L2listen(iface=interface)
+    try:
+        while not stop.is_set():
+            now = time.time()
+            if aggregator.window_start is not None and now >= aggregator.window_start + window_seconds:
+                _publish(output, aggregator.flush(now))
+            readable, _, _ = select.select([sock], [], [], 0.5)
+            if not readable:
+                continue
+            _, frame, timestamp = sock.recv_raw(65535)
+            if frame:
+                summary = aggregator.add(timestamp or time.time(), frame, len(frame))
+                if summary:
+                    _publish(output, summary)
+    finally:
+        sock.close()
+        _publish(output, None)
+
+
+class TrafficCapture:
+    """Pipeline de captura de tráfego em um processo separado.
+
+    O processo de captura lê os quadros crus da interface (ou de um pcap), agrega
+    pacotes e bytes por IP em janelas de window_seconds e envia ao processo principal
+    apenas um resumo por janela, sem nunca passar pacotes individuais pelo loop.
+    """
+
+    def __init__(self, interface: Optional[str] = None, window_seconds: float = 10.0,
+                 offline: Optional[str] = None):
+        self.interface = interface
+        self.window_seconds = window_seconds
+        self.offline = offline  # Arquivo pcap reproduzido no lugar da captura ao vivo
+        self.logger = logging.getLogger('TrafficCapture')
+
+    async def windows(self) -> AsyncIterator[dict]:
+        """Produz os resumos {'window_start', 'window_end', 'hosts': {ip: (pacotes, bytes)}}."""
+        context = multiprocessing.get_context('spawn')
+        output = context.Queue(maxsize=64)
+        stop = context.Event()
+        process = context.Process(
+            target=_capture_worker,
+            args=(self.interface, self.offline, self.window_seconds, output, stop),
+            daemon=True
+        )
+        process.start()
+        loop = asyncio.get_event_loop()
+
+        def next_summary():
+            # Espera curta para que o executor não fique preso após o cancelamento
+            try:
+                return output.get(timeout=1.0)
+            except queue.Empty:
+                return queue.Empty
+
+        try:
+            while True:
+                summary = await loop.run_in_executor(None, next_summary)
+                if summary is queue.Empty:
+                    if not process.is_alive():
+                        self.logger.error("Processo de captura de tráfego encerrado inesperadamente")
+                        break
+                    continue
+                if summary is None:
+                    break
+                yield summary
+        finally:
+            stop.set()
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,131 @@
+import math
+from array import array
+from typing import List
+
+
+def exact_mean(total: int, n: int):
+    """Média com o mesmo resultado de statistics.mean para amostras inteiras."""
+    if total % n == 0:
+        return total // n
+    return total / n
+
+
+def exact_stdev(total: int, total_sq: int, n: int) -> float:
+    """Desvio padrão amostral com o mesmo resultado de statistics.stdev para amostras inteiras.
+
+    A variância é calculada de forma exata a partir das somas inteiras e a raiz é
+    arredondada corretamente, como no módulo statistics.
+    """
+    numerator = n * total_sq - total * total
+    denominator = n * (n - 1)
+    return _sqrt_of_frac(numerator, denominator)
+
+
+def _sqrt_of_frac(n: int, m: int) -> float:
+    # Arredonda para ímpar com bits extras e faz uma única divisão em ponto flutuante
+    q = (n.bit_length() - m.bit_length() - 109) // 2
+    if q >= 0:
+        numerator = _isqrt_of_frac_rto(n, m << 2 * q) << q
+        denominator = 1
+    else:
+        numerator = _isqrt_of_frac_rto(n << -2 * q, m)
+        denominator = 1 << -q
+    return numerator / denominator
+
+
+def _isqrt_of_frac_rto(n: int, m: int) -> int:
+    a = math.isqrt(n // m)
+    return a | (a * a * m != n)
+
+
+class TrafficRingBuffer:
+    """Histórico de tráfego de um IP em buffers circulares de capacidade fixa.
+
+    Guarda horário, número e tamanho dos pacotes em arrays e mantém as somas das
+    últimas `window` amostras atualizadas a cada inserção ou remoção, de modo que a
+    média e a variância da janela custam O(1). Os arrays começam pequenos e dobram
+    de tamanho até `capacity`, para que milhares de IPs pouco ativos não reservem
+    o histórico inteiro de antemão.
+    """
+
+    def __init__(self, capacity: int = 8640, window: int = 10):
+        self.capacity = max(window, capacity)
+        self.window = window
+        allocated = min(self.capacity, max(2 * window, 16))
+        self._timestamps = array('d', [0.0]) * allocated
+        self._counts = array('q', [0]) * allocated
+        self._sizes = array('q', [0]) * allocated
+        self._start = 0  # Posição da amostra mais antiga
+        self._length = 0
+
+        # Somas exatas (inteiras) das amostras da janela
+        self.window_length = 0
+        self.count_sum = 0
+        self.count_sq_sum = 0
+        self.size_sum = 0
+        self.size_sq_sum = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, timestamp: float, packet_count: int, packet_size: int):
+        """Adiciona uma amostra; com o buffer cheio, a mais antiga é descartada."""
+        if self._length == len(self._counts):
+            if self._length == self.capacity:
+                self._pop_oldest()
+            else:
+                self._grow()
+
+        pos = (self._start + self._length) % len(self._counts)
+        self._timestamps[pos] = timestamp
+        self._counts[pos] = packet_count
+        self._sizes[pos] = packet_size
+        self._length += 1
+        self._add_to_window(packet_count, packet_size)
+
+        if self.window_length > self.window:
+            # A amostra que estava na borda da janela deixa de fazer parte dela
+            leaving = (self._start + self._length - 1 - self.window) % len(self._counts)
+            self._remove_from_window(self._counts[leaving], self._sizes[leaving])
+
+    def evict_older_than(self, cutoff: float):
+        """Remove as amostras com horário menor ou igual a cutoff, sem copiar os arrays."""
+        while self._length and self._timestamps[self._start] <= cutoff:
+            self._pop_oldest()
+
+    def window_counts(self) -> List[int]:
+        """Números de pacotes das amostras da janela, da mais antiga para a mais recente."""
+        first = self._start + self._length - self.window_length
+        allocated = len(self._counts)
+        return [self._counts[(first + i) % allocated] for i in range(self.window_length)]
+
+    def _pop_oldest(self):
+        if self._length <= self.window_length:
+            # A amostra mais antiga também está dentro da janela
+            self._remove_from_window(self._counts[self._start], self._sizes[self._start])
+        self._start = (self._start + 1) % len(self._counts)
+        self._length -= 1
+
+    def _grow(self):
+        """Dobra os arrays (até capacity), deixando a amostra mais antiga na posição 0."""
+        allocated = len(self._counts)
+        extra = min(self.capacity, allocated * 2) - allocated
+        start = self._start
+        self._timestamps = self._timestamps[start:] + self._timestamps[:start] + array('d', [0.0]) * extra
+        self._counts = self._counts[start:] + self._counts[:start] + array('q', [0]) * extra
+        self._sizes = self._sizes[start:] + self._sizes[:start] + array('q', [0]) * extra
+        self._start = 0
+
+    def _add_to_window(self, count: int, size: int):
+        self.window_length += 1
+        self.count_sum += count
+        self.count_sq_sum += count * count
+        self.size_sum += size
+        self.size_sq_sum += size * size
+
+    def _remove_from_window(self, count: int, size: int):
+        self.window_length -= 1
+        self.count_sum -= count
+        self.count_sq_sum -= count * count
+        self.size_sum -= size
+        self.size_sq_sum -= size * size
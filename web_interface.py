@@ -1,13 +1,18 @@
-from flask import Flask, render_template_string, jsonify, request
 from datetime import datetime
 import os
+import json
+import time
 from dotenv import load_dotenv
 from collections import deque
+from itertools import islice
+import threading
+from event_stream import EventStream, format_sse
+from device_snapshot import ETAG_PREFIX, ResponseCache, filter_device
+from device_record import device_dict
+import metrics
 
 load_dotenv()
 
-app = Flask(__name__)
-
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html class="dark">
@@ -87,79 +92,154 @@ HTML_TEMPLATE = """
                    `${baseClass}text-green-500`;
         }
 
-        function updateDashboard() {
-            // Update devices
-            fetch('/api/devices?page=1&limit=10')
-                .then(response => response.json())
-                .then(data => {
-                    const deviceList = document.getElementById('deviceList');
-                    deviceList.innerHTML = '';
-                    
-                    data.devices.forEach(device => {
-                        const deviceElement = document.createElement('div');
-                        deviceElement.className = 'bg-gray-50 dark:bg-gray-700 p-4 rounded-lg transition-colors duration-200';
-                        
-                        let portsHtml = '';
-                        if (device.ports && device.ports.length > 0) {
-                            portsHtml = '<div class="mt-2 space-y-1">';
-                            device.ports.forEach(port => {
-                                const riskEmoji = getRiskEmoji(port.risk_level);
-                                const riskColorClass = getRiskColorClass(port.risk_level, true);
-                                portsHtml += `
-                                    <div class="${riskColorClass} text-sm">
-                                        ${riskEmoji} Porta ${port.port} (${port.service})
-                                    </div>`;
-                            });
-                            portsHtml += '</div>';
-                        }
-                        
-                        deviceElement.innerHTML = `
-                            <div class="font-semibold text-gray-800 dark:text-gray-100">${device.ip}</div>
-                            <div class="text-sm text-gray-600 dark:text-gray-400">MAC: ${device.mac}</div>
-                            ${portsHtml}
-                        `;
-                        deviceList.appendChild(deviceElement);
-                    });
-                });
+        const DEVICE_LIMIT = 10;
+        const EVENT_LIMIT = 10;
+        const deviceElements = new Map();  // IP -> elemento exibido
 
-            // Update events
-            fetch('/api/events?page=1&limit=10')
-                .then(response => response.json())
-                .then(data => {
-                    const eventList = document.getElementById('eventList');
-                    eventList.innerHTML = '';
-                    
-                    data.events.forEach(event => {
-                        const eventElement = document.createElement('div');
-                        eventElement.className = 'p-2 rounded-lg bg-gray-50 dark:bg-gray-700 transition-colors duration-200';
-                        const riskEmoji = getRiskEmoji(event.risk_level);
-                        const riskColorClass = getRiskColorClass(event.risk_level, true);
-                        eventElement.innerHTML = `
-                            <div class="flex justify-between items-center">
-                                <span class="${riskColorClass}">${riskEmoji} ${event.type}</span>
-                                <span class="text-sm text-gray-600 dark:text-gray-400">${event.timestamp}</span>
-                            </div>
-                        `;
-                        eventList.appendChild(eventElement);
-                    });
+        function renderDevice(device) {
+            const deviceElement = document.createElement('div');
+            deviceElement.className = 'bg-gray-50 dark:bg-gray-700 p-4 rounded-lg transition-colors duration-200';
+            
+            let portsHtml = '';
+            if (device.ports && device.ports.length > 0) {
+                portsHtml = '<div class="mt-2 space-y-1">';
+                device.ports.forEach(port => {
+                    const riskEmoji = getRiskEmoji(port.risk_level);
+                    const riskColorClass = getRiskColorClass(port.risk_level, true);
+                    portsHtml += `
+                        <div class="${riskColorClass} text-sm">
+                            ${riskEmoji} Porta ${port.port} (${port.service})
+                        </div>`;
                 });
+                portsHtml += '</div>';
+            }
+            
+            deviceElement.innerHTML = `
+                <div class="font-semibold text-gray-800 dark:text-gray-100">${device.ip}</div>
+                <div class="text-sm text-gray-600 dark:text-gray-400">MAC: ${device.mac}</div>
+                ${portsHtml}
+            `;
+            return deviceElement;
+        }
+
+        function renderEvent(event) {
+            const eventElement = document.createElement('div');
+            eventElement.className = 'p-2 rounded-lg bg-gray-50 dark:bg-gray-700 transition-colors duration-200';
+            const riskEmoji = getRiskEmoji(event.risk_level);
+            const riskColorClass = getRiskColorClass(event.risk_level, true);
+            eventElement.innerHTML = `
+                <div class="flex justify-between items-center">
+                    <span class="${riskColorClass}">${riskEmoji} ${event.type}</span>
+                    <span class="text-sm text-gray-600 dark:text-gray-400">${event.timestamp}</span>
+                </div>
+            `;
+            return eventElement;
+        }
+
+        function upsertDevice(device) {
+            const deviceList = document.getElementById('deviceList');
+            const element = renderDevice(device);
+            const current = deviceElements.get(device.ip);
+            if (current) {
+                deviceList.replaceChild(element, current);
+            } else {
+                deviceList.prepend(element);
+            }
+            deviceElements.set(device.ip, element);
+
+            // Mantém apenas os dispositivos mais recentes na tela
+            while (deviceElements.size > DEVICE_LIMIT) {
+                const last = deviceList.lastElementChild;
+                deviceElements.forEach((el, ip) => { if (el === last) deviceElements.delete(ip); });
+                last.remove();
+            }
+        }
+
+        function removeDevice(ip) {
+            const current = deviceElements.get(ip);
+            if (current) {
+                current.remove();
+                deviceElements.delete(ip);
+            }
+        }
+
+        function addEvent(event) {
+            const eventList = document.getElementById('eventList');
+            eventList.prepend(renderEvent(event));
+            while (eventList.children.length > EVENT_LIMIT) {
+                eventList.lastElementChild.remove();
+            }
         }
 
-        // Update dashboard every 10 seconds
-        setInterval(updateDashboard, 10000);
-        updateDashboard();
+        // Atualizações em tempo real via Server-Sent Events; ao reconectar, o navegador
+        // envia o último ID recebido e o servidor reenvia apenas o que foi perdido
+        const stream = new EventSource('/api/stream');
+
+        stream.addEventListener('snapshot', e => {
+            const data = JSON.parse(e.data);
+            const deviceList = document.getElementById('deviceList');
+            const eventList = document.getElementById('eventList');
+            deviceList.innerHTML = '';
+            eventList.innerHTML = '';
+            deviceElements.clear();
+            data.devices.forEach(device => {
+                const element = renderDevice(device);
+                deviceList.appendChild(element);
+                deviceElements.set(device.ip, element);
+            });
+            data.events.forEach(event => eventList.appendChild(renderEvent(event)));
+        });
+
+        stream.addEventListener('device', e => {
+            const data = JSON.parse(e.data);
+            if (data.op === 'remove') {
+                removeDevice(data.ip);
+            } else {
+                upsertDevice(data.device);
+            }
+        });
+
+        stream.addEventListener('event', e => addEvent(JSON.parse(e.data)));
     </script>
 </body>
 </html>
 """
 
+def parse_history_range(args, days: int):
+    """Intervalo (start, end) em segundos Unix a partir dos parâmetros da requisição.
+
+    Aceita timestamps Unix ou datas ISO 8601; sem start, cobre os últimos `days` dias.
+    """
+    def parse(value):
+        try:
+            return int(float(value))
+        except ValueError:
+            pass
+        try:
+            return int(datetime.fromisoformat(value).timestamp())
+        except ValueError:
+            raise ValueError(f'Data inválida: {value}')
+
+    end = parse(args['end']) if 'end' in args else int(time.time())
+    start = parse(args['start']) if 'start' in args else end - days * 24 * 3600
+    return start, end
+
+
 class WebInterface:
     def __init__(self, network_monitor):
         self.network_monitor = network_monitor
         self.events = deque(maxlen=50)  # Keep only 50 most recent events
-        self.setup_routes()
+        self.events_version = 0
+        self._events_lock = threading.Lock()  # add_event roda no loop de eventos, as rotas em outra thread
+        self._events_cache = ResponseCache()
+        self.stream = EventStream()  # Mudanças enviadas ao painel via /api/stream
+        self.app = None  # Aplicação Flask, criada só em run(): com WEB_SERVER=aiohttp o Flask nem é importado
 
     def setup_routes(self):
+        from flask import Flask, Response, render_template_string, jsonify, request
+
+        app = self.app = Flask(__name__)
+
         @app.route('/')
         def index():
             return render_template_string(HTML_TEMPLATE)
@@ -168,57 +248,173 @@ class WebInterface:
         def get_devices():
             page = int(request.args.get('page', 1))
             limit = int(request.args.get('limit', 10))
-            start_idx = (page - 1) * limit
-            end_idx = start_idx + limit
-            
-            # Get only necessary device data
-            devices = []
-            for device in sorted(
-                list(self.network_monitor.known_devices.values()),
-                key=lambda x: x.get('timestamp', ''),
-                reverse=True
-            )[start_idx:end_idx]:
-                filtered_device = {
-                    'ip': device['ip'],
-                    'mac': device['mac'],
-                    'ports': [{
-                        'port': p['port'],
-                        'service': p['service'],
-                        'risk_level': p['risk_level']
-                    } for p in device.get('ports', [])]
-                }
-                devices.append(filtered_device)
-            
+            snapshot = self.network_monitor.snapshot
+            return self._conditional_json(
+                snapshot.etag, lambda compress: snapshot.page_body(page, limit, compress)
+            )
+
+        @app.route('/api/inventory')
+        def get_inventory():
+            store = self.network_monitor.device_store
+            if store is None:
+                return jsonify({'error': 'Inventário persistente desativado'}), 404
+
+            page = int(request.args.get('page', 1))
+            limit = int(request.args.get('limit', 10))
+            online_only = request.args.get('online', 'false').lower() == 'true'
+            return jsonify(store.list_devices(online_only=online_only, limit=limit, offset=(page - 1) * limit))
+
+        @app.route('/api/history/online')
+        def get_online_history():
+            history = self.network_monitor.scan_history
+            if history is None:
+                return jsonify({'error': 'Histórico de varreduras desativado'}), 404
+
+            start, end = self._history_range(days=30)
+            return jsonify({'start': start, 'end': end, 'hours': history.online_counts(start, end)})
+
+        @app.route('/api/history/devices/<ip>')
+        def get_device_history(ip):
+            history = self.network_monitor.scan_history
+            if history is None:
+                return jsonify({'error': 'Histórico de varreduras desativado'}), 404
+
+            start, end = self._history_range(days=1)
+            return jsonify({
+                'ip': ip, 'start': start, 'end': end,
+                'observations': history.device_history(ip, start, end)
+            })
+
+        @app.route('/api/history/devices/<ip>/ports/<int:port>')
+        def get_port_history(ip, port):
+            history = self.network_monitor.scan_history
+            if history is None:
+                return jsonify({'error': 'Histórico de varreduras desativado'}), 404
+
+            start, end = self._history_range(days=30)
             return jsonify({
-                'devices': devices,
-                'total': len(self.network_monitor.known_devices)
+                'ip': ip, 'port': port, 'start': start, 'end': end,
+                'transitions': history.port_history(ip, port, start, end)
             })
 
         @app.route('/api/events')
         def get_events():
             page = int(request.args.get('page', 1))
             limit = int(request.args.get('limit', 10))
-            start_idx = (page - 1) * limit
-            end_idx = start_idx + limit
-            
-            return jsonify({
-                'events': list(self.events)[start_idx:end_idx],
+            version = self.events_version
+            return self._conditional_json(
+                self.events_etag(version), lambda compress: self.events_page_body(version, page, limit, compress)
+            )
+
+        @app.route('/api/stream')
+        def stream():
+            last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+            return Response(
+                self._stream_messages(int(last_event_id) if last_event_id and last_event_id.isdigit() else None),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        @app.route('/metrics')
+        def get_metrics():
+            return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+    @staticmethod
+    def _conditional_json(etag: str, body):
+        """Resposta JSON com ETag: 304 se o cliente já tem a versão, gzip se ele aceitar."""
+        from flask import Response, request
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            content, compressed = body(request.accept_encodings['gzip'] > 0)
+            response = Response(content, mimetype='application/json')
+            if compressed:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag, weak=True)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @staticmethod
+    def events_etag(version: int) -> str:
+        return f'{ETAG_PREFIX}-e{version}'
+
+    def events_page_body(self, version: int, page: int, limit: int, compress: bool = False):
+        """Página de eventos serializada (e comprimida), em cache enquanto a versão não muda."""
+        return self._events_cache.get((version, page, limit), lambda: self.event_page(page, limit), compress)
+
+    def event_page(self, page: int, limit: int) -> dict:
+        start_idx = (page - 1) * limit
+        end_idx = start_idx + limit
+        
+        with self._events_lock:
+            return {
+                'events': list(islice(self.events, start_idx, end_idx)),
                 'total': len(self.events)
-            })
+            }
+
+    def _stream_messages(self, last_seq):
+        """Gera o stream SSE: o que o cliente perdeu (ou um snapshot) e depois as novas mensagens."""
+        missed = self.stream.since(last_seq) if last_seq is not None else None
+        if missed is None:
+            seq = self.stream.last_seq
+            snapshot = {**self.network_monitor.snapshot.page(1, 10), 'events': self.event_page(1, 10)['events']}
+            yield format_sse((seq, 'snapshot', json.dumps(snapshot, separators=(',', ':'))))
+        else:
+            seq = last_seq
+            for message in missed:
+                seq = message[0]
+                yield format_sse(message)
+
+        while True:
+            messages = self.stream.wait(seq, timeout=15.0)
+            if messages is None:
+                # O cliente ficou para trás além do histórico: recomeça com um snapshot
+                yield from self._stream_messages(None)
+                return
+            if not messages:
+                yield ': keep-alive\n\n'
+                continue
+            for message in messages:
+                seq = message[0]
+                yield format_sse(message)
+
+    def publish_devices(self, updated: list, removed_ips: list):
+        """Envia ao painel os dispositivos novos ou alterados e os IPs que saíram."""
+        for ip in removed_ips:
+            self.stream.publish('device', {'op': 'remove', 'ip': ip})
+        for device in updated:
+            self.stream.publish('device', {'op': 'upsert', 'device': filter_device(device)})
+
+    @staticmethod
+    def _history_range(days: int):
+        """Intervalo (start, end) da requisição; responde 400 se as datas forem inválidas."""
+        from flask import abort, request
+
+        try:
+            return parse_history_range(request.args, days)
+        except ValueError as e:
+            abort(400, description=str(e))
 
-    def add_event(self, event_type: str, device_info: dict, risk_level: str = 'low'):
+    def add_event(self, event_type: str, device_info, risk_level: str = 'low'):
         """Add a new event to the events list."""
         event = {
             'type': event_type,
-            'device': device_info,
+            'device': device_dict(device_info),
             'risk_level': risk_level,
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
-        self.events.appendleft(event)  # Add new events to the left (most recent)
+        with self._events_lock:
+            self.events.appendleft(event)  # Add new events to the left (most recent)
+            self.events_version += 1
+        self.stream.publish('event', event)
 
     def run(self):
         """Start the web interface."""
         host = os.getenv('WEB_HOST', '127.0.0.1')
         port = int(os.getenv('WEB_PORT', 5000))
         debug = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
-        app.run(host=host, port=port, debug=debug)
\ No newline at end of file
+        if self.app is None:
+            self.setup_routes()
+        self.app.run(host=host, port=port, debug=debug)
\ No newline at end of file